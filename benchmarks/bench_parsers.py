@@ -0,0 +1,61 @@
+# benchmarks/bench_parsers.py
+"""比較原本逐筆 strptime/float 與 myapp.parsers 快速解析的效能
+
+執行方式: python benchmarks/bench_parsers.py [筆數]
+"""
+import os
+import random
+import sys
+import timeit
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from myapp.parsers import clear_parse_caches, parse_iso_date, parse_price
+
+
+def make_values(count, distinct_dates=2000, distinct_prices=5000, seed=42):
+    """產生含重複值的日期與價格字串，模擬實際匯入資料"""
+    rng = random.Random(seed)
+    dates = [f"{rng.randint(1950, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+             for _ in range(distinct_dates)]
+    prices = [f"{rng.randint(1, 9999)}.{rng.randint(0, 99):02d}" for _ in range(distinct_prices)]
+    return [rng.choice(dates) for _ in range(count)], [rng.choice(prices) for _ in range(count)]
+
+
+def legacy_parse(dates, prices):
+    for value in dates:
+        datetime.strptime(value, '%Y-%m-%d').date()
+    for value in prices:
+        float(value)
+
+
+def fast_parse(dates, prices):
+    for value in dates:
+        parse_iso_date(value)
+    for value in prices:
+        parse_price(value)
+
+
+def fast_parse_cold(dates, prices):
+    clear_parse_caches()
+    fast_parse(dates, prices)
+
+
+def main(count=100000, repeat=3):
+    dates, prices = make_values(count)
+    results = {}
+    for label, func in (('strptime/float (原本)', legacy_parse),
+                        ('parsers (冷快取)', fast_parse_cold),
+                        ('parsers (熱快取)', fast_parse)):
+        results[label] = min(timeit.repeat(lambda: func(dates, prices), number=1, repeat=repeat))
+
+    baseline = results['strptime/float (原本)']
+    print(f"解析 {count} 筆日期 + {count} 筆價格 (取 {repeat} 次最佳)")
+    for label, seconds in results.items():
+        print(f"  {label:<24} {seconds:8.3f} 秒  {2 * count / seconds:>12,.0f} 筆/秒  x{baseline / seconds:.1f}")
+    return results
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
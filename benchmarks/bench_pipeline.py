@@ -0,0 +1,285 @@
+# benchmarks/bench_pipeline.py
+"""匯入與匯出各階段的效能測試
+
+以 synthetic_feed 產生不同大小的合成資料，每個大小與匯入模式都使用全新的 SQLite 資料庫，
+依序測量 DataImporter 的 load_raw_data、clean_data、import_to_django、
+export_to_json、export_to_csv 與 create_export_report，記錄耗時、每秒筆數、
+SQL 查詢次數與 tracemalloc 的記憶體峰值，結果寫成JSON，並與基準檔比較找出退步。
+
+- 載入與清理是延遲執行的，clean_data 階段會完整讀過一次清理結果以量測解析與清理的成本；
+  import_to_django 匯入時會再讀一次檔案，其耗時包含解析與清理
+- 測量期間 tracemalloc 一直開啟，耗時會比平常慢，只適合與同樣方式量測的基準比較
+- 查詢次數應完全相同，增加即視為退步；耗時與記憶體超過基準的 tolerance 比例才視為退步
+- 耗時與記憶體是各機器的絕對數值，基準檔只在本機以 --update-baseline 產生（不納入版本控制）；
+  基準來自不同的主機或環境時只比較查詢次數
+
+執行方式: python benchmarks/bench_pipeline.py [--sizes 1000,10000] [--modes bulk,staging]
+          [--output benchmark_results.json] [--baseline benchmarks/baseline.local.json]
+          [--tolerance 0.25] [--update-baseline]
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from benchmarks.synthetic_feed import spec_for_size, write_feed  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.local.json')
+STAGES = (
+    'load_raw_data', 'clean_data', 'import_to_django',
+    'export_to_json', 'export_to_csv', 'create_export_report',
+)
+# 差距小於此值的耗時與記憶體變化視為誤差
+MIN_SECONDS_DELTA = 0.05
+MIN_PEAK_MB_DELTA = 1.0
+# 這些環境資訊都相同時，基準的耗時與記憶體才有比較意義
+HOST_FIELDS = ('host', 'platform', 'cpu_count', 'python', 'django', 'sqlite', 'tracemalloc')
+
+
+def setup_django(workdir):
+    """以效能測試設定啟動 Django（資料庫與快取放在 workdir）"""
+    os.environ['BENCHMARK_DIR'] = workdir
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.bench_settings'
+    import django
+
+    django.setup()
+
+
+def fresh_database():
+    """刪除並重新建立效能測試資料庫，清空統計快取"""
+    from django.conf import settings
+    from django.core.cache import caches
+    from django.core.management import call_command
+    from django.db import connections
+
+    connections.close_all()
+    name = str(settings.DATABASES['default']['NAME'])
+    for path in (name, f'{name}-wal', f'{name}-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+    call_command('migrate', verbosity=0)
+    caches[settings.STATS_CACHE_ALIAS].clear()
+
+
+class StageRecorder:
+    """量測各階段的耗時、查詢次數與記憶體峰值，並收集結果"""
+
+    def __init__(self):
+        self.results = []
+
+    @contextlib.contextmanager
+    def measure(self, size, mode, stage, rows):
+        from django.db import connection
+
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        tracemalloc.reset_peak()
+        start_memory = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        with open(os.devnull, 'w', encoding='utf-8') as devnull, \
+                contextlib.redirect_stdout(devnull), connection.execute_wrapper(count_queries):
+            yield
+        seconds = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] - start_memory
+
+        self.results.append({
+            'size': size,
+            'mode': mode,
+            'stage': stage,
+            'rows': rows,
+            'seconds': round(seconds, 4),
+            'rows_per_sec': round(rows / seconds, 1) if seconds else None,
+            'queries': queries,
+            'peak_mb': round(peak / 2 ** 20, 2),
+        })
+
+
+def _check(ok, stage):
+    if ok is False:
+        raise RuntimeError(f"{stage} 執行失敗")
+
+
+def run_pipeline(recorder, size, mode, feed_path, feed_rows, workdir):
+    """在全新的資料庫上依序執行並量測各階段"""
+    from import_data import DataImporter
+    from myapp.models import Author, Category, Book
+
+    fresh_database()
+    importer = DataImporter()
+    with recorder.measure(size, mode, 'load_raw_data', feed_rows):
+        importer.load_raw_data(feed_path)
+    with recorder.measure(size, mode, 'clean_data', feed_rows):
+        importer.clean_data()
+        for _ in importer.cleaned_data:
+            pass
+    with recorder.measure(size, mode, 'import_to_django', feed_rows):
+        importer.import_to_django(mode=mode, bulk_load=True)
+
+    db_rows = Author.objects.count() + Category.objects.count() + Book.objects.count()
+    base_filename = os.path.join(workdir, f'export_{size}_{mode}')
+    with recorder.measure(size, mode, 'export_to_json', db_rows):
+        _check(importer.export_to_json(f'{base_filename}.json'), 'export_to_json')
+    with recorder.measure(size, mode, 'export_to_csv', db_rows):
+        _check(importer.export_to_csv(base_filename), 'export_to_csv')
+    with recorder.measure(size, mode, 'create_export_report', db_rows):
+        _check(importer.create_export_report(base_filename), 'create_export_report')
+
+
+def same_host(environment, baseline_environment):
+    """基準是否在同一台主機與相同環境下產生"""
+    return all(environment.get(field) == baseline_environment.get(field) for field in HOST_FIELDS)
+
+
+def compare_with_baseline(results, baseline, tolerance, timings=True):
+    """與基準比較，回傳 [(結果, 基準結果或 None, 退步項目列表)]
+
+    timings=False 時只比較查詢次數（基準來自其他主機時使用）。
+    """
+    baseline_results = {(r['size'], r['mode'], r['stage']): r for r in baseline.get('results', [])}
+    comparisons = []
+    for result in results:
+        base = baseline_results.get((result['size'], result['mode'], result['stage']))
+        regressions = []
+        if base is not None:
+            if (timings and result['seconds'] > base['seconds'] * (1 + tolerance)
+                    and result['seconds'] - base['seconds'] > MIN_SECONDS_DELTA):
+                regressions.append('seconds')
+            if result['queries'] > base['queries']:
+                regressions.append('queries')
+            if (timings and result['peak_mb'] > base['peak_mb'] * (1 + tolerance)
+                    and result['peak_mb'] - base['peak_mb'] > MIN_PEAK_MB_DELTA):
+                regressions.append('peak_mb')
+        comparisons.append((result, base, regressions))
+    return comparisons
+
+
+def _change(value, base):
+    if base is None or not base:
+        return ''
+    return f"{(value - base) / base:+.0%}"
+
+
+def print_report(comparisons, timings=True):
+    print(f"{'size':>8} {'mode':<8} {'stage':<22} {'秒':>9} {'筆/秒':>12} {'查詢':>7} {'峰值MB':>8}  與基準比較")
+    for result, base, regressions in comparisons:
+        vs = ''
+        if base is not None:
+            vs = f"查詢 {result['queries'] - base['queries']:+d}"
+            if timings:
+                vs = (f"時間 {_change(result['seconds'], base['seconds'])}, {vs}, "
+                      f"記憶體 {_change(result['peak_mb'], base['peak_mb'])}")
+            if regressions:
+                vs += f"  ❌ 退步: {', '.join(regressions)}"
+        rate = f"{result['rows_per_sec']:,.0f}" if result['rows_per_sec'] else '-'
+        print(f"{result['size']:>8} {result['mode']:<8} {result['stage']:<22} {result['seconds']:>9.3f} "
+              f"{rate:>12} {result['queries']:>7} {result['peak_mb']:>8.2f}  {vs}")
+
+
+def environment_info():
+    import django
+
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'host': platform.node(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'tracemalloc': True,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="匯入與匯出各階段的效能測試")
+    parser.add_argument('--sizes', default='1000,10000', help="書籍數量，以逗號分隔")
+    parser.add_argument('--modes', default='bulk,staging', help="匯入模式（row/bulk/staging），以逗號分隔")
+    parser.add_argument('--dirty', type=float, default=0.02, help="髒資料比例")
+    parser.add_argument('--duplicates', type=float, default=0.01, help="重複資料比例")
+    parser.add_argument('--orphans', type=float, default=0.01, help="找不到作者的書籍比例")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='benchmark_results.json', help="結果JSON檔")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="本機的基準JSON檔（不納入版本控制）")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="耗時與記憶體可容許的退步比例")
+    parser.add_argument('--update-baseline', action='store_true', help="以本次結果覆寫基準檔")
+    parser.add_argument('--workdir', help="資料庫、合成資料與匯出檔的目錄（預設為暫存目錄，結束後刪除）")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    modes = [mode.strip() for mode in args.modes.split(',')]
+    workdir = args.workdir or tempfile.mkdtemp(prefix='homework-bench-')
+    os.makedirs(workdir, exist_ok=True)
+    setup_django(workdir)
+
+    recorder = StageRecorder()
+    tracemalloc.start()
+    try:
+        for size in sizes:
+            spec = spec_for_size(size, args.dirty, args.duplicates, args.orphans, args.seed)
+            feed_path = os.path.join(workdir, f'feed_{size}.json')
+            feed_rows = sum(write_feed(feed_path, spec).values())
+            for mode in modes:
+                print(f"▶ size={size} mode={mode} ...")
+                run_pipeline(recorder, size, mode, feed_path, feed_rows, workdir)
+    finally:
+        tracemalloc.stop()
+        if not args.workdir:
+            from django.db import connections
+
+            connections.close_all()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = {
+        'environment': environment_info(),
+        'feed': {'dirty_ratio': args.dirty, 'duplicate_ratio': args.duplicates,
+                 'orphan_ratio': args.orphans, 'seed': args.seed},
+        'results': recorder.results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(output, f, ensure_ascii=False, indent=2)
+    print(f"✅ 結果已寫入 {args.output}")
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    timings = baseline is None or same_host(output['environment'], baseline.get('environment', {}))
+    comparisons = compare_with_baseline(recorder.results, baseline or {}, args.tolerance, timings)
+    print_report(comparisons, timings)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+        print(f"✅ 已更新基準 {args.baseline}")
+        return 0
+    if baseline is None:
+        print(f"ℹ️ 找不到基準 {args.baseline}，未比較（可加上 --update-baseline 在本機建立）")
+        return 0
+    if not timings:
+        print("⚠️ 基準來自其他主機或環境，只比較查詢次數（可加上 --update-baseline 在本機重新建立）")
+    regressed = [result for result, _, regressions in comparisons if regressions]
+    if regressed:
+        print(f"❌ 共 {len(regressed)} 項與基準相比退步")
+        return 1
+    print("🎉 與基準相比沒有退步")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
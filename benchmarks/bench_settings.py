@@ -0,0 +1,28 @@
+# benchmarks/bench_settings.py
+"""效能測試用的 Django 設定
+
+沿用專案設定，但資料庫改放在 BENCHMARK_DIR（預設為系統暫存目錄），統計快取固定使用記憶體快取，
+每次測試使用全新的資料庫，不會動到專案的 db.sqlite3 與 HOMEWORK_STATS_CACHE_DIR。
+"""
+import os
+import tempfile
+
+from myproject.settings import *  # noqa: F401,F403
+from myproject.settings import CACHES, DATABASES, STATS_CACHE_ALIAS
+
+BENCHMARK_DIR = os.environ.get('BENCHMARK_DIR') or os.path.join(tempfile.gettempdir(), 'homework-benchmarks')
+
+DEBUG = False
+
+DATABASES = {
+    'default': {**DATABASES['default'], 'NAME': os.path.join(BENCHMARK_DIR, 'benchmark.sqlite3')},
+}
+
+CACHES = {
+    **CACHES,
+    STATS_CACHE_ALIAS: {
+        **CACHES[STATS_CACHE_ALIAS],
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark-stats',
+    },
+}
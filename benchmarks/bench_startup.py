@@ -0,0 +1,136 @@
+# benchmarks/bench_startup.py
+"""量測 manage.py import_books / export_books 的啟動時間
+
+排程每天會執行這些指令很多次，啟動成本需控制在預算內：
+- 每個指令以子行程執行 --help（完成 Django 設定與參數解析，不存取資料庫）repeat 次，取中位數與 budget 比較
+- 以 python -X importtime 確認只解析參數時沒有載入匯入/匯出流程的模組（LAZY_MODULES）
+- 依序匯入 import_data 與 export_manager，確認 django.setup() 只執行一次
+
+任一項不符時結束碼為 1。
+
+執行方式: python benchmarks/bench_startup.py [--repeat 5] [--budget 1.0] [--output startup_results.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMMANDS = ('import_books', 'export_books')
+# 只有實際執行匯入或匯出時才需要的模組
+LAZY_MODULES = (
+    'import_data', 'export_manager', 'myapp.bulk_import', 'myapp.staging', 'myapp.incremental_import',
+    'myapp.concurrent_export', 'myapp.export_pipeline', 'myapp.cleaning', 'myapp.instrumentation',
+    'myapp.async_pipeline', 'myapp.sharded_import',
+)
+# 啟動時間的預設預算（秒），約為目前量測值的兩倍
+DEFAULT_BUDGET = 1.0
+
+SETUP_COUNT_PROBE = """
+import django
+calls = 0
+original_setup = django.setup
+
+def counting_setup(*args, **kwargs):
+    global calls
+    calls += 1
+    return original_setup(*args, **kwargs)
+
+django.setup = counting_setup
+import import_data, export_manager
+print(calls)
+"""
+
+
+def _environment():
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
+    return env
+
+
+def time_subprocess(argv, repeat):
+    """以子行程執行 argv repeat 次，回傳每次的耗時（秒）"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run(argv, cwd=ROOT, env=_environment(), check=True, capture_output=True)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def eagerly_imported(command):
+    """只解析參數時就被載入的 LAZY_MODULES"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', 'manage.py', command, '--help'],
+        cwd=ROOT, env=_environment(), check=True, capture_output=True, text=True,
+    )
+    # 每行格式: import time: 自身微秒 | 累計微秒 | 模組名稱
+    imported = {line.rsplit('|', 1)[-1].strip() for line in result.stderr.splitlines() if '|' in line}
+    return [module for module in LAZY_MODULES if module in imported]
+
+
+def count_setup_calls():
+    """在同一個行程中匯入 import_data 與 export_manager 時 django.setup() 執行的次數"""
+    result = subprocess.run(
+        [sys.executable, '-c', SETUP_COUNT_PROBE],
+        cwd=ROOT, env=_environment(), check=True, capture_output=True, text=True,
+    )
+    return int(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="manage.py 匯入/匯出指令的啟動時間測試")
+    parser.add_argument('--repeat', type=int, default=5, help="每個指令執行的次數")
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET, help="啟動時間中位數的上限（秒）")
+    parser.add_argument('--output', help="結果JSON檔")
+    args = parser.parse_args(argv)
+
+    failures = []
+    results = {'budget': args.budget, 'commands': {}}
+    interpreter = statistics.median(time_subprocess([sys.executable, '-c', 'pass'], args.repeat))
+    results['python_seconds'] = round(interpreter, 4)
+    print(f"ℹ️ Python 直譯器啟動: {interpreter:.3f} 秒")
+
+    for command in COMMANDS:
+        timings = time_subprocess([sys.executable, 'manage.py', command, '--help'], args.repeat)
+        median = statistics.median(timings)
+        eager = eagerly_imported(command)
+        results['commands'][command] = {
+            'median_seconds': round(median, 4),
+            'min_seconds': round(min(timings), 4),
+            'eager_modules': eager,
+        }
+        status = '✅'
+        if median > args.budget:
+            failures.append(f"{command} 啟動 {median:.3f} 秒，超過預算 {args.budget:.3f} 秒")
+            status = '❌'
+        if eager:
+            failures.append(f"{command} 解析參數時就載入了 {', '.join(eager)}")
+            status = '❌'
+        print(f"{status} manage.py {command}: 中位數 {median:.3f} 秒 (最快 {min(timings):.3f} 秒，預算 {args.budget:.3f} 秒)")
+
+    setup_calls = count_setup_calls()
+    results['setup_calls'] = setup_calls
+    if setup_calls != 1:
+        failures.append(f"匯入 import_data 與 export_manager 時 django.setup() 執行了 {setup_calls} 次")
+    print(f"{'✅' if setup_calls == 1 else '❌'} django.setup() 執行次數: {setup_calls}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"✅ 結果已寫入 {args.output}")
+
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        return 1
+    print("🎉 啟動時間在預算內")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
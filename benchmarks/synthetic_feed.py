@@ -0,0 +1,135 @@
+# benchmarks/synthetic_feed.py
+"""產生與 sample_data.json 格式相同的合成資料（相同參數與種子必定產生相同內容）
+
+可設定作者、分類與書籍數量，以及髒資料比例：
+- dirty_ratio: 需要清理或會被拒絕的資料（前後空白、大寫 email、錯誤日期、錯誤或超出範圍的價格）
+- duplicate_ratio: 與先前資料同名/同書名的重複資料
+- orphan_ratio: 作者或分類不存在的書籍
+
+執行方式: python benchmarks/synthetic_feed.py 輸出檔 [--books 10000] [--authors 200] [--categories 20]
+          [--dirty 0.02] [--duplicates 0.01] [--orphans 0.01] [--seed 42]
+"""
+import argparse
+import json
+import random
+from collections import namedtuple
+
+FeedSpec = namedtuple(
+    'FeedSpec', 'authors categories books dirty_ratio duplicate_ratio orphan_ratio seed',
+    defaults=(0.0, 0.0, 0.0, 42),
+)
+
+
+def spec_for_size(books, dirty_ratio=0.02, duplicate_ratio=0.01, orphan_ratio=0.01, seed=42):
+    """依書籍數量決定作者與分類數量（平均每位作者約 50 本書，分類最多 50 個）"""
+    return FeedSpec(
+        authors=max(5, books // 50),
+        categories=max(5, min(50, books // 1000)),
+        books=books,
+        dirty_ratio=dirty_ratio,
+        duplicate_ratio=duplicate_ratio,
+        orphan_ratio=orphan_ratio,
+        seed=seed,
+    )
+
+
+def _random_date(rng, first_year, last_year):
+    return f"{rng.randint(first_year, last_year)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+
+
+def _dirty_value(rng, value, kind):
+    """將欄位值弄髒：一半可被清理（前後空白），一半會被拒絕"""
+    if rng.random() < 0.5:
+        return f"  {value} "
+    return {'date': '2023-13-45', 'price': rng.choice(['abc', '100000.00', 'NaN'])}.get(kind, value)
+
+
+def iter_authors(spec, rng):
+    for index in range(spec.authors):
+        name = f"作者{index:06d}"
+        if index and rng.random() < spec.duplicate_ratio:
+            name = f"作者{rng.randrange(index):06d}"
+        item = {
+            'name': name,
+            'email': f"author{index}@example.com",
+            'birth_date': _random_date(rng, 1940, 2000),
+        }
+        if rng.random() < spec.dirty_ratio:
+            item['name'] = f"  {item['name']} "
+            item['email'] = item['email'].upper()
+            item['birth_date'] = _dirty_value(rng, item['birth_date'], 'date')
+        yield item
+
+
+def iter_categories(spec, rng):
+    for index in range(spec.categories):
+        yield {'name': f"分類{index:03d}", 'description': f"第 {index} 類書籍"}
+
+
+def iter_books(spec, rng):
+    for index in range(spec.books):
+        title = f"書籍{index:08d}"
+        if index and rng.random() < spec.duplicate_ratio:
+            title = f"書籍{rng.randrange(index):08d}"
+        item = {
+            'title': title,
+            'author_name': f"作者{rng.randrange(spec.authors):06d}",
+            'category_name': f"分類{rng.randrange(spec.categories):03d}",
+            'publish_date': _random_date(rng, 1950, 2024),
+            'price': f"{rng.randint(50, 2000)}.{rng.randint(0, 99):02d}",
+        }
+        if rng.random() < spec.orphan_ratio:
+            item['author_name'] = f"未知作者{index}"
+        if rng.random() < spec.dirty_ratio:
+            field = rng.choice(('publish_date', 'price'))
+            item[field] = _dirty_value(rng, item[field], 'date' if field == 'publish_date' else 'price')
+        yield item
+
+
+def write_feed(path, spec):
+    """逐筆寫出合成資料JSON（不在記憶體中建立完整資料），回傳各區段筆數"""
+    rng = random.Random(spec.seed)
+    counts = {}
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{')
+        for section_index, (section, items) in enumerate((
+            ('authors', iter_authors(spec, rng)),
+            ('categories', iter_categories(spec, rng)),
+            ('books', iter_books(spec, rng)),
+        )):
+            if section_index:
+                f.write(',')
+            f.write(f'\n  "{section}": [')
+            count = 0
+            for count, item in enumerate(items, 1):
+                f.write(',\n    ' if count > 1 else '\n    ')
+                f.write(json.dumps(item, ensure_ascii=False))
+            f.write('\n  ]')
+            counts[section] = count
+        f.write('\n}\n')
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="產生合成的書籍匯入資料")
+    parser.add_argument('output')
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--authors', type=int)
+    parser.add_argument('--categories', type=int)
+    parser.add_argument('--dirty', type=float, default=0.02)
+    parser.add_argument('--duplicates', type=float, default=0.01)
+    parser.add_argument('--orphans', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    spec = spec_for_size(args.books, args.dirty, args.duplicates, args.orphans, args.seed)
+    spec = spec._replace(
+        authors=args.authors if args.authors is not None else spec.authors,
+        categories=args.categories if args.categories is not None else spec.categories,
+    )
+    counts = write_feed(args.output, spec)
+    print(f"✅ 已產生 {args.output}: {counts['authors']} 作者, {counts['categories']} 分類, {counts['books']} 書籍")
+
+
+if __name__ == "__main__":
+    main()
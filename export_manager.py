@@ -2,214 +2,126 @@
 import os
 import sys
 import django
-import json
-import csv
 from datetime import datetime
-from django.db.models import Avg  # 添加這行
 
-# 設置Django環境
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
-django.setup()
+from django.apps import apps
 
-from myapp.models import Author, Category, Book
+# 設置Django環境（由 manage.py export_books 或已設定好 Django 的程式匯入時不重複設定）
+if not apps.ready:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
+    django.setup()
 
-# 設置Django環境
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
-django.setup()
+from django.conf import settings
 
-from myapp.models import Author, Category, Book
+from myapp.exporting import AUTHOR_CSV_WITH_CREATED, BOOK_CSV, CATEGORY_CSV, DEFAULT_CHUNK_SIZE, render_report
+from myapp.concurrent_export import atomic_output, build_export_tasks, run_concurrent_export
+from myapp.delta_export import DEFAULT_WATERMARK, prune_deleted_records, write_delta_export
+from myapp.export_pipeline import ExportPipeline, FileExportMixin, build_export_sinks
+from myapp.instrumentation import Instrumentation
+
+class DataExporter(FileExportMixin):
+    csv_tables = (AUTHOR_CSV_WITH_CREATED, CATEGORY_CSV, BOOK_CSV)
+    report_with_titles = False
 
-class DataExporter:
     def __init__(self):
         self.export_time = datetime.now()
         self.export_formats = ['json', 'csv', 'report']
+        self.instrumentation = Instrumentation('export_manager')
     
-    def export_all_data(self, base_filename=None):
-        """匯出所有資料"""
+    def export_all_data(self, base_filename=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                        parallel=False, workers=None, executor='thread'):
+        """匯出所有資料
+
+        預設以單次掃描同時輸出所有格式；parallel=True 時改為各格式（與每個CSV資料表）
+        分別在執行緒池或行程池中同時匯出，每個工作使用自己的資料庫連線。
+        """
         if not base_filename:
             base_filename = f"data_export_{self.export_time.strftime('%Y%m%d_%H%M%S')}"
         
         print(f"開始匯出資料到 {base_filename}...")
         
-        results = {}
-        
-        # JSON匯出
-        results['json'] = self.export_to_json(f"{base_filename}.json")
-        
-        # CSV匯出
-        results['csv'] = self.export_to_csv(base_filename)
-        
-        # 建立報告
-        results['report'] = self.create_export_report(base_filename)
+        if parallel:
+            results = self._export_concurrently(base_filename, chunk_size, workers, executor)
+        else:
+            # 每個資料表只掃描一次，同時產生 JSON、CSV 與報告
+            sinks = build_export_sinks(
+                self.export_formats, base_filename, self.export_time,
+                csv_tables=self.csv_tables, with_titles=self.report_with_titles,
+            )
+            pipeline = ExportPipeline(sinks, chunk_size)
+            with self.instrumentation.stage('export_pipeline') as metrics:
+                results = pipeline.run()
+                metrics.add_rows(pipeline.rows_scanned)
         
         # 顯示匯出結果
         self._print_export_summary(results, base_filename)
         
         return all(results.values())
     
-    def export_to_json(self, filename):
-        """匯出為JSON格式"""
+    def export_delta(self, base_filename=None, watermark=DEFAULT_WATERMARK,
+                     chunk_size=DEFAULT_CHUNK_SIZE, compact=False, prune=False):
+        """增量匯出：只匯出上次匯出後新增或修改的資料，以及刪除紀錄
+
+        水位線依 watermark 名稱分別保存，不同的下游可以各自使用自己的水位線；
+        prune=True 時清除所有水位線都已涵蓋的刪除紀錄。
+        """
+        if not base_filename:
+            base_filename = f"data_export_{self.export_time.strftime('%Y%m%d_%H%M%S')}"
+        filename = f"{base_filename}_delta.json"
+
         try:
-            export_data = {
-                'metadata': {
-                    'export_time': self.export_time.isoformat(),
-                    'total_records': {
-                        'authors': Author.objects.count(),
-                        'categories': Category.objects.count(),
-                        'books': Book.objects.count()
-                    }
-                },
-                'authors': list(Author.objects.values(
-                    'id', 'name', 'email', 'birth_date'
-                )),
-                'categories': list(Category.objects.values(
-                    'id', 'name', 'description'
-                )),
-                'books': list(Book.objects.values(
-                    'id', 'title', 'author_id', 'category_id', 
-                    'publish_date', 'price', 'is_available'
-                ))
-            }
-            
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(export_data, f, ensure_ascii=False, indent=2, default=str)
-            
-            print(f"✅ JSON匯出完成: {filename}")
+            with self.instrumentation.stage('export_delta') as metrics:
+                since, until, rows = write_delta_export(filename, watermark, chunk_size, compact)
+                metrics.add_rows(rows)
+            since_text = since if since is not None else '最初'
+            print(f"✅ 增量匯出完成: {filename} (變動序號 {since_text} ~ {until}，共 {rows} 筆)")
+            if prune:
+                print(f"   已清除 {prune_deleted_records()} 筆過期的刪除紀錄")
             return True
-            
+
         except Exception as e:
-            print(f"❌ JSON匯出失敗: {e}")
+            print(f"❌ 增量匯出失敗: {e}")
             return False
-    
-    def export_to_csv(self, base_filename):
-        """匯出為CSV格式"""
-        try:
-            # 作者CSV
-            authors = Author.objects.all()
-            with open(f'{base_filename}_authors.csv', 'w', newline='', encoding='utf-8-sig') as f:
-                writer = csv.writer(f)
-                writer.writerow(['ID', '姓名', '電子郵件', '出生日期', '建立時間'])
-                for author in authors:
-                    writer.writerow([
-                        author.id,
-                        author.name,
-                        author.email,
-                        author.birth_date,
-                        author.pk  # 你可以添加created_at欄位如果有的话
-                    ])
-            
-            # 分類CSV
-            categories = Category.objects.all()
-            with open(f'{base_filename}_categories.csv', 'w', newline='', encoding='utf-8-sig') as f:
-                writer = csv.writer(f)
-                writer.writerow(['ID', '分類名稱', '描述'])
-                for category in categories:
-                    writer.writerow([
-                        category.id,
-                        category.name,
-                        category.description
-                    ])
-            
-            # 書籍CSV（包含關聯資訊）
-            books = Book.objects.select_related('author', 'category').all()
-            with open(f'{base_filename}_books.csv', 'w', newline='', encoding='utf-8-sig') as f:
-                writer = csv.writer(f)
-                writer.writerow(['ID', '書名', '作者ID', '作者', '分類ID', '分類', '出版日期', '價格', '是否可借'])
-                for book in books:
-                    writer.writerow([
-                        book.id,
-                        book.title,
-                        book.author.id,
-                        book.author.name,
-                        book.category.id,
-                        book.category.name,
-                        book.publish_date,
-                        float(book.price),
-                        '是' if book.is_available else '否'
-                    ])
-            
+
+    def _export_concurrently(self, base_filename, chunk_size, workers, executor):
+        """同時執行各格式的匯出工作，並彙整成與單次掃描相同的結果格式"""
+        tasks = build_export_tasks(self.export_formats, base_filename, self.csv_tables)
+        print(f"平行匯出 {len(tasks)} 個工作 (executor={executor}, workers={workers or len(tasks)})...")
+        outcomes = run_concurrent_export(
+            tasks, self.export_time, workers, executor, chunk_size, with_titles=self.report_with_titles,
+        )
+
+        results = {}
+        for outcome in outcomes:
+            task = outcome.task
+            label = task.target or '報告統計'
+            # 各工作在其他執行緒或行程中執行，只能記錄耗時與筆數（耗時彼此重疊）
+            rows = outcome.value if outcome.ok and task.format != 'report' else 0
+            self.instrumentation.record(f'export_{task.format}', outcome.seconds, rows)
+            if not outcome.ok:
+                print(f"❌ {task.format} 匯出失敗 ({label}): {outcome.error}")
+                results[task.format] = False
+                continue
+            print(f"   {label} 完成 ({outcome.seconds:.2f} 秒)")
+            results.setdefault(task.format, True)
+            if task.format == 'report':
+                try:
+                    report_path = f'{base_filename}_report.txt'
+                    with atomic_output(report_path) as temp_path:
+                        with open(temp_path, 'w', encoding='utf-8') as f:
+                            f.write(render_report(outcome.value, base_filename, self.export_time))
+                    print(f"✅ 匯出報告生成完成: {report_path}")
+                except Exception as e:
+                    print(f"❌ 報告生成失敗: {e}")
+                    results['report'] = False
+
+        if results.get('json'):
+            print(f"✅ JSON匯出完成: {base_filename}.json")
+        if results.get('csv'):
             print(f"✅ CSV匯出完成: {base_filename}_*.csv")
-            return True
-            
-        except Exception as e:
-            print(f"❌ CSV匯出失敗: {e}")
-            return False
-    
-    def create_export_report(self, base_filename):
-        """建立詳細的匯出報告"""
-        try:
-            authors = Author.objects.all()
-            categories = Category.objects.all()
-            books = Book.objects.all()
-            
-            report = f"""
-資料匯出詳細報告
-================
-
-基本資訊:
----------
-匯出時間: {self.export_time.strftime('%Y-%m-%d %H:%M:%S')}
-匯出檔案基礎名稱: {base_filename}
-
-資料統計:
----------
-作者數量: {authors.count()}
-分類數量: {categories.count()}  
-書籍數量: {books.count()}
-總記錄數: {authors.count() + categories.count() + books.count()}
-
-作者列表:
----------
-"""
-            for author in authors:
-                book_count = Book.objects.filter(author=author).count()
-                report += f"- {author.name} ({author.email}) - 著作: {book_count}本\n"
-            
-            report += f"""
-分類列表:
----------
-"""
-            for category in categories:
-                book_count = Book.objects.filter(category=category).count()
-                report += f"- {category.name} - 書籍: {book_count}本\n"
-                if category.description:
-                    report += f"  描述: {category.description}\n"
-            
-            report += f"""
-書籍價格統計:
-------------
-最高價格: {books.order_by('-price').first().price if books.exists() else 'N/A'}
-最低價格: {books.order_by('price').first().price if books.exists() else 'N/A'}  
-平均價格: {books.aggregate(avg_price=Avg('price'))['avg_price'] if books.exists() else 'N/A'}
-
-匯出檔案:
----------
-1. {base_filename}.json - JSON格式完整資料
-2. {base_filename}_authors.csv - 作者資料表
-3. {base_filename}_categories.csv - 分類資料表
-4. {base_filename}_books.csv - 書籍資料表
-5. {base_filename}_report.txt - 本報告檔案
-
-注意事項:
----------
-- 所有檔案使用UTF-8編碼
-- CSV檔案適合用Excel開啟編輯
-- JSON檔案包含完整的資料關係
-- 建議定期備份重要資料
-"""
-            
-            with open(f'{base_filename}_report.txt', 'w', encoding='utf-8') as f:
-                f.write(report)
-            
-            print(f"✅ 匯出報告生成完成: {base_filename}_report.txt")
-            return True
-            
-        except Exception as e:
-            print(f"❌ 報告生成失敗: {e}")
-            return False
-    
+        return results
+
     def _print_export_summary(self, results, base_filename):
         """顯示匯出摘要"""
         print("\n" + "="*50)
@@ -236,11 +148,20 @@ class DataExporter:
         print(f"  📁 {base_filename}_report.txt")
         print("="*50)
 
+    def emit_metrics(self, path=None):
+        """顯示各階段量測結果，並以一行JSON附加到 path 或 settings.METRICS_FILE"""
+        self.instrumentation.print_summary()
+        summary = self.instrumentation.emit(path)
+        if path or settings.METRICS_FILE:
+            print(f"📊 量測結果已寫入 {path or settings.METRICS_FILE}")
+        return summary
+
 # 獨立執行的匯出功能
 def export_data_standalone():
     """獨立執行資料匯出"""
     exporter = DataExporter()
     success = exporter.export_all_data()
+    exporter.emit_metrics()
     
     if success:
         print("\n🎉 資料匯出任務完成！")
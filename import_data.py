@@ -3,70 +3,58 @@ import os
 import sys
 import django
 import json
-import csv
-from datetime import datetime, date
-from django.db.models import Avg  # 添加Avg導入
+import time
+from contextlib import nullcontext
+from datetime import datetime
 
-# 設置Django環境
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
-django.setup()
+from django.apps import apps
+
+# 設置Django環境（由 manage.py import_books 或已設定好 Django 的程式匯入時不重複設定）
+if not apps.ready:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
+    django.setup()
+
+from django.conf import settings
 
 from myapp.models import Author, Category, Book
+from myapp.exporting import DEFAULT_CHUNK_SIZE
+from myapp.cleaning import iter_clean_chunks
+from myapp.export_pipeline import ExportPipeline, FileExportMixin, build_export_sinks
+from myapp.instrumentation import CappedLog, Instrumentation, ProgressReporter
+from myapp.records import SECTIONS, ChunkSource, RawAuthor, RawBook, RawCategory
+from myapp.sqlite_tuning import bulk_load_mode
+from myapp.stats import invalidation_batch, model_counts
+from myapp.streaming import iter_raw_chunks
 
-class DataImporter:
+class DataImporter(FileExportMixin):
     def __init__(self):
+        # 兩者皆為 (區段名稱, record 列表) 區塊的來源，迭代時才逐塊讀取與清理，不保留完整資料
         self.raw_data = []
-        self.cleaned_data = {
-            'authors': [],
-            'categories': [],
-            'books': []
-        }
+        self.cleaned_data = []
+        # 各階段的耗時、筆數、查詢與記憶體；逐筆訊息改為限制頻率的進度與只顯示前幾筆的警告
+        self.instrumentation = Instrumentation('import_data')
+        self.progress = None
+        self.reject_log = CappedLog()
+        self.missing_log = CappedLog()
     
-    def load_raw_data(self, json_file_path='sample_data.json'):
-        """從JSON檔案載入原始資料"""
-        import json
-        
+    def load_raw_data(self, json_file_path='sample_data.json', chunk_size=5000):
+        """設定JSON來源檔案
+
+        檔案不會一次讀入記憶體：raw_data 為逐塊串流解析的來源（每塊最多 chunk_size 筆），
+        清理與匯入時才實際讀取；檔案中段的格式錯誤會在匯入時才發現。
+        """
         try:
-            # 嘗試從JSON檔案讀取資料
+            # 先確認檔案可讀取且為JSON物件
             with open(json_file_path, 'r', encoding='utf-8') as file:
-                json_data = json.load(file)
-            
-            # 將JSON資料轉換為原來的格式
-            self.raw_data = []
-            
-            # 轉換作者資料
-            for author in json_data.get('authors', []):
-                self.raw_data.append({
-                    'type': 'author',
-                    'name': author['name'],
-                    'email': author['email'],
-                    'birth_date': author['birth_date']
-                })
-            
-            # 轉換分類資料
-            for category in json_data.get('categories', []):
-                self.raw_data.append({
-                    'type': 'category', 
-                    'name': category['name'],
-                    'description': category.get('description', '')
-                })
-            
-            # 轉換書籍資料
-            for book in json_data.get('books', []):
-                self.raw_data.append({
-                    'type': 'book',
-                    'title': book['title'],
-                    'author_name': book['author_name'],
-                    'category_name': book['category_name'],
-                    'publish_date': book['publish_date'],
-                    'price': str(book['price'])  # 確保是字串格式
-                })
-            
-            print(f"✅ 從 {json_file_path} 成功載入 {len(self.raw_data)} 筆原始資料")
-            print(f"   - 作者: {len(json_data.get('authors', []))} 筆")
-            print(f"   - 分類: {len(json_data.get('categories', []))} 筆") 
-            print(f"   - 書籍: {len(json_data.get('books', []))} 筆")
+                head = file.read(4096).lstrip()
+            if not head.startswith('{'):
+                raise json.JSONDecodeError("預期為 {", head, 0)
+
+            self.raw_data = ChunkSource(
+                iter_raw_chunks, json_file_path, chunk_size, self._report_load_error, self._on_source_progress,
+            )
+            print(f"✅ 已開啟 {json_file_path}，將以串流方式逐塊讀取 (chunk_size={chunk_size})")
             
         except FileNotFoundError:
             print(f"❌ 找不到JSON檔案: {json_file_path}")
@@ -80,137 +68,451 @@ class DataImporter:
             print(f"❌ 讀取JSON檔案時發生錯誤: {e}")
             print("使用預設的範例資料...")
             self._load_default_data()
+
+    def _report_load_error(self, item, error):
+        self.reject_log(f"⚠️ 讀取資料時發生錯誤 (跳過此筆): {item} - 錯誤: {error}")
+
+    def _report_reject(self, item, error):
+        self.reject_log(f"⚠️ 清理資料時發生錯誤 (跳過此筆): {item} - 錯誤: {error}")
+
+    def _report_missing_book(self, book_data):
+        self.missing_log(f"❌ 警告: 找不到作者 '{book_data.author_name}' 或分類 '{book_data.category_name}' - 書籍: {book_data.title}")
+
+    def _on_source_progress(self, position, total):
+        """來源檔案的讀取位置，作為進度百分比與預計剩餘時間的依據"""
+        if self.progress is not None:
+            self.progress.update(position=position, total=total)
+
+    def _iter_with_progress(self, chunks, label):
+        """迭代區塊時更新進度（每塊一次，實際輸出受 ProgressReporter 限制頻率）"""
+        self.progress = ProgressReporter(label)
+        try:
+            for section, records in chunks:
+                yield section, records
+                self.progress.update(len(records))
+        finally:
+            self.progress = None
     
     def _load_default_data(self):
         """載入預設的範例資料（備用）"""
         self.raw_data = [
             # 基本範例資料，確保程式能運行
-            {'type': 'author', 'name': '張三', 'email': 'zhangsan@email.com', 'birth_date': '1980-05-15'},
-            {'type': 'author', 'name': '李四', 'email': 'lisi@email.com', 'birth_date': '1975-12-01'},
-            {'type': 'category', 'name': '科技', 'description': '技術相關書籍'},
-            {'type': 'book', 'title': 'Python入門', 'author_name': '張三', 'category_name': '科技', 'publish_date': '2023-01-15', 'price': '350.00'},
+            ('authors', [
+                RawAuthor('張三', 'zhangsan@email.com', '1980-05-15'),
+                RawAuthor('李四', 'lisi@email.com', '1975-12-01'),
+            ]),
+            ('categories', [RawCategory('科技', '技術相關書籍')]),
+            ('books', [RawBook('Python入門', '張三', '科技', '2023-01-15', '350.00')]),
         ]
-        print(f"載入 {len(self.raw_data)} 筆預設資料")
+        print(f"載入 {sum(len(records) for _, records in self.raw_data)} 筆預設資料")
     
-    def clean_data(self):
-        """清理和格式化資料"""
-        print("開始清理資料...")
-        
-        for item in self.raw_data:
-            try:
-                if item['type'] == 'author':
-                    # 清理作者資料
-                    cleaned_item = {
-                        'name': item['name'].strip(),  # 去除前後空格
-                        'email': item['email'].strip().lower(),  # 轉小寫
-                        'birth_date': datetime.strptime(item['birth_date'], '%Y-%m-%d').date() if item['birth_date'] else None
-                    }
-                    self.cleaned_data['authors'].append(cleaned_item)
-                    
-                elif item['type'] == 'category':
-                    # 清理分類資料
-                    cleaned_item = {
-                        'name': item['name'].strip(),
-                        'description': item.get('description', '').strip()
-                    }
-                    self.cleaned_data['categories'].append(cleaned_item)
-                    
-                elif item['type'] == 'book':
-                    # 清理書籍資料
-                    cleaned_item = {
-                        'title': item['title'].strip(),
-                        'author_name': item['author_name'].strip(),
-                        'category_name': item['category_name'].strip(),
-                        'publish_date': datetime.strptime(item['publish_date'], '%Y-%m-%d').date(),
-                        'price': float(item['price'])
-                    }
-                    self.cleaned_data['books'].append(cleaned_item)
-                    
-            except Exception as e:
-                print(f"⚠️ 清理資料時發生錯誤 (跳過此筆): {item} - 錯誤: {e}")
-                continue
+    def clean_data(self, workers=1):
+        """清理和格式化資料
+
+        cleaned_data 為逐塊清理 raw_data 的來源，匯入時才實際清理，清理完成的統計在讀完資料後顯示。
+        workers > 1 時交由行程池平行清理，結果與錯誤資料依原始順序產生，與單行程模式完全一致。
+        """
+        if workers != 1:
+            print(f"開始清理資料 (平行模式, workers={workers or os.cpu_count()})...")
+        else:
+            print("開始清理資料...")
+        self.cleaned_data = ChunkSource(self._iter_cleaned, self.raw_data, workers)
+
+    def _iter_cleaned(self, raw_data, workers):
+        counts = dict.fromkeys(SECTIONS, 0)
+        # 讀取在清理中被拉動，load 與 clean 階段的耗時各自獨立計算
+        raw_chunks = self.instrumentation.iter_stage('load', raw_data, rows=lambda chunk: len(chunk[1]))
+        cleaned = self.instrumentation.iter_stage(
+            'clean', iter_clean_chunks(raw_chunks, workers), rows=lambda chunk: len(chunk[1]) + len(chunk[2]),
+        )
+        for section, records, rejects in cleaned:
+            for _, item, error in rejects:
+                self._report_reject(item, error)
+            counts[section] += len(records)
+            yield section, records
         
-        print(f"✅ 清理完成: {len(self.cleaned_data['authors'])} 作者, {len(self.cleaned_data['categories'])} 分類, {len(self.cleaned_data['books'])} 書籍")
+        self.reject_log.flush('錯誤資料')
+        print(f"✅ 清理完成: {counts['authors']} 作者, {counts['categories']} 分類, {counts['books']} 書籍")
     
-    def import_to_django(self):
-        """匯入資料到Django資料庫"""
+    def import_to_django(self, mode='row', batch_size=1000, transaction_batch_size=10000,
+                         update_existing=False, bulk_load=False):
+        """匯入資料到Django資料庫
+
+        mode='row' 逐筆 get_or_create；mode='bulk' 使用批次匯入引擎，
+        batch_size 為每次 bulk_create/IN 查詢的筆數，transaction_batch_size 為每個交易提交的筆數；
+        mode='staging' 經由暫存表以集合式 SQL 合併，適合首次匯入與全量更新，整個匯入為單一交易。
+        bulk_load=True 時匯入期間切換為 SQLite 大量匯入設定（synchronous=OFF），結束後還原；只用於明確的大量匯入。
+        """
+        if mode not in ('row', 'bulk', 'staging'):
+            raise ValueError(f"不支援的匯入模式: {mode}")
+
+        # 逐筆匯入時每筆 post_save 都會要求快取失效，整個匯入結束後再統一執行一次；
+        # import 階段記錄未歸入各區段的時間（交易提交、統計摘要重算等）
+        with self._load_profile(bulk_load), self.instrumentation.stage('import'), invalidation_batch():
+            if mode == 'bulk':
+                return self._bulk_import_to_django(batch_size, transaction_batch_size, update_existing)
+            if mode == 'staging':
+                return self._staging_import_to_django(update_existing)
+            return self._row_import_to_django()
+
+    def _load_profile(self, bulk_load):
+        return bulk_load_mode() if bulk_load else nullcontext()
+
+    def _row_import_to_django(self):
+        """逐筆 get_or_create 匯入"""
         print("開始匯入資料到Django...")
         
         # 建立作者
         author_map = {}
-        for author_data in self.cleaned_data['authors']:
-            try:
-                author, created = Author.objects.get_or_create(
-                    name=author_data['name'],
-                    defaults={
-                        'email': author_data['email'],
-                        'birth_date': author_data['birth_date']
-                    }
-                )
-                author_map[author_data['name']] = author
-                print(f"{'✅ 建立' if created else 'ℹ️ 找到'}作者: {author.name}")
-            except Exception as e:
-                print(f"❌ 建立作者失敗 {author_data['name']}: {e}")
-        
-        # 建立分類
         category_map = {}
-        for category_data in self.cleaned_data['categories']:
-            try:
-                category, created = Category.objects.get_or_create(
-                    name=category_data['name'],
-                    defaults={'description': category_data['description']}
-                )
-                category_map[category_data['name']] = category
-                print(f"{'✅ 建立' if created else 'ℹ️ 找到'}分類: {category.name}")
-            except Exception as e:
-                print(f"❌ 建立分類失敗 {category_data['name']}: {e}")
-        
-        # 建立書籍
-        book_count = 0
-        for book_data in self.cleaned_data['books']:
-            try:
-                author = author_map.get(book_data['author_name'])
-                category = category_map.get(book_data['category_name'])
-                
-                if author and category:
-                    book, created = Book.objects.get_or_create(
-                        title=book_data['title'],
-                        defaults={
-                            'author': author,
-                            'category': category,
-                            'publish_date': book_data['publish_date'],
-                            'price': book_data['price']
-                        }
-                    )
-                    if created:
-                        book_count += 1
-                        print(f"✅ 建立書籍: {book.title}")
-                    else:
-                        print(f"ℹ️ 書籍已存在: {book.title}")
+        created_counts = dict.fromkeys(SECTIONS, 0)
+        for section, records in self._iter_with_progress(self.cleaned_data, '逐筆匯入'):
+            with self.instrumentation.stage(f'import_{section}', len(records)):
+                if section == 'authors':
+                    # 建立作者
+                    for author_data in records:
+                        try:
+                            author, created = Author.objects.get_or_create(
+                                name=author_data.name,
+                                defaults={
+                                    'email': author_data.email,
+                                    'birth_date': author_data.birth_date
+                                }
+                            )
+                            author_map[author_data.name] = author
+                            created_counts[section] += created
+                        except Exception as e:
+                            print(f"❌ 建立作者失敗 {author_data.name}: {e}")
+
+                elif section == 'categories':
+                    # 建立分類
+                    for category_data in records:
+                        try:
+                            category, created = Category.objects.get_or_create(
+                                name=category_data.name,
+                                defaults={'description': category_data.description}
+                            )
+                            category_map[category_data.name] = category
+                            created_counts[section] += created
+                        except Exception as e:
+                            print(f"❌ 建立分類失敗 {category_data.name}: {e}")
+
                 else:
-                    print(f"❌ 警告: 找不到作者 '{book_data['author_name']}' 或分類 '{book_data['category_name']}' - 書籍: {book_data['title']}")
-                    
-            except Exception as e:
-                print(f"❌ 錯誤建立書籍 {book_data['title']}: {e}")
+                    # 建立書籍
+                    for book_data in records:
+                        try:
+                            author = author_map.get(book_data.author_name)
+                            category = category_map.get(book_data.category_name)
+                            
+                            if author and category:
+                                book, created = Book.objects.get_or_create(
+                                    title=book_data.title,
+                                    defaults={
+                                        'author': author,
+                                        'category': category,
+                                        'publish_date': book_data.publish_date,
+                                        'price': book_data.price
+                                    }
+                                )
+                                created_counts[section] += created
+                            else:
+                                self._report_missing_book(book_data)
+                                
+                        except Exception as e:
+                            print(f"❌ 錯誤建立書籍 {book_data.title}: {e}")
         
-        print(f"🎉 成功建立 {book_count} 本新書籍")
+        self.missing_log.flush('找不到作者或分類的書籍')
+        print(f"✅ 建立 {created_counts['authors']} 位作者、{created_counts['categories']} 個分類"
+              f"（已存在者沿用）")
+        print(f"🎉 成功建立 {created_counts['books']} 本新書籍")
+
+    def _bulk_import_to_django(self, batch_size, transaction_batch_size, update_existing):
+        """以批次匯入引擎匯入資料，並顯示每秒處理筆數"""
+        from myapp.bulk_import import BulkImporter
+
+        print(f"開始批次匯入資料到Django (batch_size={batch_size}, 交易批次={transaction_batch_size})...")
+        started = time.perf_counter()
+        importer = BulkImporter(
+            batch_size=batch_size,
+            transaction_batch_size=transaction_batch_size,
+            update_existing=update_existing,
+            instrumentation=self.instrumentation,
+        )
+        try:
+            stats = importer.run(self._iter_with_progress(self.cleaned_data, '批次匯入'))
+        except Exception as e:
+            print(f"❌ 批次匯入失敗: {e}")
+            raise
+
+        self._print_engine_stats('批次匯入完成', stats, importer.missing_books, started)
+        return stats
+
+    def _staging_import_to_django(self, update_existing):
+        """以暫存表合併匯入資料，並顯示每秒處理筆數"""
+        from myapp.staging import StagingLoader
+
+        print("開始暫存表合併匯入資料到Django...")
+        started = time.perf_counter()
+        loader = StagingLoader(update_existing=update_existing, instrumentation=self.instrumentation)
+        try:
+            stats = loader.run(self._iter_with_progress(self.cleaned_data, '暫存表載入'))
+        except Exception as e:
+            print(f"❌ 暫存表匯入失敗 (已全部回滾): {e}")
+            raise
+
+        self._print_engine_stats('暫存表匯入完成', stats, loader.missing_books, started)
+        return stats
+
+    def _print_engine_stats(self, title, stats, missing_books, started):
+        """顯示匯入引擎的統計資料與每秒處理筆數"""
+        for book_data in missing_books:
+            self._report_missing_book(book_data)
+        self.missing_log.flush('找不到作者或分類的書籍')
+
+        labels = {'authors': '作者', 'categories': '分類', 'books': '書籍'}
+        for name, label in labels.items():
+            item = stats[name]
+            rate = item['rows'] / item['seconds'] if item['seconds'] else 0
+            print(f"✅ {label}: 建立 {item['created']}、已存在 {item['existing']}、"
+                  f"更新 {item['updated']}、重複 {item['duplicates']}、略過 {item['skipped']} "
+                  f"({item['rows']} 筆, {rate:,.0f} 筆/秒)")
+
+        elapsed = time.perf_counter() - started
+        total_rows = sum(item['rows'] for item in stats.values())
+        rate = total_rows / elapsed if elapsed else 0
+        print(f"🎉 {title}: 成功建立 {stats['books']['created']} 本新書籍，"
+              f"共處理 {total_rows} 筆，耗時 {elapsed:.2f} 秒 ({rate:,.0f} 筆/秒)")
     
-    def export_data(self, formats=['json', 'csv', 'report']):
-        """多功能資料匯出"""
+    def stream_import(self, json_file_path='sample_data.json', chunk_size=1000, batch_size=1000,
+                      transaction_batch_size=10000, update_existing=False, workers=1, bulk_load=False):
+        """以串流方式載入、清理並匯入JSON檔案
+
+        資料逐塊解析後立即清理並以批次匯入引擎寫入，不保留 raw_data / cleaned_data，
+        記憶體用量只與 chunk_size 及作者、分類的名稱對照表有關，與檔案大小無關。
+        檔案中的 authors 與 categories 需出現在 books 之前，書籍才能找到對應的作者與分類。
+        workers > 1 時清理工作交由行程池執行，與資料庫寫入同時進行。
+        bulk_load=True 時匯入期間切換為 SQLite 大量匯入設定（synchronous=OFF），結束後還原；只用於明確的大量匯入。
+        """
+        from myapp.bulk_import import BulkImporter
+
+        print(f"開始串流匯入 {json_file_path} (chunk_size={chunk_size})...")
+        started = time.perf_counter()
+        engine = BulkImporter(
+            batch_size=batch_size,
+            transaction_batch_size=transaction_batch_size,
+            update_existing=update_existing,
+            instrumentation=self.instrumentation,
+        )
+        importers = {
+            'authors': engine.import_authors,
+            'categories': engine.import_categories,
+            'books': engine.import_books,
+        }
+        loaded = dict.fromkeys(SECTIONS, 0)
+        reject_count = 0
+        chunk_count = 0
+
+        def on_load_error(item, error):
+            nonlocal reject_count
+            reject_count += 1
+            self._report_load_error(item, error)
+
+        raw_chunks = self.instrumentation.iter_stage(
+            'load', iter_raw_chunks(json_file_path, chunk_size, on_load_error, self._on_source_progress),
+            rows=lambda chunk: len(chunk[1]),
+        )
+        cleaned = self.instrumentation.iter_stage(
+            'clean', iter_clean_chunks(raw_chunks, workers), rows=lambda chunk: len(chunk[1]) + len(chunk[2]),
+        )
+        self.progress = ProgressReporter('串流匯入')
+        try:
+            with self._load_profile(bulk_load), self.instrumentation.stage('import'), invalidation_batch():
+                for section, records, rejects in cleaned:
+                    for _, item, error in rejects:
+                        self._report_reject(item, error)
+                    reject_count += len(rejects)
+                    loaded[section] += len(records) + len(rejects)
+
+                    importers[section](records)
+                    for book_data in engine.missing_books:
+                        self._report_missing_book(book_data)
+                    engine.missing_books.clear()
+
+                    chunk_count += 1
+                    self.progress.update(len(records) + len(rejects))
+        except FileNotFoundError:
+            print(f"❌ 找不到JSON檔案: {json_file_path}")
+            return None
+        except json.JSONDecodeError as e:
+            print(f"❌ JSON檔案格式錯誤: {e} (已提交 {chunk_count} 塊)")
+            raise
+        finally:
+            self.progress = None
+        self.reject_log.flush('錯誤資料')
+        self.missing_log.flush('找不到作者或分類的書籍')
+
+        elapsed = time.perf_counter() - started
+        total_rows = sum(loaded.values())
+        rate = total_rows / elapsed if elapsed else 0
+        stats = engine.stats
+        print(f"✅ 串流匯入完成: {loaded['authors']} 作者, {loaded['categories']} 分類, {loaded['books']} 書籍，"
+              f"略過 {reject_count} 筆錯誤資料")
+        print(f"🎉 成功建立 {stats['books']['created']} 本新書籍，耗時 {elapsed:.2f} 秒 ({rate:,.0f} 筆/秒)")
+        return stats
+
+    def pipeline_import(self, json_file_path='sample_data.json', chunk_size=1000, batch_size=1000,
+                        transaction_batch_size=10000, update_existing=False, workers=1, queue_size=4,
+                        bulk_load=False):
+        """以 asyncio 管線匯入：讀取、清理與寫入資料庫三個階段同時進行
+
+        結果與 stream_import 相同；各階段之間的佇列最多 queue_size 塊，下游較慢時上游會等待，
+        整體耗時接近最慢的階段。workers > 1 時清理交由行程池執行。
+        需在沒有執行中事件迴圈的執行緒呼叫（內部使用 asyncio.run）。
+        """
+        import asyncio
+        from myapp.async_pipeline import AsyncImportPipeline
+
+        print(f"開始管線匯入 {json_file_path} (chunk_size={chunk_size}, queue_size={queue_size})...")
+        started = time.perf_counter()
+        self.progress = ProgressReporter('管線匯入')
+        pipeline = AsyncImportPipeline(
+            json_file_path, chunk_size, batch_size, transaction_batch_size, update_existing,
+            workers, queue_size, bulk_load,
+            instrumentation=self.instrumentation, progress=self.progress,
+            on_load_error=self._report_load_error, on_reject=self._report_reject,
+            on_missing_book=self._report_missing_book,
+        )
+        try:
+            stats = asyncio.run(pipeline.run())
+        except FileNotFoundError:
+            print(f"❌ 找不到JSON檔案: {json_file_path}")
+            return None
+        except json.JSONDecodeError as e:
+            print(f"❌ JSON檔案格式錯誤: {e} (已提交 {pipeline.chunks_written} 塊)")
+            raise
+        finally:
+            self.progress = None
+        self.reject_log.flush('錯誤資料')
+        self.missing_log.flush('找不到作者或分類的書籍')
+
+        elapsed = time.perf_counter() - started
+        loaded = pipeline.loaded
+        total_rows = sum(loaded.values())
+        rate = total_rows / elapsed if elapsed else 0
+        print(f"✅ 管線匯入完成: {loaded['authors']} 作者, {loaded['categories']} 分類, {loaded['books']} 書籍，"
+              f"略過 {pipeline.reject_count} 筆錯誤資料")
+        print(f"🎉 成功建立 {stats['books']['created']} 本新書籍，耗時 {elapsed:.2f} 秒 ({rate:,.0f} 筆/秒)")
+        return stats
+
+    def sharded_import(self, source, chunk_size=5000, batch_size=1000, transaction_batch_size=10000,
+                       update_existing=False, workers=None, bulk_load=False):
+        """匯入目錄中（或符合 glob 樣式）的多個部分JSON檔案
+
+        各分片由行程池平行讀取與清理，由目前的執行緒依路徑順序單一寫入資料庫（同名資料保留排序在前的分片中的一筆），
+        作者與分類的名稱對照跨分片共用。讀取失敗的分片整個略過並列在報告中，不影響其他分片。
+        workers 預設為CPU核心數，1 時依序處理。
+        """
+        from myapp.sharded_import import ShardedImporter, resolve_shards
+
+        paths = resolve_shards(source)
+        if not paths:
+            print(f"❌ 找不到任何JSON檔案: {source}")
+            return None
+
+        print(f"開始分片匯入 {source} ({len(paths)} 個檔案, chunk_size={chunk_size})...")
+        started = time.perf_counter()
+        self.progress = ProgressReporter('分片匯入')
+        importer = ShardedImporter(
+            paths, chunk_size, batch_size, transaction_batch_size, update_existing, workers,
+            instrumentation=self.instrumentation, progress=self.progress,
+            on_load_error=self._report_load_error, on_reject=self._report_reject,
+        )
+        try:
+            with self._load_profile(bulk_load), self.instrumentation.stage('import'):
+                stats = importer.run()
+        finally:
+            self.progress = None
+        self.reject_log.flush('錯誤資料')
+        for book_data in importer.engine.missing_books:
+            self._report_missing_book(book_data)
+        self.missing_log.flush('找不到作者或分類的書籍')
+
+        print("\n📊 各分片結果:")
+        for report in importer.reports:
+            name = os.path.basename(report.path)
+            if report.error:
+                print(f"  ❌ {name}: 讀取失敗，未匯入 - {report.error}")
+                continue
+            print(f"  ✅ {name}: {report.rows} 筆，新增 {report.created} 本書籍，略過 {report.rejects} 筆錯誤資料，"
+                  f"延後 {report.deferred} 本 (解析 {report.parse_seconds:.2f} 秒, 寫入 {report.write_seconds:.2f} 秒)")
+
+        failed = [report for report in importer.reports if report.error]
+        elapsed = time.perf_counter() - started
+        total_rows = sum(report.rows for report in importer.reports)
+        rate = total_rows / elapsed if elapsed else 0
+        print(f"✅ 分片匯入完成: {len(paths) - len(failed)}/{len(paths)} 個檔案，共 {total_rows} 筆，"
+              f"略過 {sum(report.rejects for report in importer.reports)} 筆錯誤資料")
+        if failed:
+            print(f"⚠️ {len(failed)} 個檔案讀取失敗，修正後可重新匯入（已存在的資料不會重複建立）")
+        print(f"🎉 成功建立 {stats['books']['created']} 本新書籍，耗時 {elapsed:.2f} 秒 ({rate:,.0f} 筆/秒)")
+        return stats
+
+    def incremental_import(self, json_file_path='sample_data.json', chunk_size=1000, batch_size=1000,
+                           update_existing=False, force=False, bulk_load=False):
+        """可續傳的增量匯入
+
+        只匯入內容指紋與上次不同的資料；每個區塊提交時記錄檢查點，
+        中斷後重新執行會從最後提交的區塊之後繼續。同一檔案已完整匯入過時直接略過（force=True 可強制重跑）。
+        """
+        from myapp.incremental_import import IncrementalImporter
+
+        print(f"開始增量匯入 {json_file_path} (chunk_size={chunk_size})...")
+        started = time.perf_counter()
+        self.progress = ProgressReporter('增量匯入')
+        importer = IncrementalImporter(
+            json_file_path, chunk_size, batch_size, update_existing,
+            instrumentation=self.instrumentation, progress=self.progress,
+        )
+        try:
+            with self._load_profile(bulk_load), self.instrumentation.stage('import'):
+                stats = importer.run(force=force)
+        except FileNotFoundError:
+            print(f"❌ 找不到JSON檔案: {json_file_path}")
+            return None
+        finally:
+            self.progress = None
+
+        if stats is None:
+            print("ℹ️ 此檔案已完整匯入過，沒有需要處理的資料")
+            return None
+
+        for item, error in stats['rejects']:
+            self._report_reject(item, error)
+        self.reject_log.flush('錯誤資料')
+        for book_data in stats['missing_books']:
+            self._report_missing_book(book_data)
+        self.missing_log.flush('找不到作者或分類的書籍')
+
+        elapsed = time.perf_counter() - started
+        if stats['resumed_chunks']:
+            print(f"↪️ 從檢查點續傳: 略過已提交的 {stats['resumed_chunks']} 個區塊")
+        print(f"✅ 增量匯入完成: 處理 {stats['chunks']} 個區塊，匯入 {stats['imported']} 筆新增或變動資料，"
+              f"略過 {stats['unchanged']} 筆未變動、{stats['duplicates']} 筆重複資料，耗時 {elapsed:.2f} 秒")
+        print(f"🎉 成功建立 {importer.engine.stats['books']['created']} 本新書籍")
+        return stats
+
+    def export_data(self, formats=['json', 'csv', 'report'], chunk_size=DEFAULT_CHUNK_SIZE):
+        """多功能資料匯出（單次掃描，同時輸出所有格式）"""
         base_filename = f"data_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
         
         print(f"開始匯出資料 ({', '.join(formats)})...")
         
-        results = {}
-        
-        if 'json' in formats:
-            results['json'] = self.export_to_json(f"{base_filename}.json")
-        
-        if 'csv' in formats:
-            results['csv'] = self.export_to_csv(base_filename)
-        
-        if 'report' in formats:
-            results['report'] = self.create_export_report(base_filename)
+        # 每個資料表只掃描一次，同時產生所有要求的格式
+        sinks = build_export_sinks(formats, base_filename, datetime.now(), csv_tables=self.csv_tables)
+        pipeline = ExportPipeline(sinks, chunk_size)
+        with self.instrumentation.stage('export_pipeline') as metrics:
+            results = pipeline.run()
+            metrics.add_rows(pipeline.rows_scanned)
         
         # 顯示結果
         success_count = sum(1 for r in results.values() if r)
@@ -218,180 +520,12 @@ class DataImporter:
         
         return success_count > 0
 
-    def export_to_json(self, filename):
-        """匯出為JSON格式"""
-        try:
-            export_data = {
-                'metadata': {
-                    'export_time': datetime.now().isoformat(),
-                    'total_records': {
-                        'authors': Author.objects.count(),
-                        'categories': Category.objects.count(),
-                        'books': Book.objects.count()
-                    }
-                },
-                'authors': list(Author.objects.values(
-                    'id', 'name', 'email', 'birth_date'
-                )),
-                'categories': list(Category.objects.values(
-                    'id', 'name', 'description'
-                )),
-                'books': list(Book.objects.values(
-                    'id', 'title', 'author_id', 'category_id', 
-                    'publish_date', 'price', 'is_available'
-                ))
-            }
-            
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(export_data, f, ensure_ascii=False, indent=2, default=str)
-            
-            print(f"✅ JSON匯出完成: {filename}")
-            return True
-            
-        except Exception as e:
-            print(f"❌ JSON匯出失敗: {e}")
-            return False
-
-    def export_to_csv(self, base_filename):
-        """匯出為CSV格式"""
-        try:
-            # 作者CSV
-            authors = Author.objects.all()
-            with open(f'{base_filename}_authors.csv', 'w', newline='', encoding='utf-8-sig') as f:
-                writer = csv.writer(f)
-                writer.writerow(['ID', '姓名', '電子郵件', '出生日期'])
-                for author in authors:
-                    writer.writerow([
-                        author.id,
-                        author.name,
-                        author.email,
-                        author.birth_date.strftime('%Y-%m-%d') if author.birth_date else ''
-                    ])
-            
-            # 分類CSV
-            categories = Category.objects.all()
-            with open(f'{base_filename}_categories.csv', 'w', newline='', encoding='utf-8-sig') as f:
-                writer = csv.writer(f)
-                writer.writerow(['ID', '分類名稱', '描述'])
-                for category in categories:
-                    writer.writerow([
-                        category.id,
-                        category.name,
-                        category.description
-                    ])
-            
-            # 書籍CSV（包含關聯資訊）
-            books = Book.objects.select_related('author', 'category').all()
-            with open(f'{base_filename}_books.csv', 'w', newline='', encoding='utf-8-sig') as f:
-                writer = csv.writer(f)
-                writer.writerow(['ID', '書名', '作者ID', '作者', '分類ID', '分類', '出版日期', '價格', '是否可借'])
-                for book in books:
-                    writer.writerow([
-                        book.id,
-                        book.title,
-                        book.author.id,
-                        book.author.name,
-                        book.category.id,
-                        book.category.name,
-                        book.publish_date.strftime('%Y-%m-%d'),
-                        float(book.price),
-                        '是' if book.is_available else '否'
-                    ])
-            
-            print(f"✅ CSV匯出完成: {base_filename}_*.csv")
-            return True
-            
-        except Exception as e:
-            print(f"❌ CSV匯出失敗: {e}")
-            return False
-
-    def create_export_report(self, base_filename):
-        """建立詳細的匯出報告"""
-        try:
-            authors = Author.objects.all()
-            categories = Category.objects.all()
-            books = Book.objects.all()
-            
-            report = f"""
-資料匯出詳細報告
-================
-
-基本資訊:
----------
-匯出時間: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-匯出檔案基礎名稱: {base_filename}
-
-資料統計:
----------
-作者數量: {authors.count()}
-分類數量: {categories.count()}  
-書籍數量: {books.count()}
-總記錄數: {authors.count() + categories.count() + books.count()}
-
-作者列表:
----------
-"""
-            for author in authors:
-                book_count = Book.objects.filter(author=author).count()
-                report += f"- {author.name} ({author.email}) - 著作: {book_count}本\n"
-            
-            report += f"""
-分類列表:
----------
-"""
-            for category in categories:
-                book_count = Book.objects.filter(category=category).count()
-                report += f"- {category.name} - 書籍: {book_count}本\n"
-                if category.description:
-                    report += f"  描述: {category.description}\n"
-            
-            report += f"""
-書籍價格統計:
-------------
-"""
-            if books.exists():
-                highest_price_book = books.order_by('-price').first()
-                lowest_price_book = books.order_by('price').first()
-                avg_price = books.aggregate(avg_price=Avg('price'))['avg_price']
-                report += f"""最高價格: {highest_price_book.price} ({highest_price_book.title})
-最低價格: {lowest_price_book.price} ({lowest_price_book.title})
-平均價格: {avg_price:.2f}
-"""
-            else:
-                report += "無書籍資料\n"
-            
-            report += f"""
-匯出檔案:
----------
-1. {base_filename}.json - JSON格式完整資料
-2. {base_filename}_authors.csv - 作者資料表
-3. {base_filename}_categories.csv - 分類資料表
-4. {base_filename}_books.csv - 書籍資料表
-5. {base_filename}_report.txt - 本報告檔案
-
-注意事項:
----------
-- 所有檔案使用UTF-8編碼
-- CSV檔案適合用Excel開啟編輯
-- JSON檔案包含完整的資料關係
-- 建議定期備份重要資料
-"""
-            
-            with open(f'{base_filename}_report.txt', 'w', encoding='utf-8') as f:
-                f.write(report)
-            
-            print(f"✅ 匯出報告生成完成: {base_filename}_report.txt")
-            return True
-            
-        except Exception as e:
-            print(f"❌ 報告生成失敗: {e}")
-            return False
-    
     def check_data_in_admin(self):
         """檢查資料是否可以在管理面板查看"""
-        total_authors = Author.objects.count()
-        total_categories = Category.objects.count()
-        total_books = Book.objects.count()
+        counts = model_counts()
+        total_authors = counts['authors']
+        total_categories = counts['categories']
+        total_books = counts['books']
         
         print("\n=== 資料統計 ===")
         print(f"作者數量: {total_authors}")
@@ -409,6 +543,14 @@ class DataImporter:
         print("2. python manage.py runserver")
         print("3. 瀏覽 http://localhost:8000/admin")
 
+    def emit_metrics(self, path=None):
+        """顯示各階段量測結果，並以一行JSON附加到 path 或 settings.METRICS_FILE"""
+        self.instrumentation.print_summary()
+        summary = self.instrumentation.emit(path)
+        if path or settings.METRICS_FILE:
+            print(f"📊 量測結果已寫入 {path or settings.METRICS_FILE}")
+        return summary
+
 def main():
     """主執行函數"""
     importer = DataImporter()
@@ -430,6 +572,7 @@ def main():
         
         # d) 檢查結果
         importer.check_data_in_admin()
+        importer.emit_metrics()
         
     except Exception as e:
         print(f"❌ 執行錯誤: {e}")
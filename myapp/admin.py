@@ -1,7 +1,157 @@
 # myapp/admin.py
+"""管理後台
+
+書籍列表在書籍數量很大時仍需維持回應速度：
+- 作者與分類在同一個 JOIN 查詢中取得，不會逐列查詢
+- 搜尋以名稱/書名的唯一索引做前綴比對（區分大小寫），不使用無法走索引的 LIKE '%...%'
+- 只允許以有索引的欄位排序與篩選
+- 分頁器不對整個書籍資料表執行 COUNT(*)，筆數取自 AuthorStats / CategoryStats
+"""
 from django.contrib import admin
-from .models import Author, Category, Book
+from django.contrib.admin.options import ShowFacets
+from django.contrib.admin.views.main import (
+    ALL_VAR, ERROR_FLAG, IS_FACETS_VAR, IS_POPUP_VAR, ORDER_VAR, PAGE_VAR, SEARCH_VAR, TO_FIELD_VAR,
+)
+from django.core.paginator import Paginator
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.urls import reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+
+from .models import Author, Category, Book, AuthorStats, CategoryStats
+
+# 不影響列表筆數的查詢參數
+NON_FILTER_PARAMS = {ALL_VAR, ERROR_FLAG, IS_FACETS_VAR, IS_POPUP_VAR, ORDER_VAR, PAGE_VAR, TO_FIELD_VAR}
+
+# 書籍列表可由統計摘要取得筆數的群組篩選參數
+BOOK_GROUP_FILTERS = {
+    'author__id__exact': AuthorStats,
+    'category__id__exact': CategoryStats,
+}
+
+
+class EstimatedCountPaginator(Paginator):
+    """不對整個查詢執行 COUNT(*) 的分頁器
+
+    count_estimate 有值時直接作為筆數；否則只計數到 count_limit 筆為止，
+    超過的部分不提供分頁（請以篩選或搜尋縮小範圍）。
+    """
+    count_limit = 10000
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True, count_estimate=None):
+        super().__init__(object_list, per_page, orphans, allow_empty_first_page)
+        self.count_estimate = count_estimate
+
+    @cached_property
+    def count(self):
+        if self.count_estimate is not None:
+            return self.count_estimate
+        return self.object_list[:self.count_limit].count()
+
+
+class PrefixSearchMixin:
+    """以 search_fields 第一個欄位的索引做前綴搜尋
+
+    以範圍條件（>= 關鍵字 且 < 關鍵字 + 最大字元）比對，SQLite 可直接使用唯一索引；
+    自動完成欄位（autocomplete_fields）也會使用這個搜尋。
+    """
+    search_help_text = "依名稱開頭搜尋（區分大小寫）"
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        field = self.search_fields[0]
+        return queryset.filter(**{f'{field}__gte': term, f'{field}__lt': term + '\U0010ffff'}), False
+
+
+def _book_list_link(obj, lookup, count):
+    url = reverse('admin:myapp_book_changelist')
+    return format_html('<a href="{}?{}={}">{}</a>', url, lookup, obj.pk, count)
+
+
+@admin.register(Author)
+class AuthorAdmin(PrefixSearchMixin, admin.ModelAdmin):
+    ordering = ('name',)
+    list_display = ('name', 'email', 'birth_date', 'book_count')
+    search_fields = ('name',)
+    sortable_by = ('name', 'book_count')
+
+    def get_queryset(self, request):
+        # 書籍數量讀自統計摘要（LEFT JOIN），不對書籍資料表 GROUP BY
+        return super().get_queryset(request).annotate(book_count=Coalesce('stats__book_count', 0))
+
+    @admin.display(description='書籍數量', ordering='book_count')
+    def book_count(self, obj):
+        return _book_list_link(obj, 'author__id__exact', obj.book_count)
+
+
+@admin.register(Category)
+class CategoryAdmin(PrefixSearchMixin, admin.ModelAdmin):
+    ordering = ('name',)
+    list_display = ('name', 'description', 'book_count')
+    search_fields = ('name',)
+    sortable_by = ('name', 'book_count')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(book_count=Coalesce('stats__book_count', 0))
+
+    @admin.display(description='書籍數量', ordering='book_count')
+    def book_count(self, obj):
+        return _book_list_link(obj, 'category__id__exact', obj.book_count)
+
+
+@admin.register(Book)
+class BookAdmin(PrefixSearchMixin, admin.ModelAdmin):
+    list_display = ('title', 'author', 'category', 'publish_date', 'price', 'is_available')
+    list_select_related = ('author', 'category')
+    list_filter = ('category', 'is_available')
+    search_fields = ('title',)
+    search_help_text = "依書名開頭搜尋（區分大小寫）"
+    # 只允許以有索引的欄位排序（書名唯一索引、價格索引）
+    sortable_by = ('title', 'price')
+    autocomplete_fields = ('author', 'category')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    # 篩選選項的計數（facets）需要對每個選項執行 COUNT，關閉
+    show_facets = ShowFacets.NEVER
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        return self.paginator(
+            queryset, per_page, orphans, allow_empty_first_page,
+            count_estimate=self.estimate_count(request),
+        )
+
+    def estimate_count(self, request):
+        """由統計摘要取得目前篩選條件下的書籍數量；無法由摘要得知時回傳 None
+
+        支援不篩選、依單一作者或分類、依是否可借，以及兩者的組合。
+        """
+        params = {key: value for key, value in request.GET.items() if key not in NON_FILTER_PARAMS}
+        if params.pop(SEARCH_VAR, '').strip():
+            return None
+        available = params.pop('is_available__exact', None)
+        if available not in (None, '0', '1'):
+            return None
+        if len(params) > 1:
+            return None
+
+        if params:
+            lookup, value = params.popitem()
+            stats_model = BOOK_GROUP_FILTERS.get(lookup)
+            if stats_model is None or not value.isdigit():
+                return None
+            stats = stats_model.objects.filter(pk=value).values('book_count', 'available_count').first()
+            stats = stats or {'book_count': 0, 'available_count': 0}
+        else:
+            stats = CategoryStats.objects.aggregate(
+                book_count=Coalesce(Sum('book_count'), 0),
+                available_count=Coalesce(Sum('available_count'), 0),
+            )
 
-admin.site.register(Author)
-admin.site.register(Category)
-admin.site.register(Book)
\ No newline at end of file
+        if available == '1':
+            return stats['available_count']
+        if available == '0':
+            return stats['book_count'] - stats['available_count']
+        return stats['book_count']
@@ -0,0 +1,190 @@
+# myapp/async_pipeline.py
+"""以 asyncio 管線化的串流匯入
+
+讀取、清理與寫入三個階段同時進行，階段之間以有上限的佇列連接：
+- reader：在專用執行緒中逐塊解析JSON（iter_raw_chunks），放入 raw 佇列
+- cleaner：將每塊交給執行器清理（workers > 1 時為行程池），清理中的區塊以 future 依原始順序放入 cleaned 佇列
+- writer：唯一寫入資料庫的階段，依序取得清理結果，經 sync_to_async(thread_sensitive=True)
+  在同一個執行緒中以 BulkImporter 分批提交（SQLite 同時只允許一個寫入者）
+
+佇列已滿時上游會等待（背壓），同時在記憶體中的區塊最多約 2 × queue_size 個。
+任一階段失敗或 run() 被取消時，其他階段一併取消，已提交的交易保留（與 stream_import 相同）。
+整體耗時接近最慢的階段，而不是各階段的總和。
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+
+from .bulk_import import BulkImporter
+from .cleaning import clean_records
+from .records import SECTIONS
+from .sqlite_tuning import bulk_load_mode
+from .stats import invalidation_batch
+from .streaming import iter_raw_chunks
+
+DEFAULT_QUEUE_SIZE = 4
+
+# 佇列中表示上游已結束
+_DONE = object()
+
+
+def _timed_clean(section, raw_records):
+    """在執行器中清理一塊資料，回傳 (records, rejects, 清理秒數)"""
+    started = time.perf_counter()
+    records, rejects = clean_records(section, raw_records)
+    return records, rejects, time.perf_counter() - started
+
+
+class AsyncImportPipeline:
+    """讀取、清理與寫入同時進行的匯入管線
+
+    on_load_error(item, error) 與 on_reject(item, error) 在事件迴圈中呼叫，
+    on_missing_book(record) 在寫入執行緒中呼叫。傳入 instrumentation 時，
+    load / clean 以 record() 記錄（在其他執行緒量測），import_<區段> 由寫入執行緒中的 BulkImporter 記錄。
+    """
+
+    def __init__(self, json_file_path, chunk_size=1000, batch_size=1000, transaction_batch_size=10000,
+                 update_existing=False, workers=1, queue_size=DEFAULT_QUEUE_SIZE, bulk_load=False,
+                 using='default', instrumentation=None, progress=None,
+                 on_load_error=None, on_reject=None, on_missing_book=None):
+        if queue_size < 1:
+            raise ValueError("queue_size 必須大於 0")
+        self.json_file_path = json_file_path
+        self.chunk_size = chunk_size
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.bulk_load = bulk_load
+        self.using = using
+        self.instrumentation = instrumentation
+        self.progress = progress
+        self.on_load_error = on_load_error
+        self.on_reject = on_reject
+        self.on_missing_book = on_missing_book
+        self.engine = BulkImporter(
+            batch_size=batch_size,
+            transaction_batch_size=transaction_batch_size,
+            update_existing=update_existing,
+            using=using,
+            instrumentation=instrumentation,
+        )
+        self.loaded = dict.fromkeys(SECTIONS, 0)
+        self.reject_count = 0
+        self.chunks_written = 0
+        self._load_errors = []
+        self._position = (None, None)
+        self._writer_context = None
+
+    async def run(self):
+        """執行匯入，回傳 BulkImporter 的統計資料"""
+        loop = asyncio.get_running_loop()
+        raw_queue = asyncio.Queue(self.queue_size)
+        cleaned_queue = asyncio.Queue(self.queue_size)
+        chunks = iter_raw_chunks(self.json_file_path, self.chunk_size, self._load_errors.append, self._on_progress)
+
+        await sync_to_async(self._open_writer, thread_sensitive=True)()
+        reader_executor = ThreadPoolExecutor(1, thread_name_prefix='import-reader')
+        if self.workers > 1:
+            clean_executor = ProcessPoolExecutor(self.workers)
+        else:
+            clean_executor = ThreadPoolExecutor(1, thread_name_prefix='import-cleaner')
+        tasks = [
+            asyncio.create_task(self._read(loop, reader_executor, chunks, raw_queue)),
+            asyncio.create_task(self._clean(loop, clean_executor, raw_queue, cleaned_queue)),
+            asyncio.create_task(self._write(cleaned_queue)),
+        ]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # 執行中的讀取與清理無法中斷，等待結束後才關閉產生器與執行器
+            clean_executor.shutdown(wait=True, cancel_futures=True)
+            reader_executor.shutdown(wait=True, cancel_futures=True)
+            chunks.close()
+            # 寫入執行緒會先完成進行中的區塊，才執行收尾（還原設定、統一失效快取）
+            await sync_to_async(self._close_writer, thread_sensitive=True)()
+        return self.engine.stats
+
+    def _on_progress(self, position, total):
+        # 在讀取執行緒中呼叫，只記錄位置；位置隨區塊傳到寫入階段，進度以已寫入的區塊為準
+        self._position = (position, total)
+
+    def _record(self, name, seconds, rows):
+        if self.instrumentation is not None:
+            self.instrumentation.record(name, seconds, rows)
+
+    async def _read(self, loop, executor, chunks, raw_queue):
+        while True:
+            started = time.perf_counter()
+            chunk = await loop.run_in_executor(executor, next, chunks, _DONE)
+            for item, error in self._load_errors:
+                self.reject_count += 1
+                if self.on_load_error is not None:
+                    self.on_load_error(item, error)
+            self._load_errors.clear()
+            if chunk is _DONE:
+                await raw_queue.put(_DONE)
+                return
+            self._record('load', time.perf_counter() - started, len(chunk[1]))
+            await raw_queue.put((*chunk, self._position))
+
+    async def _clean(self, loop, executor, raw_queue, cleaned_queue):
+        while True:
+            chunk = await raw_queue.get()
+            if chunk is _DONE:
+                await cleaned_queue.put(_DONE)
+                return
+            section, raw_records, position = chunk
+            future = loop.run_in_executor(executor, _timed_clean, section, raw_records)
+            await cleaned_queue.put((section, len(raw_records), position, future))
+
+    async def _write(self, cleaned_queue):
+        write_chunk = sync_to_async(self._write_chunk, thread_sensitive=True)
+        while True:
+            item = await cleaned_queue.get()
+            if item is _DONE:
+                return
+            section, raw_count, position, future = item
+            records, rejects, seconds = await future
+            self._record('clean', seconds, raw_count)
+            self.reject_count += len(rejects)
+            for _, raw_item, error in rejects:
+                if self.on_reject is not None:
+                    self.on_reject(raw_item, error)
+            self.loaded[section] += raw_count
+
+            await write_chunk(section, records)
+            if self.progress is not None:
+                self.progress.update(raw_count, *position)
+
+    def _open_writer(self):
+        """在寫入執行緒中切換大量匯入設定並開始累積快取失效（兩者都以執行緒的連線/狀態為準）"""
+        with ExitStack() as stack:
+            if self.bulk_load:
+                stack.enter_context(bulk_load_mode(self.using))
+            stack.enter_context(invalidation_batch())
+            self._writer_context = stack.pop_all()
+
+    def _write_chunk(self, section, records):
+        getattr(self.engine, f'import_{section}')(records)
+        # 在寫入執行緒中計數：寫入期間被取消時區塊仍會提交，計數需包含它
+        self.chunks_written += 1
+        if self.on_missing_book is not None:
+            for record in self.engine.missing_books:
+                self.on_missing_book(record)
+        self.engine.missing_books.clear()
+
+    def _close_writer(self):
+        try:
+            self._writer_context.close()
+        finally:
+            # 寫入執行緒的連線不會再被使用
+            connections[self.using].close()
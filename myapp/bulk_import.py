@@ -0,0 +1,310 @@
+# myapp/bulk_import.py
+import time
+from contextlib import nullcontext
+from typing import NamedTuple
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import Author, Category, Book, ChangeSequence
+from .stats import books_added, books_changed, invalidate as invalidate_stats, invalidation_batch
+
+
+def chunked(items, size):
+    """將序列切成固定大小的區塊"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class ResolvedBook(NamedTuple):
+    """外鍵已對應為主鍵的書籍資料"""
+    title: str
+    author_id: int
+    category_id: int
+    publish_date: object
+    price: object
+
+
+class _IdBitmap:
+    """以位元圖記錄主鍵集合（每個主鍵一個位元），記憶體用量只與最大主鍵相關，與匯入筆數無關"""
+
+    def __init__(self):
+        self._bits = bytearray()
+
+    def add(self, pk):
+        index = pk >> 3
+        if index >= len(self._bits):
+            self._bits.extend(bytes(index + 1 - len(self._bits)))
+        self._bits[index] |= 1 << (pk & 7)
+
+    def __contains__(self, pk):
+        index = pk >> 3
+        return index < len(self._bits) and bool(self._bits[index] & (1 << (pk & 7)))
+
+
+def _dedupe(rows, key):
+    """依自然鍵去除同一批中的重複資料，保留第一筆（與逐筆 get_or_create 的結果一致）"""
+    seen = set()
+    unique_rows = []
+    for row in rows:
+        value = getattr(row, key)
+        if value in seen:
+            continue
+        seen.add(value)
+        unique_rows.append(row)
+    return unique_rows
+
+
+class BulkImporter:
+    """批次匯入引擎
+
+    以少量集合查詢（name__in / title__in，皆有唯一索引）找出既有資料，
+    再將新資料以分批 bulk_create 寫入，並以可設定的交易批次提交。
+    預設保持「不存在則建立，存在則保留」的語意，寫入時忽略自然鍵衝突，
+    查詢後才被其他程序寫入的同名資料不會造成失敗；
+    update_existing=True 時才會以自然鍵衝突時更新（upsert）的方式更新內容有變動的既有資料。
+    資料分塊傳入時，先前區塊已處理過的同名資料視為重複而保留第一筆，不需在記憶體中保留所有處理過的自然鍵：
+    本次寫入的資料由查詢既有資料時的 change_seq 辨識（本次匯入使用的序號），
+    匯入前已存在、本次未改寫的資料則記錄主鍵位元圖；重複出現一律計入 duplicates，與資料是否原本就存在無關。
+    傳入 instrumentation 時，各區段的匯入分別記錄在 import_authors / import_categories / import_books 階段。
+    """
+
+    def __init__(self, batch_size=1000, transaction_batch_size=10000,
+                 update_existing=False, using='default', instrumentation=None):
+        if batch_size < 1 or transaction_batch_size < 1:
+            raise ValueError("batch_size 與 transaction_batch_size 必須大於 0")
+        self.batch_size = batch_size
+        self.transaction_batch_size = max(transaction_batch_size, batch_size)
+        self.update_existing = update_existing
+        self.using = using
+        self.instrumentation = instrumentation
+
+        # 自然鍵 → 主鍵，只包含本次來源資料中出現的作者與分類
+        self.author_ids = {}
+        self.category_ids = {}
+        self.missing_books = []
+        # 最近一次 import_<區段> 中，內容與來源不同、但未更新（update_existing=False）而保留原樣的既有資料自然鍵
+        self.kept_keys = []
+        # 本次匯入寫入時使用的變動序號（每個交易一個），用於辨識先前區塊已寫入的資料
+        self.change_seqs = set()
+        # 模型 → 本次匯入已處理過的既有資料主鍵
+        self.seen_ids = {}
+        self.stats = {
+            name: {'rows': 0, 'created': 0, 'existing': 0, 'updated': 0,
+                   'duplicates': 0, 'skipped': 0, 'seconds': 0.0}
+            for name in ('authors', 'categories', 'books')
+        }
+
+    @property
+    def lookup_size(self):
+        """IN 查詢每批的參數數量，不超過資料庫的參數上限"""
+        max_params = connections[self.using].features.max_query_params
+        return min(self.batch_size, max_params) if max_params else self.batch_size
+
+    def run(self, chunks):
+        """依序匯入 (區段名稱, record 列表) 區塊，回傳統計資料
+
+        作者與分類的區塊需出現在書籍之前，書籍才能找到對應的作者與分類。
+        """
+        importers = {
+            'authors': self.import_authors,
+            'categories': self.import_categories,
+            'books': self.import_books,
+        }
+        with invalidation_batch():
+            for section, records in chunks:
+                importers[section](records)
+        return self.stats
+
+    def import_authors(self, rows):
+        """批次匯入作者"""
+        with self._stage('import_authors', len(rows)):
+            return self._import_model(
+                Author, 'name', ('email', 'birth_date'), rows,
+                self.author_ids, self.stats['authors'],
+            )
+
+    def import_categories(self, rows):
+        """批次匯入分類"""
+        with self._stage('import_categories', len(rows)):
+            return self._import_model(
+                Category, 'name', ('description',), rows,
+                self.category_ids, self.stats['categories'],
+            )
+
+    def import_books(self, rows):
+        """批次匯入書籍（作者與分類需已出現在本次來源資料中）"""
+        with self._stage('import_books', len(rows)):
+            return self._import_books(rows)
+
+    def _import_books(self, rows):
+        resolved = []
+        for row in rows:
+            author_id = self.author_ids.get(row.author_name)
+            category_id = self.category_ids.get(row.category_name)
+            if author_id is None or category_id is None:
+                self.stats['books']['skipped'] += 1
+                self.missing_books.append(row)
+                continue
+            resolved.append(ResolvedBook(row.title, author_id, category_id, row.publish_date, row.price))
+
+        return self._import_model(
+            Book, 'title', ('author_id', 'category_id', 'publish_date', 'price'),
+            resolved, None, self.stats['books'],
+            extra_rows=len(rows) - len(resolved),
+        )
+
+    def defer_books(self, rows):
+        """將書籍直接加入 missing_books（計入筆數與略過數），之後由 retry_missing_books() 依序重試
+
+        分片匯入時，與先前延後的書籍同名的書籍也需延後，重試時才能依來源順序保留第一筆。
+        """
+        self.stats['books']['rows'] += len(rows)
+        self.stats['books']['skipped'] += len(rows)
+        self.missing_books.extend(rows)
+
+    def retry_missing_books(self):
+        """重新匯入 missing_books 中的書籍（例如作者或分類在之後的來源檔才出現），仍找不到的留在 missing_books
+
+        先前略過時已計入的筆數與略過數會先扣除，量測的 import_books 階段也不再計入這些筆數，不會重複計算。
+        """
+        rows, self.missing_books = self.missing_books, []
+        self.stats['books']['rows'] -= len(rows)
+        self.stats['books']['skipped'] -= len(rows)
+        with self._stage('import_books', 0):
+            return self._import_books(rows)
+
+    def _stage(self, name, rows):
+        if self.instrumentation is None:
+            return nullcontext()
+        return self.instrumentation.stage(name, rows)
+
+    def register_existing(self, section, names):
+        """將資料庫中已存在的作者或分類加入名稱對照表
+
+        增量匯入略過未變動的作者與分類時使用，讓後續書籍仍能對應到它們。
+        """
+        model, id_map = {
+            'authors': (Author, self.author_ids),
+            'categories': (Category, self.category_ids),
+        }[section]
+        missing = [name for name in dict.fromkeys(names) if name not in id_map]
+        found = self._fetch_existing(model, 'name', (), missing)
+        id_map.update((name, row['pk']) for name, row in found.items())
+
+    def _import_model(self, model, key, fields, rows, id_map, stats, extra_rows=0):
+        started = time.perf_counter()
+        unique_rows = _dedupe(rows, key)
+        existing = self._fetch_existing(
+            model, key, (*fields, 'change_seq'), [getattr(row, key) for row in unique_rows])
+        # 本次匯入先前的區塊已處理過的資料：保留第一筆，之後的同名資料視為重複
+        seen = self.seen_ids.setdefault(model, _IdBitmap())
+        handled = {value for value, row in existing.items()
+                   if row['change_seq'] in self.change_seqs or row['pk'] in seen}
+        if handled:
+            unique_rows = [row for row in unique_rows if getattr(row, key) not in handled]
+        for row in unique_rows:
+            current = existing.get(getattr(row, key))
+            if current is not None:
+                seen.add(current['pk'])
+        stats['rows'] += len(rows) + extra_rows
+        stats['duplicates'] += len(rows) - len(unique_rows)
+
+        new_objects = [
+            model(**{key: getattr(row, key), **{field: getattr(row, field) for field in fields}})
+            for row in unique_rows if getattr(row, key) not in existing
+        ]
+        self._write_in_transactions(
+            new_objects,
+            lambda objs: model.objects.using(self.using).bulk_create(
+                objs, batch_size=self.batch_size, ignore_conflicts=True),
+            after_write=self._books_inserted if model is Book else None,
+        )
+        stats['created'] += len(new_objects)
+        stats['existing'] += len(unique_rows) - len(new_objects)
+
+        differing = [
+            row for row in unique_rows
+            if getattr(row, key) in existing
+            and any(existing[getattr(row, key)][field] != getattr(row, field) for field in fields)
+        ]
+        self.kept_keys = [] if self.update_existing else [getattr(row, key) for row in differing]
+        changed = []
+        if self.update_existing:
+            # 以自然鍵 upsert；衝突時的 UPDATE 不會經過 auto_now，需明列 updated_at 與 change_seq
+            now = timezone.now()
+            changed = [
+                model(updated_at=now, **{key: getattr(row, key), **{field: getattr(row, field) for field in fields}})
+                for row in differing
+            ]
+            update_fields = [*fields, 'updated_at', 'change_seq']
+            self._write_in_transactions(
+                changed,
+                lambda objs: model.objects.using(self.using).bulk_create(
+                    objs, batch_size=self.batch_size, update_conflicts=True,
+                    unique_fields=[key], update_fields=update_fields),
+                after_write=(lambda objs, change_seq: self._books_updated(objs, existing)) if model is Book else None,
+            )
+            stats['updated'] += len(changed)
+
+        if new_objects or changed:
+            # bulk_create 不會送出 post_save，需自行讓統計快取失效（群組統計已在各交易中更新）
+            invalidate_stats(model, count_changed=bool(new_objects), using=self.using)
+
+        if id_map is not None:
+            id_map.update((value, row['pk']) for value, row in existing.items())
+            unresolved = []
+            for obj in new_objects:
+                if obj.pk is None:
+                    unresolved.append(getattr(obj, key))
+                else:
+                    id_map[getattr(obj, key)] = obj.pk
+            if unresolved:
+                # ignore_conflicts 時 bulk_create 不回傳主鍵，再查一次補齊
+                refetched = self._fetch_existing(model, key, (), unresolved)
+                id_map.update((value, row['pk']) for value, row in refetched.items())
+
+        stats['seconds'] += time.perf_counter() - started
+        return stats
+
+    def _fetch_existing(self, model, key, fields, values):
+        """以分批 IN 查詢取得既有資料（自然鍵有唯一限制，每個鍵至多一筆）"""
+        existing = {}
+        queryset = model.objects.using(self.using).order_by('pk')
+        for chunk in chunked(values, self.lookup_size):
+            for row in queryset.filter(**{f'{key}__in': chunk}).values('pk', key, *fields):
+                existing.setdefault(row[key], row)
+        return existing
+
+    def _write_in_transactions(self, objects, write, after_write=None):
+        """分批在交易中寫入；每個交易取得一個變動序號標記其中的資料，供增量匯出辨識
+
+        after_write(chunk, change_seq) 在同一個交易中、寫入之後呼叫（更新群組統計）。
+        """
+        for chunk in chunked(objects, self.transaction_batch_size):
+            with transaction.atomic(using=self.using):
+                change_seq = ChangeSequence.next_value(self.using)
+                self.change_seqs.add(change_seq)
+                for obj in chunk:
+                    obj.change_seq = change_seq
+                write(chunk)
+                if after_write is not None:
+                    after_write(chunk, change_seq)
+
+    def _books_inserted(self, books, change_seq):
+        # ignore_conflicts 略過的書籍（已由其他連線寫入）不會標記本交易的序號，不會重複計入
+        books_added(
+            Book.objects.using(self.using).filter(change_seq=change_seq),
+            {book.author_id for book in books},
+            {book.category_id for book in books},
+            using=self.using,
+        )
+
+    def _books_updated(self, books, existing):
+        # 修改的書籍可能換了作者或分類，原本的群組也需要重算
+        previous = [existing[book.title] for book in books]
+        books_changed(
+            {book.author_id for book in books} | {row['author_id'] for row in previous},
+            {book.category_id for book in books} | {row['category_id'] for row in previous},
+            using=self.using,
+        )
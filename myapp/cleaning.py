@@ -0,0 +1,98 @@
+# myapp/cleaning.py
+"""資料清理函式（不依賴 Django，可在其他行程中執行）"""
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .parsers import parse_iso_date, parse_price
+from .records import AuthorRecord, BookRecord, CategoryRecord
+
+
+def clean_author(item):
+    """清理作者資料"""
+    return AuthorRecord(
+        item.name.strip(),  # 去除前後空格
+        item.email.strip().lower(),  # 轉小寫
+        parse_iso_date(item.birth_date) if item.birth_date else None,
+    )
+
+
+def clean_category(item):
+    """清理分類資料"""
+    return CategoryRecord(item.name.strip(), item.description.strip())
+
+
+def clean_book(item):
+    """清理書籍資料"""
+    return BookRecord(
+        item.title.strip(),
+        item.author_name.strip(),
+        item.category_name.strip(),
+        parse_iso_date(item.publish_date),
+        parse_price(item.price),
+    )
+
+
+CLEANERS = {
+    'authors': clean_author,
+    'categories': clean_category,
+    'books': clean_book,
+}
+
+
+def clean_records(section, items, start_index=0):
+    """清理同一區段的一批原始資料
+
+    回傳 (records, rejects)：records 為清理後的 record 列表，
+    rejects 為 (原始索引, 原始資料, 錯誤訊息) 的列表。
+    """
+    cleaner = CLEANERS[section]
+    records = []
+    rejects = []
+    for index, item in enumerate(items, start_index):
+        try:
+            records.append(cleaner(item))
+        except Exception as e:
+            rejects.append((index, item, str(e)))
+    return records, rejects
+
+
+def _clean_job(job):
+    section, start_index, items = job
+    records, rejects = clean_records(section, items, start_index)
+    return section, records, rejects
+
+
+def _number_jobs(chunks):
+    start_index = 0
+    for section, items in chunks:
+        yield section, start_index, items
+        start_index += len(items)
+
+
+def iter_clean_chunks(chunks, workers=None, max_pending=None):
+    """清理 (區段名稱, 原始資料列表) 區塊序列，產生 (區段名稱, records, rejects)
+
+    workers > 1 時交由行程池平行清理，同時最多 max_pending 個區塊在處理中；
+    結果一律依輸入順序產生，rejects 的索引為整個序列中的位置，因此與單行程結果完全相同。
+    """
+    workers = workers or os.cpu_count() or 1
+    jobs = _number_jobs(chunks)
+    if workers <= 1:
+        for job in jobs:
+            yield _clean_job(job)
+        return
+
+    max_pending = max_pending or workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        try:
+            for job in jobs:
+                pending.append(pool.submit(_clean_job, job))
+                if len(pending) >= max_pending:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,104 @@
+# myapp/concurrent_export.py
+"""以執行緒池或行程池同時匯出多種格式
+
+每個匯出工作（JSON、每個CSV資料表、報告統計）各自使用工作執行緒/行程自己的資料庫連線，
+輸出先寫入暫存檔，成功後才以 os.replace 換成正式檔名，失敗時不會留下不完整的檔案。
+各工作獨立讀取資料庫，不共用同一個交易快照。
+"""
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.db import connections
+
+from .exporting import CSV_TABLES, DEFAULT_CHUNK_SIZE, write_csv_table, write_json_export
+from .stats import report_stats
+
+# format: 'json' / 'csv' / 'report'；target: 輸出檔名（報告統計為 None）；table: CSVTable
+ExportTask = namedtuple('ExportTask', 'format target table')
+# value: JSON/CSV 為寫出的資料筆數，報告為統計資料
+TaskResult = namedtuple('TaskResult', 'task ok value error seconds')
+
+
+def build_export_tasks(formats, base_filename, csv_tables=CSV_TABLES):
+    """依要求的格式建立匯出工作，CSV 每個資料表各一個工作"""
+    tasks = []
+    if 'json' in formats:
+        tasks.append(ExportTask('json', f'{base_filename}.json', None))
+    if 'csv' in formats:
+        for table in csv_tables:
+            tasks.append(ExportTask('csv', f'{base_filename}_{table.suffix}.csv', table))
+    if 'report' in formats:
+        tasks.append(ExportTask('report', None, None))
+    return tasks
+
+
+@contextmanager
+def atomic_output(path):
+    """產生暫存檔名，區塊正常結束後才取代正式檔案"""
+    temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        yield temp_path
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def run_export_task(task, export_time, chunk_size=DEFAULT_CHUNK_SIZE, compact=False, with_titles=True):
+    """執行單一匯出工作，結束後關閉本執行緒/行程的資料庫連線"""
+    started = time.perf_counter()
+    try:
+        value = None
+        if task.format == 'json':
+            with atomic_output(task.target) as temp_path:
+                value = write_json_export(temp_path, export_time, chunk_size, compact)
+        elif task.format == 'csv':
+            with atomic_output(task.target) as temp_path:
+                value = write_csv_table(temp_path, task.table, chunk_size)
+        elif task.format == 'report':
+            value = report_stats(with_titles)
+        else:
+            raise ValueError(f"不支援的匯出格式: {task.format}")
+        return TaskResult(task, True, value, None, time.perf_counter() - started)
+    except Exception as e:
+        return TaskResult(task, False, None, str(e), time.perf_counter() - started)
+    finally:
+        connections.close_all()
+
+
+def _init_process_worker():
+    """行程池的初始化：spawn 模式下需要重新設定 Django"""
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+    connections.close_all()
+
+
+def run_concurrent_export(tasks, export_time, workers=None, executor='thread',
+                          chunk_size=DEFAULT_CHUNK_SIZE, compact=False, with_titles=True):
+    """同時執行所有匯出工作，依工作順序回傳 TaskResult 列表
+
+    executor='thread' 使用執行緒池（Django 連線本來就是每個執行緒各自一條）；
+    executor='process' 使用行程池，建立前先關閉目前的連線，避免子行程共用同一條連線。
+    """
+    workers = workers or len(tasks) or 1
+    if executor == 'process':
+        connections.close_all()
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_process_worker)
+    elif executor == 'thread':
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='export')
+    else:
+        raise ValueError(f"不支援的 executor: {executor}")
+
+    with pool:
+        futures = [
+            pool.submit(run_export_task, task, export_time, chunk_size, compact, with_titles)
+            for task in tasks
+        ]
+        return [future.result() for future in futures]
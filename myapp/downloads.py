@@ -0,0 +1,68 @@
+# myapp/downloads.py
+"""以 StreamingHttpResponse 直接從資料庫串流匯出檔案
+
+內容逐塊產生、逐塊送出，不寫暫存檔，伺服器記憶體用量與資料量無關；
+可選擇即時以 gzip 壓縮。WSGI 與 ASGI 下皆維持逐塊送出。
+"""
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+
+def encode_stream(parts, encoding='utf-8'):
+    """將文字區塊編碼為位元組"""
+    for part in parts:
+        yield part.encode(encoding)
+
+
+def gzip_stream(chunks, level=6):
+    """即時以 gzip 壓縮位元組區塊；每塊都做 sync flush，讓用戶端立即收到資料"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31：gzip 格式
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def iterate_in_thread(iterator):
+    """在 ASGI 下逐塊取得同步產生器的資料
+
+    StreamingHttpResponse 在 ASGI 下遇到同步迭代器會先整個讀進記憶體，
+    因此改用 thread_sensitive 的 sync_to_async 逐塊取得，
+    資料庫查詢仍在同一個執行緒中進行。用戶端中斷時會關閉產生器。
+    """
+    sentinel = object()
+    get_next = sync_to_async(next, thread_sensitive=True)
+    try:
+        while True:
+            chunk = await get_next(iterator, sentinel)
+            if chunk is sentinel:
+                break
+            yield chunk
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            await sync_to_async(close, thread_sensitive=True)()
+
+
+def streaming_download(request, parts, filename, content_type, compress=False):
+    """建立下載用的 StreamingHttpResponse
+
+    parts 為文字區塊的迭代器；compress=True 時輸出 {filename}.gz。
+    """
+    chunks = encode_stream(parts)
+    if compress:
+        chunks = gzip_stream(chunks)
+        filename = f'{filename}.gz'
+        content_type = 'application/gzip'
+    if isinstance(request, ASGIRequest):
+        chunks = iterate_in_thread(iter(chunks))
+
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # 避免反向代理緩衝整個回應
+    response['X-Accel-Buffering'] = 'no'
+    return response
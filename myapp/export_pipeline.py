@@ -0,0 +1,368 @@
+# myapp/export_pipeline.py
+"""單次掃描、多輸出端的匯出管線
+
+每個資料表只讀取一次，讀到的每一批資料同時交給所有輸出端（JSON、CSV、報告統計……），
+因此不論要求幾種格式，資料庫都只需各掃描一次作者、分類與書籍資料表。
+"""
+import csv
+from collections import Counter
+from datetime import datetime
+from itertools import islice
+
+from django.db import transaction
+
+from .exporting import (
+    AVERAGE_CONTEXT, CSV_TABLES, DEFAULT_CHUNK_SIZE, JSON_TABLES, JSONExportWriter,
+    render_report, write_csv_exports, write_json_export,
+)
+from .models import Author, Category, Book
+from .stats import report_stats
+
+# 掃描順序：作者與分類在書籍之前，報告統計才能在讀到書籍時對應
+SCAN_TABLES = (
+    ('authors', Author),
+    ('categories', Category),
+    ('books', Book),
+)
+
+
+def _column_getter(columns, fields):
+    """從掃描欄位組成的 tuple 中取出指定欄位"""
+    indexes = [columns.index(field) for field in fields]
+    return lambda row: tuple(row[index] for index in indexes)
+
+
+class ExportSink:
+    """匯出輸出端的基底類別
+
+    新的匯出格式只要繼承此類別、宣告各資料表需要的欄位並實作對應的方法，
+    即可加入 ExportPipeline 與其他格式共用同一次掃描。
+    """
+    name = None
+    needs_counts = False
+    success_message = '✅ {name} 匯出完成'
+    failure_message = '❌ {name} 匯出失敗: {error}'
+
+    def required_fields(self, table):
+        """回傳此輸出端需要的欄位；空 tuple 代表不需要此資料表"""
+        return ()
+
+    def begin(self, counts):
+        """開始匯出；needs_counts 為 True 時 counts 為各資料表筆數"""
+
+    def begin_table(self, table, columns):
+        """開始處理資料表，columns 為每筆資料 tuple 的欄位順序"""
+
+    def write_rows(self, table, rows):
+        """處理一批資料"""
+
+    def end_table(self, table):
+        """資料表處理完畢"""
+
+    def finish(self):
+        """全部資料處理完畢"""
+
+    def abort(self):
+        """發生錯誤時釋放資源"""
+
+
+class JSONSink(ExportSink):
+    """輸出與 write_json_export 相同格式的JSON檔案"""
+    name = 'json'
+    needs_counts = True
+    success_message = '✅ JSON匯出完成: {target}'
+    failure_message = '❌ JSON匯出失敗: {error}'
+
+    def __init__(self, filename, export_time, compact=False):
+        self.target = filename
+        self.export_time = export_time
+        self.fields = {name: fields for name, _, fields in JSON_TABLES}
+        self.writer = JSONExportWriter(compact)
+        self.file = None
+
+    def required_fields(self, table):
+        return self.fields.get(table, ())
+
+    def begin(self, counts):
+        self.file = open(self.target, 'w', encoding='utf-8')
+        self.file.write(self.writer.begin({
+            'export_time': self.export_time.isoformat(),
+            'total_records': counts,
+        }))
+
+    def begin_table(self, table, columns):
+        self._keys = self.fields[table]
+        self._getter = _column_getter(columns, self._keys)
+        self._empty = True
+        self.file.write(self.writer.begin_array(table))
+
+    def write_rows(self, table, rows):
+        parts = []
+        for row in rows:
+            parts.append(self.writer.element(dict(zip(self._keys, self._getter(row))), self._empty))
+            self._empty = False
+        self.file.write(''.join(parts))
+
+    def end_table(self, table):
+        self.file.write(self.writer.end_array(self._empty))
+
+    def finish(self):
+        self.file.write(self.writer.end())
+        self.file.close()
+
+    def abort(self):
+        if self.file:
+            self.file.close()
+
+
+class CSVSink(ExportSink):
+    """輸出每個資料表各一個CSV檔案"""
+    name = 'csv'
+    success_message = '✅ CSV匯出完成: {target}'
+    failure_message = '❌ CSV匯出失敗: {error}'
+
+    def __init__(self, base_filename, tables=CSV_TABLES):
+        self.base_filename = base_filename
+        self.target = f'{base_filename}_*.csv'
+        self.tables = {table.suffix: table for table in tables}
+        self.file = None
+
+    def required_fields(self, table):
+        spec = self.tables.get(table)
+        return spec.fields if spec else ()
+
+    def begin_table(self, table, columns):
+        spec = self.tables[table]
+        self._format_rows = spec.format_rows
+        self._getter = _column_getter(columns, spec.fields)
+        self.file = open(f'{self.base_filename}_{spec.suffix}.csv', 'w', newline='', encoding='utf-8-sig')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(spec.headers)
+
+    def write_rows(self, table, rows):
+        self.writer.writerows(self._format_rows([self._getter(row) for row in rows]))
+
+    def end_table(self, table):
+        self.file.close()
+        self.file = None
+
+    def abort(self):
+        if self.file:
+            self.file.close()
+
+
+class ReportSink(ExportSink):
+    """在掃描過程中累計統計資料，結束時產生匯出報告
+
+    統計資料與 collect_report_stats 的格式相同，以 render_report 排版。
+    """
+    name = 'report'
+    success_message = '✅ 匯出報告生成完成: {target}'
+    failure_message = '❌ 報告生成失敗: {error}'
+    fields = {
+        'authors': ('id', 'name', 'email'),
+        'categories': ('id', 'name', 'description'),
+        'books': ('id', 'title', 'author_id', 'category_id', 'price'),
+    }
+
+    def __init__(self, base_filename, export_time, with_titles=True):
+        self.base_filename = base_filename
+        self.target = f'{base_filename}_report.txt'
+        self.export_time = export_time
+        self.with_titles = with_titles
+
+    def required_fields(self, table):
+        return self.fields[table]
+
+    def begin(self, counts):
+        self.authors = []
+        self.categories = []
+        self.author_books = Counter()
+        self.category_books = Counter()
+        self.book_count = 0
+        self.price_total = 0
+        self.max_price = self.min_price = None
+        self.max_price_title = self.min_price_title = None
+
+    def begin_table(self, table, columns):
+        self._getter = _column_getter(columns, self.fields[table])
+
+    def write_rows(self, table, rows):
+        getter = self._getter
+        if table == 'authors':
+            self.authors.extend(getter(row) for row in rows)
+        elif table == 'categories':
+            self.categories.extend(getter(row) for row in rows)
+        else:
+            for row in rows:
+                _, title, author_id, category_id, price = getter(row)
+                self.author_books[author_id] += 1
+                self.category_books[category_id] += 1
+                self.book_count += 1
+                self.price_total += price
+                # 依主鍵順序掃描，只在嚴格大於/小於時更新，與 collect_report_stats 取同一本書
+                if self.max_price is None or price > self.max_price:
+                    self.max_price, self.max_price_title = price, title
+                if self.min_price is None or price < self.min_price:
+                    self.min_price, self.min_price_title = price, title
+
+    def finish(self):
+        stats = {
+            'authors': [(name, email, self.author_books[pk]) for pk, name, email in self.authors],
+            'categories': [(name, description, self.category_books[pk])
+                           for pk, name, description in self.categories],
+            'author_count': len(self.authors),
+            'category_count': len(self.categories),
+            'book_count': self.book_count,
+            'max_price': self.max_price,
+            'min_price': self.min_price,
+            'avg_price': AVERAGE_CONTEXT.plus(self.price_total / self.book_count)
+            if self.book_count else None,
+            'max_price_title': self.max_price_title if self.with_titles else None,
+            'min_price_title': self.min_price_title if self.with_titles else None,
+        }
+        with open(self.target, 'w', encoding='utf-8') as f:
+            f.write(render_report(stats, self.base_filename, self.export_time))
+
+
+class ExportPipeline:
+    """依序掃描各資料表一次，將每批資料分送給所有輸出端
+
+    整個掃描在同一個交易中進行，各輸出端看到的是一致的資料快照。
+    某個輸出端失敗時只停用該輸出端，其他格式繼續匯出。
+    """
+
+    def __init__(self, sinks, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.sinks = list(sinks)
+        self.chunk_size = chunk_size
+        self.rows_scanned = 0
+
+    def run(self):
+        """執行匯出，回傳 {輸出端名稱: 是否成功}"""
+        self._results = {}
+        self._active = list(self.sinks)
+        self.rows_scanned = 0
+
+        with transaction.atomic():
+            counts = None
+            if any(sink.needs_counts for sink in self._active):
+                counts = {name: model.objects.count() for name, model in SCAN_TABLES}
+            self._dispatch(self._active, 'begin', counts)
+
+            for name, model in SCAN_TABLES:
+                readers = [sink for sink in self._active if sink.required_fields(name)]
+                if not readers:
+                    continue
+                columns = self._scan_columns(name, readers)
+                self._dispatch(readers, 'begin_table', name, columns)
+                rows = model.objects.order_by('pk').values_list(*columns).iterator(chunk_size=self.chunk_size)
+                while any(sink in self._active for sink in readers):
+                    batch = list(islice(rows, self.chunk_size))
+                    if not batch:
+                        break
+                    self.rows_scanned += len(batch)
+                    self._dispatch(readers, 'write_rows', name, batch)
+                self._dispatch(readers, 'end_table', name)
+
+            self._dispatch(self._active, 'finish')
+
+        for sink in self._active:
+            print(sink.success_message.format(name=sink.name, target=sink.target))
+            self._results[sink.name] = True
+        return {sink.name: self._results[sink.name] for sink in self.sinks}
+
+    def _scan_columns(self, table, sinks):
+        """各輸出端需要欄位的聯集（保持出現順序）"""
+        columns = []
+        for sink in sinks:
+            for field in sink.required_fields(table):
+                if field not in columns:
+                    columns.append(field)
+        return tuple(columns)
+
+    def _dispatch(self, sinks, method, *args):
+        for sink in list(sinks):
+            if sink not in self._active:
+                continue
+            try:
+                getattr(sink, method)(*args)
+            except Exception as e:
+                print(sink.failure_message.format(name=sink.name, error=e))
+                sink.abort()
+                self._active.remove(sink)
+                self._results[sink.name] = False
+
+
+def build_export_sinks(formats, base_filename, export_time, csv_tables=CSV_TABLES,
+                       with_titles=True, compact=False):
+    """依要求的格式建立輸出端"""
+    sinks = []
+    if 'json' in formats:
+        sinks.append(JSONSink(f'{base_filename}.json', export_time, compact))
+    if 'csv' in formats:
+        sinks.append(CSVSink(base_filename, csv_tables))
+    if 'report' in formats:
+        sinks.append(ReportSink(base_filename, export_time, with_titles))
+    return sinks
+
+
+class FileExportMixin:
+    """DataImporter 與 DataExporter 共用的單一格式匯出方法
+
+    使用的類別需提供 instrumentation 屬性；csv_tables 與 report_with_titles 可在類別中覆寫，
+    export_time 為 None 時以呼叫時的時間作為匯出時間。
+    """
+    csv_tables = CSV_TABLES
+    report_with_titles = True
+    export_time = None
+
+    def export_to_json(self, filename, chunk_size=DEFAULT_CHUNK_SIZE, compact=False):
+        """匯出為JSON格式
+
+        以 .iterator(chunk_size=...) 逐塊讀取並直接寫入檔案，記憶體用量與資料量無關；
+        compact=True 時輸出不縮排的精簡格式。
+        """
+        try:
+            with self.instrumentation.stage('export_json') as metrics:
+                metrics.add_rows(write_json_export(filename, self.export_time or datetime.now(), chunk_size, compact))
+
+            print(f"✅ JSON匯出完成: {filename}")
+            return True
+
+        except Exception as e:
+            print(f"❌ JSON匯出失敗: {e}")
+            return False
+
+    def export_to_csv(self, base_filename, chunk_size=DEFAULT_CHUNK_SIZE):
+        """匯出為CSV格式
+
+        以 values_list(...).iterator() 逐塊讀取（書籍的作者與分類名稱由SQL關聯取得），
+        不建立模型物件，並以 writerows 整批寫入。
+        """
+        try:
+            with self.instrumentation.stage('export_csv') as metrics:
+                metrics.add_rows(write_csv_exports(base_filename, self.csv_tables, chunk_size))
+
+            print(f"✅ CSV匯出完成: {base_filename}_*.csv")
+            return True
+
+        except Exception as e:
+            print(f"❌ CSV匯出失敗: {e}")
+            return False
+
+    def create_export_report(self, base_filename):
+        """建立詳細的匯出報告（統計資料取自快取，資料未變動時不需查詢）"""
+        try:
+            with self.instrumentation.stage('export_report'):
+                report = render_report(
+                    report_stats(self.report_with_titles), base_filename, self.export_time or datetime.now())
+
+                with open(f'{base_filename}_report.txt', 'w', encoding='utf-8') as f:
+                    f.write(report)
+
+            print(f"✅ 匯出報告生成完成: {base_filename}_report.txt")
+            return True
+
+        except Exception as e:
+            print(f"❌ 報告生成失敗: {e}")
+            return False
@@ -0,0 +1,326 @@
+# myapp/exporting.py
+"""匯出共用元件：以伺服器端逐塊讀取的方式產生匯出內容"""
+import csv
+import io
+import json
+from collections import namedtuple
+from decimal import Context, Decimal
+from itertools import islice
+
+from django.db.models import Max, Min, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Author, Category, Book, CategoryStats
+
+# (JSON區段名稱, 模型, 匯出欄位)，順序即為輸出順序
+JSON_TABLES = (
+    ('authors', Author, ('id', 'name', 'email', 'birth_date')),
+    ('categories', Category, ('id', 'name', 'description')),
+    ('books', Book, ('id', 'title', 'author_id', 'category_id',
+                     'publish_date', 'price', 'is_available')),
+)
+
+DEFAULT_CHUNK_SIZE = 2000
+
+# 平均價格以 Decimal 精確加總後取 15 位有效數字（SQLite 的 Avg 以浮點數加總，末位可能略有不同）
+AVERAGE_CONTEXT = Context(prec=15)
+
+# CSV資料表：檔名後綴、模型、標題列、values_list 欄位、整批格式化函式
+CSVTable = namedtuple('CSVTable', 'suffix model headers fields format_rows')
+
+
+def _format_author_rows(rows):
+    return [
+        (pk, name, email, birth_date.isoformat() if birth_date else '')
+        for pk, name, email, birth_date in rows
+    ]
+
+
+def _format_author_rows_with_created(rows):
+    # 尚無 created_at 欄位，沿用主鍵
+    return [
+        (pk, name, email, birth_date.isoformat() if birth_date else '', pk)
+        for pk, name, email, birth_date in rows
+    ]
+
+
+def _format_book_rows(rows):
+    return [
+        (pk, title, author_id, author_name, category_id, category_name,
+         publish_date.isoformat(), float(price), '是' if is_available else '否')
+        for (pk, title, author_id, author_name, category_id, category_name,
+             publish_date, price, is_available) in rows
+    ]
+
+
+AUTHOR_CSV = CSVTable(
+    'authors', Author, ('ID', '姓名', '電子郵件', '出生日期'),
+    ('id', 'name', 'email', 'birth_date'), _format_author_rows,
+)
+AUTHOR_CSV_WITH_CREATED = CSVTable(
+    'authors', Author, ('ID', '姓名', '電子郵件', '出生日期', '建立時間'),
+    ('id', 'name', 'email', 'birth_date'), _format_author_rows_with_created,
+)
+CATEGORY_CSV = CSVTable(
+    'categories', Category, ('ID', '分類名稱', '描述'),
+    ('id', 'name', 'description'), list,
+)
+BOOK_CSV = CSVTable(
+    'books', Book, ('ID', '書名', '作者ID', '作者', '分類ID', '分類', '出版日期', '價格', '是否可借'),
+    ('id', 'title', 'author_id', 'author__name', 'category_id', 'category__name',
+     'publish_date', 'price', 'is_available'),
+    _format_book_rows,
+)
+CSV_TABLES = (AUTHOR_CSV, CATEGORY_CSV, BOOK_CSV)
+
+
+class JSONExportWriter:
+    """逐段產生匯出JSON文字
+
+    預設輸出與 json.dump(data, ensure_ascii=False, indent=2, default=str) 逐位元組相同；
+    compact=True 時改為不縮排、不含多餘空白的格式。
+    """
+
+    def __init__(self, compact=False):
+        self.compact = compact
+        if compact:
+            self.encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=str)
+        else:
+            self.encoder = json.JSONEncoder(ensure_ascii=False, indent=2, default=str)
+
+    def _newline(self, level):
+        return '' if self.compact else '\n' + '  ' * level
+
+    def _encode(self, value, level):
+        text = self.encoder.encode(value)
+        return text if self.compact else text.replace('\n', self._newline(level))
+
+    def begin(self, metadata):
+        key_separator = ':' if self.compact else ': '
+        return '{' + self._newline(1) + '"metadata"' + key_separator + self._encode(metadata, 1)
+
+    def begin_array(self, name):
+        key_separator = ':' if self.compact else ': '
+        return ',' + self._newline(1) + json.dumps(name, ensure_ascii=False) + key_separator + '['
+
+    def element(self, row, first):
+        return ('' if first else ',') + self._newline(2) + self._encode(row, 2)
+
+    def end_array(self, empty):
+        return ']' if empty else self._newline(1) + ']'
+
+    def end(self):
+        return self._newline(0) + '}'
+
+
+def export_metadata(export_time):
+    """匯出檔的 metadata 區段"""
+    return {
+        'export_time': export_time.isoformat(),
+        'total_records': {
+            name: model.objects.count() for name, model, _ in JSON_TABLES
+        }
+    }
+
+
+def iter_json_document(metadata, sections, chunk_size=DEFAULT_CHUNK_SIZE, compact=False):
+    """逐段產生 {"metadata": ..., 區段名稱: [資料...], ...} 格式的JSON
+
+    sections 為 (區段名稱, 資料 dict 的可迭代物件) 序列，每累積 chunk_size 筆輸出一次。
+    """
+    writer = JSONExportWriter(compact)
+    yield writer.begin(metadata)
+    for name, rows in sections:
+        yield writer.begin_array(name)
+        parts = []
+        empty = True
+        for row in rows:
+            parts.append(writer.element(row, empty))
+            empty = False
+            if len(parts) >= chunk_size:
+                yield ''.join(parts)
+                parts = []
+        if parts:
+            yield ''.join(parts)
+        yield writer.end_array(empty)
+    yield writer.end()
+
+
+def _json_sections(chunk_size):
+    return (
+        (name, model.objects.order_by('pk').values(*fields).iterator(chunk_size=chunk_size))
+        for name, model, fields in JSON_TABLES
+    )
+
+
+def iter_json_export(export_time, chunk_size=DEFAULT_CHUNK_SIZE, compact=False):
+    """逐段產生完整的匯出JSON，每次只從資料庫讀取 chunk_size 筆"""
+    return iter_json_document(export_metadata(export_time), _json_sections(chunk_size), chunk_size, compact)
+
+
+def write_json_export(filename, export_time, chunk_size=DEFAULT_CHUNK_SIZE, compact=False):
+    """將完整匯出JSON串流寫入檔案，記憶體用量與資料量無關；回傳 metadata 中的總筆數"""
+    metadata = export_metadata(export_time)
+    with open(filename, 'w', encoding='utf-8') as f:
+        for part in iter_json_document(metadata, _json_sections(chunk_size), chunk_size, compact):
+            f.write(part)
+    return sum(metadata['total_records'].values())
+
+
+def iter_csv_batches(table, chunk_size=DEFAULT_CHUNK_SIZE):
+    """以 values_list 逐塊讀取資料表，每次產生一批已格式化的CSV資料列"""
+    rows = table.model.objects.order_by('pk').values_list(*table.fields).iterator(chunk_size=chunk_size)
+    while True:
+        batch = list(islice(rows, chunk_size))
+        if not batch:
+            return
+        yield table.format_rows(batch)
+
+
+def iter_csv_text(table, chunk_size=DEFAULT_CHUNK_SIZE, bom=True):
+    """逐段產生單一資料表的CSV文字（含標題列），內容與 write_csv_table 寫出的檔案相同"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if bom:
+        buffer.write('\ufeff')
+    writer.writerow(table.headers)
+    for batch in iter_csv_batches(table, chunk_size):
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def write_csv_table(filename, table, chunk_size=DEFAULT_CHUNK_SIZE):
+    """將單一資料表匯出為CSV檔案，回傳資料列數（不含標題列）"""
+    rows = 0
+    with open(filename, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(table.headers)
+        for batch in iter_csv_batches(table, chunk_size):
+            writer.writerows(batch)
+            rows += len(batch)
+    return rows
+
+
+def write_csv_exports(base_filename, tables=CSV_TABLES, chunk_size=DEFAULT_CHUNK_SIZE):
+    """匯出多個資料表為 {base_filename}_{後綴}.csv，回傳總資料列數"""
+    return sum(
+        write_csv_table(f'{base_filename}_{table.suffix}.csv', table, chunk_size)
+        for table in tables
+    )
+
+
+def collect_report_stats(with_titles=True):
+    """以固定數量的查詢取得報告所需的統計資料
+
+    每位作者與每個分類的書籍數量讀自 AuthorStats / CategoryStats（LEFT JOIN，沒有書籍的為 0），
+    最高、最低與平均價格由分類統計彙總，都不需對書籍資料表 GROUP BY，讀取量只與群組數量有關；
+    with_titles=True 時再各用一次查詢（使用價格索引）取得最高價與最低價書籍的書名。
+    """
+    authors = list(
+        Author.objects.order_by('pk').annotate(book_count=Coalesce('stats__book_count', 0))
+        .values_list('name', 'email', 'book_count')
+    )
+    categories = list(
+        Category.objects.order_by('pk').annotate(book_count=Coalesce('stats__book_count', 0))
+        .values_list('name', 'description', 'book_count')
+    )
+    stats = CategoryStats.objects.aggregate(
+        book_count=Sum('book_count'),
+        max_price=Max('max_price'),
+        min_price=Min('min_price'),
+        price_sum=Sum('price_sum'),
+    )
+    # SQLite 上 Max/Min/Sum 回傳未依欄位小數位數量化的 Decimal，需與模型欄位的值一致
+    price_quantum = Decimal(1).scaleb(-Book._meta.get_field('price').decimal_places)
+    for key in ('max_price', 'min_price', 'price_sum'):
+        if stats[key] is not None:
+            stats[key] = stats[key].quantize(price_quantum)
+    price_sum = stats.pop('price_sum')
+    stats['book_count'] = stats['book_count'] or 0
+    stats['avg_price'] = (
+        AVERAGE_CONTEXT.plus(price_sum / stats['book_count']) if stats['book_count'] else None
+    )
+    stats.update(
+        authors=authors,
+        categories=categories,
+        author_count=len(authors),
+        category_count=len(categories),
+        max_price_title=None,
+        min_price_title=None,
+    )
+    if with_titles and stats['book_count']:
+        books = Book.objects.order_by('pk').values_list('title', flat=True)
+        stats['max_price_title'] = books.filter(price=stats['max_price']).first()
+        stats['min_price_title'] = books.filter(price=stats['min_price']).first()
+    return stats
+
+
+def render_report(stats, base_filename, export_time):
+    """將 collect_report_stats 格式的統計資料排版成匯出報告文字
+
+    統計資料不含書名時（with_titles=False），最高與最低價格只列出價格。
+    """
+    report = f"""
+資料匯出詳細報告
+================
+
+基本資訊:
+---------
+匯出時間: {export_time.strftime('%Y-%m-%d %H:%M:%S')}
+匯出檔案基礎名稱: {base_filename}
+
+資料統計:
+---------
+作者數量: {stats['author_count']}
+分類數量: {stats['category_count']}  
+書籍數量: {stats['book_count']}
+總記錄數: {stats['author_count'] + stats['category_count'] + stats['book_count']}
+
+作者列表:
+---------
+"""
+    for name, email, book_count in stats['authors']:
+        report += f"- {name} ({email}) - 著作: {book_count}本\n"
+
+    report += """
+分類列表:
+---------
+"""
+    for name, description, book_count in stats['categories']:
+        report += f"- {name} - 書籍: {book_count}本\n"
+        if description:
+            report += f"  描述: {description}\n"
+
+    report += """
+書籍價格統計:
+------------
+"""
+    if stats['book_count']:
+        for label, key in (('最高價格', 'max_price'), ('最低價格', 'min_price')):
+            title = stats[f'{key}_title']
+            report += f"{label}: {stats[key]}" + (f" ({title})" if title else "") + "\n"
+        report += f"平均價格: {stats['avg_price']:.2f}\n"
+    else:
+        report += "無書籍資料\n"
+
+    report += f"""
+匯出檔案:
+---------
+1. {base_filename}.json - JSON格式完整資料
+2. {base_filename}_authors.csv - 作者資料表
+3. {base_filename}_categories.csv - 分類資料表
+4. {base_filename}_books.csv - 書籍資料表
+5. {base_filename}_report.txt - 本報告檔案
+
+注意事項:
+---------
+- 所有檔案使用UTF-8編碼
+- CSV檔案適合用Excel開啟編輯
+- JSON檔案包含完整的資料關係
+- 建議定期備份重要資料
+"""
+    return report
@@ -0,0 +1,222 @@
+# myapp/incremental_import.py
+"""可續傳的增量匯入
+
+每筆資料以清理後內容的雜湊作為指紋，與上次匯入時的指紋相同就略過；
+每個區塊的資料、指紋與進度在同一個交易中提交，中斷後從最後提交的區塊之後繼續。
+
+同名資料與其他匯入模式相同，保留本次匯入中第一次出現的一筆：處理過的自然鍵在指紋上標記本次匯入的
+run_token（記錄在檢查點，續傳時沿用），之後的區塊再出現時視為重複，不匯入也不更新指紋。
+
+指紋只記錄資料庫內容與來源一致的資料：未指定 update_existing 而保留原樣的既有資料沿用原本的指紋
+（沒有指紋時記錄空白指紋），之後以 update_existing 重新匯入時仍會視為變動而更新。
+"""
+import hashlib
+import json
+import os
+import uuid
+from contextlib import nullcontext
+from operator import attrgetter
+
+from django.db import transaction
+
+from .bulk_import import BulkImporter, chunked
+from .cleaning import clean_records
+from .models import Book, ImportCheckpoint, ImportFingerprint
+from .stats import invalidation_batch
+from .streaming import iter_raw_chunks
+
+# 區段 → (指紋種類, 自然鍵欄位)
+NATURAL_KEYS = {
+    'authors': ('author', 'name'),
+    'categories': ('category', 'name'),
+    'books': ('book', 'title'),
+}
+
+
+def file_identity(path):
+    """以絕對路徑、檔案大小與修改時間識別來源檔案"""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    return hashlib.sha256(f'{path}|{stat.st_size}|{stat.st_mtime_ns}'.encode('utf-8')).hexdigest()
+
+
+def record_digest(record):
+    """清理後 record 的內容指紋（以欄位名稱排序，與欄位順序無關）"""
+    text = json.dumps(record._asdict(), sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class IncrementalImporter:
+    """逐塊比對指紋、只匯入新增或變動的資料，並記錄檢查點
+
+    傳入 instrumentation 時記錄 load / clean / fingerprint / import_<區段> 各階段；
+    傳入 progress（ProgressReporter）時每個區塊更新一次進度。
+    """
+
+    def __init__(self, json_file_path, chunk_size=1000, batch_size=1000, update_existing=False,
+                 instrumentation=None, progress=None):
+        self.json_file_path = json_file_path
+        self.chunk_size = chunk_size
+        self.instrumentation = instrumentation
+        self.progress = progress
+        self.engine = BulkImporter(
+            batch_size=batch_size,
+            transaction_batch_size=max(batch_size, chunk_size),
+            update_existing=update_existing,
+            instrumentation=instrumentation,
+        )
+        self.stats = {
+            'chunks': 0, 'resumed_chunks': 0, 'unchanged': 0, 'duplicates': 0,
+            'imported': 0, 'rejects': [], 'missing_books': [],
+        }
+
+    def run(self, force=False):
+        """執行增量匯入；來源檔案已完整匯入過且 force=False 時直接回傳 None"""
+        checkpoint, _ = ImportCheckpoint.objects.get_or_create(
+            identity=file_identity(self.json_file_path),
+            defaults={
+                'source_path': os.path.abspath(self.json_file_path),
+                'chunk_size': self.chunk_size,
+            },
+        )
+        if checkpoint.completed and not force:
+            return None
+
+        # 強制重跑、或區塊大小改變使區塊編號不再對應時從頭開始（指紋仍會略過未變動的資料）
+        resume_after = checkpoint.last_chunk
+        if force or checkpoint.chunk_size != self.chunk_size or not checkpoint.run_token:
+            resume_after = -1
+        if resume_after < 0:
+            checkpoint.run_token = uuid.uuid4().hex
+        self.run_token = checkpoint.run_token
+        checkpoint.chunk_size = self.chunk_size
+        checkpoint.completed = False
+
+        raw_chunks = iter_raw_chunks(self.json_file_path, self.chunk_size, self._reject, self._on_progress)
+        if self.instrumentation is not None:
+            raw_chunks = self.instrumentation.iter_stage('load', raw_chunks, rows=lambda chunk: len(chunk[1]))
+        with invalidation_batch():
+            for index, (section, raw_records) in enumerate(raw_chunks):
+                records = self._clean_chunk(section, raw_records)
+                if self.progress is not None:
+                    self.progress.update(len(raw_records))
+                if index <= resume_after:
+                    self.stats['resumed_chunks'] += 1
+                    if section != 'books':
+                        self.engine.register_existing(section, [record.name for record in records])
+                    continue
+
+                with transaction.atomic():
+                    self._import_chunk(section, records)
+                    checkpoint.last_chunk = index
+                    checkpoint.save()
+                self.stats['chunks'] += 1
+
+        checkpoint.completed = True
+        checkpoint.save()
+        return self.stats
+
+    def _reject(self, item, error):
+        self.stats['rejects'].append((item, str(error)))
+
+    def _on_progress(self, position, total):
+        if self.progress is not None:
+            self.progress.update(position=position, total=total)
+
+    def _stage(self, name, rows=0):
+        if self.instrumentation is None:
+            return nullcontext()
+        return self.instrumentation.stage(name, rows)
+
+    def _clean_chunk(self, section, raw_records):
+        with self._stage('clean', len(raw_records)):
+            records, rejects = clean_records(section, raw_records)
+        self.stats['rejects'].extend((item, error) for _, item, error in rejects)
+        return records
+
+    def _import_chunk(self, section, records):
+        kind, key = NATURAL_KEYS[section]
+        natural_key = attrgetter(key)
+        # 查詢條件另有 kind 一個參數
+        lookup_size = max(1, self.engine.lookup_size - 1)
+        stored = {}
+        digests = {}
+        changed = []
+        candidates = {}
+        with self._stage('fingerprint', len(records)):
+            names = list(dict.fromkeys(natural_key(record) for record in records))
+            for batch in chunked(names, lookup_size):
+                stored.update(
+                    (name, (digest, last_run)) for name, digest, last_run in
+                    ImportFingerprint.objects
+                    .filter(kind=kind, natural_key__in=batch)
+                    .values_list('natural_key', 'digest', 'last_run')
+                )
+
+            for record in records:
+                name = natural_key(record)
+                digest, last_run = stored.get(name, (None, None))
+                if name in digests or last_run == self.run_token:
+                    # 本區塊或先前的區塊已處理過同名資料
+                    self.stats['duplicates'] += 1
+                    continue
+                if section == 'books' and not self._resolvable(record):
+                    # 與批次匯入相同，找不到作者或分類的書籍不佔用書名，交給引擎記錄在 missing_books
+                    changed.append(record)
+                    continue
+                digests[name] = record_digest(record)
+                if digests[name] == digest:
+                    candidates[name] = record
+                else:
+                    changed.append(record)
+
+            # 指紋未變、但資料已在匯入之外被刪除時重新匯入
+            existing = self._existing_names(section, list(candidates))
+            unchanged_names = [name for name in candidates if name in existing]
+            changed.extend(record for name, record in candidates.items() if name not in existing)
+        self.stats['unchanged'] += len(unchanged_names)
+
+        getattr(self.engine, f'import_{section}')(changed)
+
+        # 找不到作者或分類而略過的書籍不記錄指紋，下次仍會重試
+        skipped = {book.title for book in self.engine.missing_books}
+        self.stats['missing_books'].extend(self.engine.missing_books)
+        self.engine.missing_books.clear()
+        # 內容不同但未更新的既有資料保留原本的指紋，只標記本次匯入已處理
+        kept = set(self.engine.kept_keys)
+
+        with self._stage('fingerprint'):
+            unchanged = set(unchanged_names)
+            fingerprints = [
+                ImportFingerprint(
+                    kind=kind, natural_key=name, last_run=self.run_token,
+                    digest=stored.get(name, ('', None))[0] if name in kept else digest,
+                )
+                for name, digest in digests.items()
+                if name not in unchanged and name not in skipped
+            ]
+            ImportFingerprint.objects.bulk_create(
+                fingerprints,
+                batch_size=self.engine.batch_size,
+                update_conflicts=True,
+                unique_fields=['kind', 'natural_key'],
+                update_fields=['digest', 'last_run', 'updated_at'],
+            )
+            for batch in chunked(unchanged_names, lookup_size):
+                ImportFingerprint.objects.filter(kind=kind, natural_key__in=batch).update(last_run=self.run_token)
+        self.stats['imported'] += len(changed)
+
+    def _existing_names(self, section, names):
+        """names 中資料庫仍存在的自然鍵；作者與分類同時加入引擎的名稱對照表，讓後續書籍能對應到它們"""
+        if section != 'books':
+            self.engine.register_existing(section, names)
+            id_map = self.engine.author_ids if section == 'authors' else self.engine.category_ids
+            return {name for name in names if name in id_map}
+        existing = set()
+        for batch in chunked(names, self.engine.lookup_size):
+            existing.update(Book.objects.filter(title__in=batch).values_list('title', flat=True))
+        return existing
+
+    def _resolvable(self, book):
+        return (book.author_name in self.engine.author_ids
+                and book.category_name in self.engine.category_ids)
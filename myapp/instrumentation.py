@@ -0,0 +1,277 @@
+# myapp/instrumentation.py
+"""匯入與匯出的階段量測與進度顯示
+
+Instrumentation 以階段（stage）為單位記錄耗時、處理筆數、SQL 查詢次數與時間，以及記憶體峰值：
+- 同名階段可多次進入並累計（例如每個書籍區塊都進入一次 import_books）
+- 階段可以巢狀，耗時與查詢只記在最內層的階段（外層暫停計時），各階段加總不會重複計算
+- SQL 查詢以連線的 execute_wrapper 計數與計時
+- 記憶體一律記錄行程的最大常駐記憶體（ru_maxrss）；trace_memory=True 時另以 tracemalloc
+  記錄各階段中 Python 配置記憶體的峰值（會讓執行明顯變慢）
+
+摘要可用 emit() 以一行JSON附加到 settings.METRICS_FILE，供排程系統收集。
+
+ProgressReporter 取代逐筆輸出：最多每 interval 秒顯示一次處理筆數、每秒筆數與預計剩餘時間；
+CappedLog 讓大量重複的警告只顯示前幾筆。
+"""
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+try:
+    import resource
+except ImportError:  # Windows 沒有 resource 模組
+    resource = None
+
+PROGRESS_INTERVAL = 2.0
+
+
+def max_rss_mb():
+    """行程目前為止的最大常駐記憶體（MB）；無法取得時回傳 None"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 單位為 KB，macOS 為 bytes
+    return round(rss / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10), 2)
+
+
+def format_seconds(seconds):
+    """將秒數顯示為 1時2分3秒 / 2分3秒 / 3秒"""
+    seconds = int(round(seconds))
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if hours:
+        return f"{hours}時{minutes}分{seconds}秒"
+    if minutes:
+        return f"{minutes}分{seconds}秒"
+    return f"{seconds}秒"
+
+
+class StageMetrics:
+    """單一階段的累計量測結果"""
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.max_rss_mb = None
+        self.peak_traced = None
+
+    def add_rows(self, count):
+        self.rows += count
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'seconds': round(self.seconds, 4),
+            'rows': self.rows,
+            'rows_per_sec': round(self.rows / self.seconds, 1) if self.seconds else None,
+            'queries': self.queries,
+            'query_seconds': round(self.query_seconds, 4),
+            'max_rss_mb': self.max_rss_mb,
+            'peak_traced_mb': round(self.peak_traced / 2 ** 20, 2) if self.peak_traced is not None else None,
+        }
+
+
+class Instrumentation:
+    """記錄各階段的量測結果（只量測目前執行緒在 using 連線上的查詢）"""
+
+    def __init__(self, name, using=DEFAULT_DB_ALIAS, trace_memory=False):
+        self.name = name
+        self.using = using
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.started_at = datetime.now()
+        self._started = time.perf_counter()
+        self._stack = []  # [[StageMetrics, 本段計時開始時間]]
+        self._active = None
+
+    @contextmanager
+    def stage(self, name, rows=0):
+        """量測一個階段；可在區塊中以 metrics.add_rows() 累加筆數"""
+        metrics = self.stages.get(name)
+        if metrics is None:
+            metrics = self.stages[name] = StageMetrics(name)
+        metrics.calls += 1
+        metrics.rows += rows
+        self._enter(metrics)
+        try:
+            yield metrics
+        finally:
+            self._exit()
+
+    def iter_stage(self, name, iterable, rows=None):
+        """迭代 iterable，取得每一項所花的時間記在 name 階段；rows(item) 為該項的筆數
+
+        用於延遲執行的產生器（例如邊讀檔邊解析），讓讀取與後續處理的時間分開計算。
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name) as metrics:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                if rows is not None:
+                    metrics.add_rows(rows(item))
+            yield item
+
+    def record(self, name, seconds, rows=0):
+        """加入在其他執行緒或行程中量測的階段（只有耗時與筆數）"""
+        metrics = self.stages.get(name)
+        if metrics is None:
+            metrics = self.stages[name] = StageMetrics(name)
+        metrics.calls += 1
+        metrics.seconds += seconds
+        metrics.rows += rows
+
+    def _enter(self, metrics):
+        now = time.perf_counter()
+        if self._stack:
+            parent = self._stack[-1]
+            parent[0].seconds += now - parent[1]
+        else:
+            self._activate()
+        self._fold_traced_peak()
+        self._stack.append([metrics, now])
+
+    def _exit(self):
+        self._fold_traced_peak()
+        metrics, resumed = self._stack.pop()
+        now = time.perf_counter()
+        metrics.seconds += now - resumed
+        metrics.max_rss_mb = max_rss_mb()
+        if self._stack:
+            self._stack[-1][1] = now
+        else:
+            self._active.close()
+            self._active = None
+
+    def _activate(self):
+        """最外層的階段開始時掛上查詢計數，並視需要開始 tracemalloc"""
+        self._active = ExitStack()
+        self._active.enter_context(connections[self.using].execute_wrapper(self._execute))
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._active.callback(tracemalloc.stop)
+
+    def _fold_traced_peak(self):
+        # 將目前為止的峰值記到所有進行中的階段後重設，巢狀階段各自得到自己期間的峰值
+        if not self.trace_memory or not tracemalloc.is_tracing():
+            return
+        peak = tracemalloc.get_traced_memory()[1]
+        for metrics, _ in self._stack:
+            metrics.peak_traced = max(metrics.peak_traced or 0, peak)
+        tracemalloc.reset_peak()
+
+    def _execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if self._stack:
+                metrics = self._stack[-1][0]
+                metrics.queries += 1
+                metrics.query_seconds += time.perf_counter() - started
+
+    def summary(self):
+        """所有階段的量測結果（可直接轉為JSON）"""
+        stages = {name: metrics.as_dict() for name, metrics in self.stages.items()}
+        return {
+            'name': self.name,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'wall_seconds': round(time.perf_counter() - self._started, 4),
+            'stages': stages,
+            'totals': {
+                'seconds': round(sum(metrics.seconds for metrics in self.stages.values()), 4),
+                'queries': sum(metrics.queries for metrics in self.stages.values()),
+                'query_seconds': round(sum(metrics.query_seconds for metrics in self.stages.values()), 4),
+            },
+            'max_rss_mb': max_rss_mb(),
+        }
+
+    def emit(self, path=None):
+        """將摘要以一行JSON附加到 path（預設為 settings.METRICS_FILE，未設定時不寫檔），回傳摘要"""
+        summary = self.summary()
+        path = path or settings.METRICS_FILE
+        if path:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(summary, ensure_ascii=False) + '\n')
+        return summary
+
+    def print_summary(self):
+        """以表格顯示各階段的量測結果"""
+        if not self.stages:
+            return
+        print(f"\n📊 {self.name} 各階段量測:")
+        print(f"   {'階段':<22}{'秒':>9}{'筆數':>10}{'筆/秒':>12}{'查詢':>8}{'查詢秒':>9}{'RSS MB':>9}")
+        for name, metrics in self.stages.items():
+            item = metrics.as_dict()
+            rate = f"{item['rows_per_sec']:,.0f}" if item['rows_per_sec'] else '-'
+            rss = f"{item['max_rss_mb']:.1f}" if item['max_rss_mb'] is not None else '-'
+            print(f"   {name:<22}{item['seconds']:>9.3f}{item['rows']:>10,}{rate:>12}"
+                  f"{item['queries']:>8,}{item['query_seconds']:>9.3f}{rss:>9}")
+
+
+class ProgressReporter:
+    """限制頻率的進度顯示
+
+    update(rows, position, total) 累加處理筆數；position/total 為同一單位的進度
+    （例如來源檔案已讀取的位元組數與檔案大小），有值時才顯示百分比與預計剩餘時間。
+    """
+
+    def __init__(self, label, interval=PROGRESS_INTERVAL):
+        self.label = label
+        self.interval = interval
+        self.rows = 0
+        self.position = None
+        self.total = None
+        self.started = time.perf_counter()
+        self._last_report = self.started
+
+    def update(self, rows=0, position=None, total=None):
+        self.rows += rows
+        if position is not None:
+            self.position = position
+        if total is not None:
+            self.total = total
+        now = time.perf_counter()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            print(self.format(now))
+
+    def format(self, now=None):
+        elapsed = (now or time.perf_counter()) - self.started
+        rate = self.rows / elapsed if elapsed else 0
+        text = f"   ⏳ {self.label}: {self.rows:,} 筆 ({rate:,.0f} 筆/秒"
+        if self.total and self.position:
+            fraction = min(self.position / self.total, 1.0)
+            remaining = elapsed * (1 - fraction) / fraction
+            text += f"，{fraction:.0%}，預計剩餘 {format_seconds(remaining)}"
+        return text + ")"
+
+
+class CappedLog:
+    """只顯示前 limit 筆訊息，其餘只計數；flush() 顯示未顯示的筆數"""
+
+    def __init__(self, limit=20):
+        self.limit = limit
+        self.count = 0
+
+    def __call__(self, message):
+        self.count += 1
+        if self.count <= self.limit:
+            print(message)
+
+    def flush(self, label):
+        if self.count > self.limit:
+            print(f"⚠️ 另有 {self.count - self.limit:,} 筆{label}未顯示（共 {self.count:,} 筆）")
+        self.count = 0
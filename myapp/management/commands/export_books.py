@@ -0,0 +1,62 @@
+# myapp/management/commands/export_books.py
+import os
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+EXPORT_FORMATS = ('json', 'csv', 'report')
+
+
+def _format_list(value):
+    formats = [item.strip() for item in value.split(',') if item.strip()]
+    unknown = sorted(set(formats) - set(EXPORT_FORMATS))
+    if unknown or not formats:
+        raise CommandError(f"不支援的匯出格式: {', '.join(unknown) or value}（可用 {', '.join(EXPORT_FORMATS)}）")
+    return formats
+
+
+class Command(BaseCommand):
+    help = "匯出作者、分類與書籍為JSON、CSV與報告（供排程使用，取代直接執行 export_manager.py）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--formats', default=','.join(EXPORT_FORMATS),
+                            help="以逗號分隔的匯出格式（預設 json,csv,report）")
+        parser.add_argument('--output-dir', default='.', help="輸出目錄（不存在時建立）")
+        parser.add_argument('--base-name', help="輸出檔的基礎名稱（預設 data_export_<時間>）")
+        parser.add_argument('--chunk-size', type=int, help="每次從資料庫讀取的筆數")
+        parser.add_argument('--workers', type=int, default=1,
+                            help="大於 1 時各格式與各CSV資料表同時匯出，使用的執行緒或行程數")
+        parser.add_argument('--executor', choices=('thread', 'process'), default='thread',
+                            help="同時匯出時使用執行緒池或行程池")
+        parser.add_argument('--delta', action='store_true', help="增量匯出：只匯出上次匯出後的變動（忽略 --formats）")
+        parser.add_argument('--watermark', help="增量匯出的水位線名稱（預設 DEFAULT_WATERMARK）")
+        parser.add_argument('--metrics-file', help="量測摘要JSON Lines檔（預設為 settings.METRICS_FILE）")
+
+    def handle(self, *args, **options):
+        formats = _format_list(options['formats'])
+        os.makedirs(options['output_dir'], exist_ok=True)
+        base_name = options['base_name'] or f"data_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        base_filename = os.path.join(options['output_dir'], base_name)
+
+        # 匯出流程在執行時才載入，manage.py help 與其他指令不需負擔
+        from export_manager import DataExporter
+        from myapp.delta_export import DEFAULT_WATERMARK
+        from myapp.exporting import DEFAULT_CHUNK_SIZE
+
+        exporter = DataExporter()
+        exporter.export_formats = formats
+        chunk_size = options['chunk_size'] or DEFAULT_CHUNK_SIZE
+        if options['delta']:
+            watermark = options['watermark'] or DEFAULT_WATERMARK
+            success = exporter.export_delta(base_filename, watermark, chunk_size)
+        else:
+            workers = options['workers']
+            success = exporter.export_all_data(
+                base_filename, chunk_size,
+                parallel=workers > 1, workers=workers, executor=options['executor'],
+            )
+        exporter.emit_metrics(options['metrics_file'])
+
+        if not success:
+            raise CommandError("部分匯出失敗，請檢查上方的錯誤訊息")
+        self.stdout.write(self.style.SUCCESS(f"✅ 匯出完成: {base_filename}"))
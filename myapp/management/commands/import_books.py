@@ -0,0 +1,87 @@
+# myapp/management/commands/import_books.py
+import argparse
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+IMPORT_MODES = ('row', 'bulk', 'staging', 'stream', 'pipeline', 'incremental', 'sharded')
+
+
+class Command(BaseCommand):
+    help = "從JSON檔案匯入作者、分類與書籍（供排程使用，取代直接執行 import_data.py）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='sample_data.json', help="來源JSON檔案（預設 sample_data.json）；sharded 模式可為目錄或 glob 樣式")
+        parser.add_argument('--mode', choices=IMPORT_MODES, default='bulk',
+                            help="匯入模式（預設 bulk；stream、pipeline 與 incremental 會邊讀邊匯入，"
+                                 "pipeline 的讀取、清理與寫入同時進行，sharded 平行處理多個部分檔案）")
+        parser.add_argument('--batch-size', type=int, default=1000, help="每次 bulk_create/IN 查詢的筆數")
+        parser.add_argument('--transaction-batch-size', type=int, default=10000, help="每個交易提交的筆數")
+        parser.add_argument('--chunk-size', type=int, default=5000, help="每次從檔案讀取的筆數")
+        parser.add_argument('--workers', type=int, default=1, help="清理資料的行程數（0 為CPU核心數；sharded 模式同時解析的分片數）")
+        parser.add_argument('--queue-size', type=int, default=4, help="pipeline 模式各階段之間最多暫存的區塊數")
+        parser.add_argument('--update-existing', action='store_true', help="更新內容有變動的既有資料")
+        parser.add_argument('--force', action='store_true', help="incremental 模式下重新處理已完整匯入過的檔案")
+        parser.add_argument('--bulk-load', action=argparse.BooleanOptionalAction, default=None,
+                            help="匯入期間切換為 SQLite 大量匯入設定（synchronous=OFF）；未指定時，"
+                                 "來源檔案達 settings.SQLITE_BULK_LOAD_MIN_BYTES 才啟用")
+        parser.add_argument('--metrics-file', help="量測摘要JSON Lines檔（預設為 settings.METRICS_FILE）")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        mode = options['mode']
+        if mode != 'sharded' and not os.path.isfile(path):
+            raise CommandError(f"找不到JSON檔案: {path}")
+
+        # 匯入流程在執行時才載入，manage.py help 與其他指令不需負擔
+        from import_data import DataImporter
+
+        if options['bulk_load'] is None:
+            options['bulk_load'] = self._source_size(path, mode) >= settings.SQLITE_BULK_LOAD_MIN_BYTES
+            if options['bulk_load']:
+                self.stdout.write("ℹ️ 來源檔案較大，匯入期間使用 SQLite 大量匯入設定（--no-bulk-load 可停用）")
+
+        importer = DataImporter()
+        if mode == 'stream':
+            stats = importer.stream_import(
+                path, options['chunk_size'], options['batch_size'], options['transaction_batch_size'],
+                options['update_existing'], options['workers'], options['bulk_load'],
+            )
+        elif mode == 'pipeline':
+            stats = importer.pipeline_import(
+                path, options['chunk_size'], options['batch_size'], options['transaction_batch_size'],
+                options['update_existing'], options['workers'], options['queue_size'], options['bulk_load'],
+            )
+        elif mode == 'sharded':
+            stats = importer.sharded_import(
+                path, options['chunk_size'], options['batch_size'], options['transaction_batch_size'],
+                options['update_existing'], options['workers'], options['bulk_load'],
+            )
+            if stats is None:
+                raise CommandError(f"找不到任何JSON檔案: {path}")
+        elif mode == 'incremental':
+            stats = importer.incremental_import(
+                path, options['chunk_size'], options['batch_size'],
+                options['update_existing'], options['force'], options['bulk_load'],
+            )
+        else:
+            importer.load_raw_data(path, options['chunk_size'])
+            importer.clean_data(options['workers'])
+            stats = importer.import_to_django(
+                mode, options['batch_size'], options['transaction_batch_size'],
+                options['update_existing'], options['bulk_load'],
+            )
+        importer.emit_metrics(options['metrics_file'])
+
+        if mode == 'incremental' and stats is None:
+            self.stdout.write(f"ℹ️ {path} 已完整匯入過，未執行匯入（可加上 --force 重新處理）")
+            return
+        self.stdout.write(self.style.SUCCESS(f"✅ 匯入完成: {path} (mode={mode})"))
+
+    def _source_size(self, path, mode):
+        if mode != 'sharded':
+            return os.path.getsize(path)
+        from myapp.sharded_import import resolve_shards
+
+        return sum(os.path.getsize(shard) for shard in resolve_shards(path))
@@ -0,0 +1,22 @@
+# myapp/management/commands/rebuild_book_stats.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from myapp.stats import rebuild_group_stats
+
+
+class Command(BaseCommand):
+    help = "從書籍資料表重建每位作者與每個分類的書籍統計（AuthorStats / CategoryStats）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help="資料庫別名（預設 default）")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        counts = rebuild_group_stats(using=options['database'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ 書籍統計重建完成: {counts['authorstats']} 位作者, {counts['categorystats']} 個分類，"
+            f"耗時 {elapsed:.2f} 秒"
+        ))
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:54
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+from django.utils import timezone
+
+
+def _duplicate_groups(model, key):
+    """回傳 {自然鍵: 要保留的最小主鍵}，只包含有重複的自然鍵"""
+    return dict(
+        model.objects.values(key).annotate(keep=Min('pk'), total=Count('pk'))
+        .filter(total__gt=1).values_list(key, 'keep')
+    )
+
+
+def merge_duplicates(apps, schema_editor):
+    """加上唯一限制前先合併既有的重複資料
+
+    同名作者/分類保留主鍵最小者（與 get_or_create 取到的相同），其餘的書籍改指向保留者；
+    同名書籍保留主鍵最小者。歷史模型不會觸發 post_delete 訊號，刪除紀錄在此直接寫入。
+    """
+    Author = apps.get_model('myapp', 'Author')
+    Category = apps.get_model('myapp', 'Category')
+    Book = apps.get_model('myapp', 'Book')
+    DeletedRecord = apps.get_model('myapp', 'DeletedRecord')
+    now = timezone.now()
+
+    def delete_with_tombstones(model, queryset):
+        pks = list(queryset.values_list('pk', flat=True))
+        if not pks:
+            return
+        DeletedRecord.objects.bulk_create(
+            [DeletedRecord(model_name=model._meta.model_name, object_id=pk) for pk in pks],
+            batch_size=1000,
+        )
+        model.objects.filter(pk__in=pks).delete()
+
+    for model, fk in ((Author, 'author'), (Category, 'category')):
+        for name, keep in _duplicate_groups(model, 'name').items():
+            duplicates = model.objects.filter(name=name).exclude(pk=keep)
+            Book.objects.filter(**{f'{fk}__in': duplicates}).update(**{f'{fk}_id': keep, 'updated_at': now})
+            delete_with_tombstones(model, duplicates)
+
+    for title, keep in _duplicate_groups(Book, 'title').items():
+        delete_with_tombstones(Book, Book.objects.filter(title=title).exclude(pk=keep))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0003_import_bookkeeping'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['price'], name='book_price_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='author',
+            constraint=models.UniqueConstraint(fields=('name',), name='unique_author_name'),
+        ),
+        migrations.AddConstraint(
+            model_name='book',
+            constraint=models.UniqueConstraint(fields=('title',), name='unique_book_title'),
+        ),
+        migrations.AddConstraint(
+            model_name='category',
+            constraint=models.UniqueConstraint(fields=('name',), name='unique_category_name'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:18
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, Max, Min, Q, Sum
+
+
+def _quantize(value):
+    return None if value is None else value.quantize(Decimal('0.01'))
+
+
+def populate_book_stats(apps, schema_editor):
+    """以既有書籍資料建立每位作者與每個分類的統計（只建立有書籍的群組）"""
+    Book = apps.get_model('myapp', 'Book')
+    for stats_name, group_field in (('AuthorStats', 'author_id'), ('CategoryStats', 'category_id')):
+        stats_model = apps.get_model('myapp', stats_name)
+        rows = Book.objects.order_by().values(group_field).annotate(
+            book_count=Count('pk'),
+            available_count=Count('pk', filter=Q(is_available=True)),
+            min_price=Min('price'),
+            max_price=Max('price'),
+            price_sum=Sum('price', output_field=DecimalField(max_digits=14, decimal_places=2)),
+        )
+        stats_model.objects.bulk_create(
+            [
+                stats_model(
+                    pk=row[group_field],
+                    book_count=row['book_count'],
+                    available_count=row['available_count'],
+                    min_price=_quantize(row['min_price']),
+                    max_price=_quantize(row['max_price']),
+                    price_sum=_quantize(row['price_sum']),
+                )
+                for row in rows
+            ],
+            batch_size=500,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0004_natural_key_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('book_count', models.PositiveIntegerField(default=0)),
+                ('available_count', models.PositiveIntegerField(default=0)),
+                ('min_price', models.DecimalField(decimal_places=2, max_digits=6, null=True)),
+                ('max_price', models.DecimalField(decimal_places=2, max_digits=6, null=True)),
+                ('price_sum', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='myapp.author')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='CategoryStats',
+            fields=[
+                ('book_count', models.PositiveIntegerField(default=0)),
+                ('available_count', models.PositiveIntegerField(default=0)),
+                ('min_price', models.DecimalField(decimal_places=2, max_digits=6, null=True)),
+                ('max_price', models.DecimalField(decimal_places=2, max_digits=6, null=True)),
+                ('price_sum', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='myapp.category')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(populate_book_stats, migrations.RunPython.noop),
+    ]
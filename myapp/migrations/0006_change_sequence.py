@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:10
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def populate_change_seq(apps, schema_editor):
+    """以序號 1 標記可能還沒匯出過的既有資料，並建立序號列
+
+    水位線原本記錄時間；改為序號後，既有水位線一律為 0，
+    最舊的水位線之後才變動的資料與刪除紀錄標記為 1，下一次增量匯出會涵蓋它們（寧可重複，不遺漏）。
+    """
+    ChangeSequence = apps.get_model('myapp', 'ChangeSequence')
+    ExportWatermark = apps.get_model('myapp', 'ExportWatermark')
+    DeletedRecord = apps.get_model('myapp', 'DeletedRecord')
+
+    oldest = ExportWatermark.objects.aggregate(oldest=Min('exported_at'))['oldest']
+    for name in ('Author', 'Category', 'Book'):
+        rows = apps.get_model('myapp', name).objects.all()
+        if oldest is not None:
+            rows = rows.filter(updated_at__gt=oldest)
+        rows.update(change_seq=1)
+    tombstones = DeletedRecord.objects.all()
+    if oldest is not None:
+        tombstones = tombstones.filter(deleted_at__gt=oldest)
+    tombstones.update(change_seq=1)
+    ChangeSequence.objects.create(pk=1, value=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0005_book_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='change_seq',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='change_seq',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='change_seq',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='deletedrecord',
+            name='change_seq',
+            field=models.BigIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='exportwatermark',
+            name='change_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_change_seq, migrations.RunPython.noop),
+    ]
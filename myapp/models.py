@@ -1,28 +1,244 @@
 # myapp/models.py
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models import F
+from django.db.transaction import TransactionManagementError
 
-class Author(models.Model):
+class ChangeSequence(models.Model):
+    """資料變動序號（只有一列）
+
+    每個寫入作者、分類、書籍或刪除紀錄的交易都在交易中遞增一次，並以新的值標記寫入的資料（change_seq）。
+    遞增會取得寫入鎖，SQLite 同時只有一個寫入者，因此序號的順序就是交易提交的順序：
+    在同一個讀取交易中讀到序號 N 時，change_seq <= N 的資料都已提交，之後才提交的資料序號一定大於 N。
+    """
+    SINGLETON_PK = 1
+
+    value = models.BigIntegerField(default=0)
+
+    @classmethod
+    def next_value(cls, using='default'):
+        """遞增並回傳新的序號；需在寫入資料的交易中呼叫，序號才會與資料一起提交"""
+        if not transaction.get_connection(using).in_atomic_block:
+            raise TransactionManagementError("ChangeSequence.next_value() 需在 transaction.atomic() 中呼叫")
+        rows = cls.objects.using(using).filter(pk=cls.SINGLETON_PK)
+        if not rows.update(value=F('value') + 1):
+            cls.objects.using(using).create(pk=cls.SINGLETON_PK, value=1)
+        return cls.current(using)
+
+    @classmethod
+    def current(cls, using='default'):
+        """目前的序號（尚未有任何變動時為 0）"""
+        return cls.objects.using(using).filter(pk=cls.SINGLETON_PK).values_list('value', flat=True).first() or 0
+
+    def __str__(self):
+        return str(self.value)
+
+class ChangeTrackedQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """QuerySet.update() 同樣標記變動序號並讓統計快取失效（不會送出 post_save）
+
+        修改書籍的作者、分類、價格或可借狀態時，在同一個交易中重算受影響的作者與分類統計
+        （更新的書籍以本次的變動序號找出，換作者或分類時另外先記下原本的群組）。
+        """
+        from .stats import books_changed, invalidate  # stats 依賴本模組，延後匯入
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            change_seq = kwargs.setdefault('change_seq', ChangeSequence.next_value(self.db))
+            attnames = {self.model._meta.get_field(name).attname for name in kwargs}
+            group_fields = attnames.intersection(getattr(self.model, 'GROUP_FIELDS', ()))
+            groups = set()
+            if group_fields & {'author_id', 'category_id'}:
+                groups.update(self.order_by().values_list('author_id', 'category_id').distinct())
+            rows = super().update(**kwargs)
+            if rows and group_fields:
+                updated = self.model._base_manager.using(self.db).filter(change_seq=change_seq)
+                groups.update(updated.order_by().values_list('author_id', 'category_id').distinct())
+                books_changed({author_id for author_id, _ in groups},
+                              {category_id for _, category_id in groups}, using=self.db)
+            if rows:
+                invalidate(self.model, count_changed=False, using=self.db)
+            return rows
+
+    update.alters_data = True
+
+    def delete(self):
+        """在同一個交易中刪除，連鎖刪除的書籍只重算一次統計，刪除紀錄一次寫入"""
+        from .stats import invalidation_batch  # stats 依賴本模組，延後匯入
+
+        with transaction.atomic(using=self.db), invalidation_batch():
+            return super().delete()
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+class ChangeTracked(models.Model):
+    """以 change_seq 記錄最後一次寫入時的變動序號，供增量匯出辨識變動
+
+    save() 與 QuerySet.update() 會自動標記；bulk_create 與原始 SQL 需自行在同一個交易中
+    以 ChangeSequence.next_value() 取得序號並寫入。
+    """
+    change_seq = models.BigIntegerField(default=0, db_index=True, editable=False)
+
+    objects = ChangeTrackedQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, using=None, update_fields=None, **kwargs):
+        using = using or router.db_for_write(type(self), instance=self)
+        if update_fields:
+            update_fields = {*update_fields, 'change_seq'}
+        with transaction.atomic(using=using, savepoint=False):
+            self.change_seq = ChangeSequence.next_value(using)
+            super().save(*args, using=using, update_fields=update_fields, **kwargs)
+
+    save.alters_data = True
+
+    def delete(self, using=None, keep_parents=False):
+        """與 QuerySet.delete() 相同，在交易中批次處理統計重算與刪除紀錄"""
+        from .stats import invalidation_batch  # stats 依賴本模組，延後匯入
+
+        using = using or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using), invalidation_batch():
+            return super().delete(using=using, keep_parents=keep_parents)
+
+    delete.alters_data = True
+
+class Author(ChangeTracked):
     name = models.CharField(max_length=100)
     email = models.EmailField()
     birth_date = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name'], name='unique_author_name'),
+        ]
     
     def __str__(self):
         return self.name
 
-class Category(models.Model):
+class Category(ChangeTracked):
     name = models.CharField(max_length=50)
     description = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name'], name='unique_category_name'),
+        ]
     
     def __str__(self):
         return self.name
 
-class Book(models.Model):
+class Book(ChangeTracked):
     title = models.CharField(max_length=200)
     author = models.ForeignKey(Author, on_delete=models.CASCADE)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     publish_date = models.DateField()
     price = models.DecimalField(max_digits=6, decimal_places=2)
     is_available = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        # author、category 外鍵已由 ForeignKey 自動建立索引
+        constraints = [
+            models.UniqueConstraint(fields=['title'], name='unique_book_title'),
+        ]
+        indexes = [
+            models.Index(fields=['price'], name='book_price_idx'),
+        ]
+
+    # 影響作者與分類統計（AuthorStats / CategoryStats）的欄位
+    GROUP_FIELDS = ('author_id', 'category_id', 'price', 'is_available')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 記下載入時的值，儲存時不需再查詢一次就能判斷統計是否需要更新
+        instance._loaded_group_values = {
+            name: value for name, value in zip(field_names, values) if name in cls.GROUP_FIELDS
+        }
+        return instance
     
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+class BookStats(models.Model):
+    """每個群組（作者或分類）的書籍統計摘要，只保留有書籍的群組
+
+    由 myapp.stats 在書籍變動時逐群組重新計算，報告與後台直接讀取，不需對書籍資料表 GROUP BY；
+    可用 python manage.py rebuild_book_stats 重建。
+    """
+    book_count = models.PositiveIntegerField(default=0)
+    available_count = models.PositiveIntegerField(default=0)
+    min_price = models.DecimalField(max_digits=6, decimal_places=2, null=True)
+    max_price = models.DecimalField(max_digits=6, decimal_places=2, null=True)
+    price_sum = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+class AuthorStats(BookStats):
+    """每位作者的書籍統計"""
+    author = models.OneToOneField(Author, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+
+    def __str__(self):
+        return f"{self.author_id}: {self.book_count}本"
+
+class CategoryStats(BookStats):
+    """每個分類的書籍統計"""
+    category = models.OneToOneField(Category, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+
+    def __str__(self):
+        return f"{self.category_id}: {self.book_count}本"
+
+class DeletedRecord(models.Model):
+    """刪除紀錄（tombstone），供增量匯出通知下游刪除資料"""
+    model_name = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    change_seq = models.BigIntegerField(default=0, db_index=True)
+
+    def __str__(self):
+        return f"{self.model_name}#{self.object_id}"
+
+class ExportWatermark(models.Model):
+    """增量匯出的水位線：記錄上次匯出涵蓋到的變動序號與匯出時間"""
+    name = models.CharField(max_length=50, unique=True)
+    change_seq = models.BigIntegerField(default=0)
+    exported_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name}: {self.change_seq} ({self.exported_at})"
+
+class ImportFingerprint(models.Model):
+    """增量匯入的資料指紋：記錄每筆來源資料上次匯入時的內容雜湊"""
+    kind = models.CharField(max_length=10)
+    natural_key = models.CharField(max_length=200)
+    digest = models.CharField(max_length=40)
+    # 最後一次處理此自然鍵的匯入（ImportCheckpoint.run_token），同一次匯入中再出現的同名資料視為重複
+    last_run = models.CharField(max_length=32, blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'natural_key'], name='unique_import_fingerprint'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.natural_key}"
+
+class ImportCheckpoint(models.Model):
+    """增量匯入的進度：記錄來源檔案已提交到第幾個區塊"""
+    identity = models.CharField(max_length=64, unique=True)
+    source_path = models.CharField(max_length=500)
+    chunk_size = models.PositiveIntegerField()
+    last_chunk = models.IntegerField(default=-1)
+    completed = models.BooleanField(default=False)
+    # 從頭開始匯入時產生，續傳時沿用
+    run_token = models.CharField(max_length=32, blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source_path} (區塊 {self.last_chunk})"
@@ -0,0 +1,53 @@
+# myapp/parsers.py
+"""日期與價格的快速解析（不依賴 Django）
+
+匯入資料中同樣的出版日期與價格會重複出現很多次，
+因此兩個解析函式都以有上限的 LRU 快取記住結果。
+"""
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from functools import lru_cache
+
+PARSE_CACHE_SIZE = 4096
+
+# 與 Book.price = DecimalField(max_digits=6, decimal_places=2) 一致
+PRICE_MAX_DIGITS = 6
+PRICE_DECIMAL_PLACES = 2
+_PRICE_QUANTUM = Decimal(1).scaleb(-PRICE_DECIMAL_PLACES)
+_PRICE_LIMIT = Decimal(10) ** (PRICE_MAX_DIGITS - PRICE_DECIMAL_PLACES)
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_iso_date(value):
+    """解析 YYYY-MM-DD 格式的日期
+
+    固定格式直接切字串轉換；其他 strptime('%Y-%m-%d') 可接受的寫法（例如 2023-1-5）
+    退回 strptime 處理，確保結果與原本的清理邏輯相同。
+    """
+    if (len(value) == 10 and value[4] == '-' and value[7] == '-'
+            and value.isascii() and value[:4].isdigit()
+            and value[5:7].isdigit() and value[8:].isdigit()):
+        return date(int(value[:4]), int(value[5:7]), int(value[8:]))
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_price(value):
+    """將價格字串轉為精確到分的 Decimal（四捨五入），超出欄位範圍時拋出 ValueError"""
+    try:
+        price = Decimal(value.strip() if isinstance(value, str) else str(value))
+    except InvalidOperation:
+        raise ValueError(f"價格格式錯誤: {value!r}") from None
+    if not price.is_finite():
+        raise ValueError(f"價格格式錯誤: {value!r}")
+
+    price = price.quantize(_PRICE_QUANTUM, rounding=ROUND_HALF_UP)
+    if abs(price) >= _PRICE_LIMIT:
+        raise ValueError(f"價格超出範圍 (最多 {PRICE_MAX_DIGITS} 位數、{PRICE_DECIMAL_PLACES} 位小數): {value!r}")
+    return price
+
+
+def clear_parse_caches():
+    """清除解析快取"""
+    parse_iso_date.cache_clear()
+    parse_price.cache_clear()
@@ -0,0 +1,63 @@
+# myapp/records.py
+"""匯入流程使用的精簡資料結構
+
+原始資料與清理後的資料都以 NamedTuple 表示，沒有每筆 dict 的雜湊表與重複的鍵字串；
+資料依區段分塊、以 (區段名稱, 資料列表) 的形式在產生器之間傳遞，不保留完整列表。
+"""
+from datetime import date
+from decimal import Decimal
+from typing import NamedTuple, Optional
+
+SECTIONS = ('authors', 'categories', 'books')
+
+
+class RawAuthor(NamedTuple):
+    name: str
+    email: str
+    birth_date: Optional[str]
+
+
+class RawCategory(NamedTuple):
+    name: str
+    description: str
+
+
+class RawBook(NamedTuple):
+    title: str
+    author_name: str
+    category_name: str
+    publish_date: str
+    price: str
+
+
+class AuthorRecord(NamedTuple):
+    name: str
+    email: str
+    birth_date: Optional[date]
+
+
+class CategoryRecord(NamedTuple):
+    name: str
+    description: str
+
+
+class BookRecord(NamedTuple):
+    title: str
+    author_name: str
+    category_name: str
+    publish_date: date
+    price: Decimal
+
+
+class ChunkSource:
+    """可重複迭代的 (區段名稱, 資料列表) 區塊來源
+
+    每次迭代都重新呼叫 factory(*args) 產生區塊，本身不保存任何資料。
+    """
+
+    def __init__(self, factory, *args):
+        self.factory = factory
+        self.args = args
+
+    def __iter__(self):
+        return iter(self.factory(*self.args))
@@ -0,0 +1,229 @@
+# myapp/sharded_import.py
+"""多檔分片匯入
+
+上游將目錄拆成許多部分檔案時，以行程池平行解析與清理各分片，結果交由主行程中唯一的寫入者
+（BulkImporter）依路徑順序寫入；作者與分類的名稱對照跨分片共用，也符合 SQLite 同時只有一個寫入者的限制。
+
+- 先完成解析的分片在緩衝中等待，輪到它時才寫入（重新排序緩衝），解析仍平行進行
+- 同時在處理中（含已完成待寫入）的分片最多 max_pending 個，為寫入順序上接下來的分片，其中較大的檔案先送出；
+  下一個要寫入的分片一定已經送出，不會互相等待
+- 清理後的資料逐塊寫入暫存檔，寫入資料庫時再逐塊讀回，兩邊的記憶體中都只有一個區塊，與分片大小及數量無關；
+  暫存檔至多佔用 max_pending 個分片清理後的大小
+- 書籍的作者或分類可能在其他分片中，找不到的書籍先延後，所有分片寫入後再依原本的順序重試一次；
+  之後出現的同名書籍也一併延後，重試時才能保留排序在前的一筆
+- 分片讀取失敗（檔案無法開啟、JSON格式錯誤）時不寫入該分片的任何資料，只記錄在報告中
+
+同名資料保留路徑排序在前的分片中的一筆（書籍為其中第一筆找得到作者與分類的），
+與先匯入所有分片的作者與分類、再依序匯入書籍的結果相同，與 workers 數量及完成順序無關。
+"""
+import glob
+import os
+import pickle
+import shutil
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, closing, nullcontext
+
+from .bulk_import import BulkImporter
+from .cleaning import clean_records
+from .records import SECTIONS
+from .stats import invalidation_batch
+from .streaming import iter_raw_chunks
+
+DEFAULT_CHUNK_SIZE = 5000
+
+# spool: 存放清理後區塊的暫存目錄（以 iter_spooled_chunks 讀回）；rows: {區段名稱: 原始筆數}；
+# load_errors / rejects: 讀取與清理時略過的 [(原始資料, 錯誤訊息)]
+ShardParse = namedtuple('ShardParse', 'path size spool rows load_errors rejects error seconds')
+# 每個分片的匯入結果；deferred 為寫入時找不到作者或分類（或與延後的書籍同名）而延後重試的書籍數
+ShardReport = namedtuple('ShardReport', 'path size rows rejects created deferred parse_seconds write_seconds error')
+
+
+def resolve_shards(source):
+    """目錄取其中所有 .json 檔，其他視為 glob 樣式（也可以是單一檔案）；依路徑排序（即寫入順序）"""
+    if os.path.isdir(source):
+        source = os.path.join(source, '*.json')
+    return sorted(path for path in glob.glob(source) if os.path.isfile(path))
+
+
+def parse_shard(path, spool_dir, chunk_size=DEFAULT_CHUNK_SIZE):
+    """讀取並清理單一分片（在行程池中執行），回傳 ShardParse
+
+    清理後的區塊依區段逐塊寫入 spool_dir 下的暫存目錄，記憶體中只保留一個區塊；
+    讀取失敗時刪除已寫入的暫存檔，spool 為 None。
+    """
+    started = time.perf_counter()
+    spool = tempfile.mkdtemp(prefix='shard-', dir=spool_dir)
+    files = {}
+    rows = dict.fromkeys(SECTIONS, 0)
+    load_errors = []
+    rejects = []
+
+    def on_load_error(item, error):
+        # 例外物件不一定能傳回主行程，只保留訊息
+        load_errors.append((item, str(error)))
+
+    try:
+        size = os.path.getsize(path)
+        with ExitStack() as stack:
+            for section, raw_records in iter_raw_chunks(path, chunk_size, on_load_error):
+                cleaned, cleaning_rejects = clean_records(section, raw_records)
+                if section not in files:
+                    files[section] = stack.enter_context(open(os.path.join(spool, f'{section}.pickle'), 'wb'))
+                pickle.dump(cleaned, files[section], pickle.HIGHEST_PROTOCOL)
+                rows[section] += len(raw_records)
+                rejects.extend((item, error) for _, item, error in cleaning_rejects)
+    except (OSError, ValueError) as e:  # json.JSONDecodeError 為 ValueError
+        shutil.rmtree(spool, ignore_errors=True)
+        return ShardParse(path, None, None, rows, load_errors, rejects, f"{type(e).__name__}: {e}",
+                          time.perf_counter() - started)
+    return ShardParse(path, size, spool, rows, load_errors, rejects, None, time.perf_counter() - started)
+
+
+def iter_spooled_chunks(spool):
+    """依 SECTIONS 的順序逐塊讀回 parse_shard 寫入的 (區段名稱, record 列表)"""
+    for section in SECTIONS:
+        path = os.path.join(spool, f'{section}.pickle')
+        if not os.path.exists(path):
+            continue
+        with open(path, 'rb') as f:
+            while True:
+                try:
+                    records = pickle.load(f)
+                except EOFError:
+                    break
+                yield section, records
+
+
+class ShardedImporter:
+    """平行解析多個分片、由單一寫入者合併匯入
+
+    on_load_error(item, error) 與 on_reject(item, error) 在寫入每個分片前對其略過的資料呼叫。
+    清理後的暫存檔放在 spool_dir（預設為系統暫存目錄）下的暫存目錄中，匯入結束後刪除。
+    傳入 instrumentation 時，各分片的讀取與清理記在 parse_shard 階段（workers > 1 時以 record() 加入），
+    寫入由 BulkImporter 記在 import_<區段> 階段；傳入 progress（ProgressReporter）時以已寫入分片的位元組數估計剩餘時間。
+    """
+
+    def __init__(self, paths, chunk_size=DEFAULT_CHUNK_SIZE, batch_size=1000, transaction_batch_size=10000,
+                 update_existing=False, workers=None, max_pending=None, using='default',
+                 instrumentation=None, progress=None, on_load_error=None, on_reject=None, spool_dir=None):
+        self.paths = sorted(paths)
+        self.chunk_size = chunk_size
+        self.spool_dir = spool_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 2
+        self.instrumentation = instrumentation
+        self.progress = progress
+        self.on_load_error = on_load_error
+        self.on_reject = on_reject
+        self.engine = BulkImporter(
+            batch_size=batch_size,
+            transaction_batch_size=transaction_batch_size,
+            update_existing=update_existing,
+            using=using,
+            instrumentation=instrumentation,
+        )
+        self.reports = []
+        # 延後匯入的書名；之後出現的同名書籍也需延後，重試時才能保留排序在前的一筆
+        self._deferred_titles = set()
+        self.total_bytes = sum(os.path.getsize(path) for path in self.paths)
+        self._written_bytes = 0
+
+    def run(self):
+        """匯入所有分片，回傳 BulkImporter 的統計資料；仍找不到作者或分類的書籍留在 engine.missing_books"""
+        with tempfile.TemporaryDirectory(prefix='sharded-import-', dir=self.spool_dir) as spool_dir, \
+                invalidation_batch():
+            # 先關閉產生器（等待行程池中仍在執行的解析結束），再刪除暫存目錄
+            with closing(self._iter_parsed(spool_dir)) as parsed_shards:
+                for parsed in parsed_shards:
+                    self._write_shard(parsed)
+            if self.engine.missing_books:
+                # 其他分片提供的作者與分類此時都已寫入
+                self.engine.retry_missing_books()
+        return self.engine.stats
+
+    def _iter_parsed(self, spool_dir):
+        """依路徑順序產生各分片的 ShardParse"""
+        if self.workers <= 1:
+            for path in self.paths:
+                with self._stage('parse_shard') as metrics:
+                    parsed = parse_shard(path, spool_dir, self.chunk_size)
+                    if metrics is not None:
+                        metrics.add_rows(sum(parsed.rows.values()))
+                yield parsed
+            return
+
+        pending = {}  # 寫入順序 → Future，已完成但還沒輪到寫入的分片也留在這裡
+        submitted = 0
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            try:
+                for index in range(len(self.paths)):
+                    window = range(submitted, min(index + self.max_pending, len(self.paths)))
+                    for queued in sorted(window, key=lambda i: os.path.getsize(self.paths[i]), reverse=True):
+                        pending[queued] = pool.submit(parse_shard, self.paths[queued], spool_dir, self.chunk_size)
+                    submitted = max(submitted, window.stop)
+                    yield pending.pop(index).result()
+            finally:
+                for future in pending.values():
+                    future.cancel()
+
+    def _write_shard(self, parsed):
+        if self.instrumentation is not None and self.workers > 1:
+            self.instrumentation.record('parse_shard', parsed.seconds, sum(parsed.rows.values()))
+        for callback, items in ((self.on_load_error, parsed.load_errors), (self.on_reject, parsed.rejects)):
+            if callback is not None:
+                for item, error in items:
+                    callback(item, error)
+        reject_count = len(parsed.load_errors) + len(parsed.rejects)
+
+        size = parsed.size if parsed.size is not None else 0
+        if parsed.error is not None:
+            self.reports.append(ShardReport(
+                parsed.path, size, sum(parsed.rows.values()), reject_count, 0, 0,
+                parsed.seconds, 0.0, parsed.error,
+            ))
+            self._update_progress(0, size)
+            return
+
+        started = time.perf_counter()
+        created = self.engine.stats['books']['created']
+        deferred = len(self.engine.missing_books)
+        for section, records in iter_spooled_chunks(parsed.spool):
+            if section == 'books':
+                self._import_books(records)
+            else:
+                getattr(self.engine, f'import_{section}')(records)
+        shutil.rmtree(parsed.spool, ignore_errors=True)
+        self.reports.append(ShardReport(
+            parsed.path, size, sum(parsed.rows.values()), reject_count,
+            self.engine.stats['books']['created'] - created,
+            len(self.engine.missing_books) - deferred,
+            parsed.seconds, time.perf_counter() - started, None,
+        ))
+        self._update_progress(sum(parsed.rows.values()), size)
+
+    def _import_books(self, books):
+        """找不到作者或分類、或與先前延後的書籍同名的書籍延後，其他的立即匯入"""
+        ready = []
+        deferred = []
+        for book in books:
+            if (book.title in self._deferred_titles or book.author_name not in self.engine.author_ids
+                    or book.category_name not in self.engine.category_ids):
+                self._deferred_titles.add(book.title)
+                deferred.append(book)
+            else:
+                ready.append(book)
+        self.engine.defer_books(deferred)
+        self.engine.import_books(ready)
+
+    def _stage(self, name):
+        if self.instrumentation is None:
+            return nullcontext()
+        return self.instrumentation.stage(name)
+
+    def _update_progress(self, rows, size):
+        self._written_bytes += size
+        if self.progress is not None:
+            self.progress.update(rows, self._written_bytes, self.total_bytes)
@@ -0,0 +1,73 @@
+# myapp/signals.py
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import stats
+from .models import Author, Category, Book
+
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Book)
+def record_deletion(sender, instance, using, **kwargs):
+    """刪除作者、分類或書籍時留下刪除紀錄，供增量匯出使用（與刪除在同一個交易中標記變動序號）"""
+    stats.record_deletion(sender, instance.pk, using=using)
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Book)
+def invalidate_stats_on_save(sender, created, using, **kwargs):
+    """新增或修改後讓統計快取失效（修改不影響筆數）"""
+    stats.invalidate(sender, count_changed=created, using=using)
+
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Book)
+def invalidate_stats_on_delete(sender, using, **kwargs):
+    """刪除後讓統計快取失效"""
+    stats.invalidate(sender, using=using)
+
+
+@receiver(pre_save, sender=Book)
+def remember_book_groups(sender, instance, raw, using, **kwargs):
+    """修改書籍前記下原本影響群組統計的欄位
+
+    從資料庫載入的書籍已在 Book.from_db 記下，只有未載入（或延遲載入）這些欄位時才查詢。
+    """
+    instance._previous_group_values = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    loaded = getattr(instance, '_loaded_group_values', None)
+    if loaded is None or len(loaded) != len(Book.GROUP_FIELDS) or instance._state.db != using:
+        loaded = Book.objects.using(using).filter(pk=instance.pk).values(*Book.GROUP_FIELDS).first()
+    instance._previous_group_values = loaded
+
+
+@receiver(post_save, sender=Book)
+def update_group_stats_on_save(sender, instance, created, using, **kwargs):
+    """新增或修改書籍後更新所屬作者與分類的統計（新增的書籍直接合併進既有統計）
+
+    修改時影響統計的欄位都沒有改變就不需要重算。
+    """
+    previous = getattr(instance, '_previous_group_values', None)
+    current = {name: getattr(instance, name) for name in Book.GROUP_FIELDS}
+    instance._loaded_group_values = current
+    if created:
+        stats.book_added(instance, using=using)
+        return
+    if previous == current:
+        return
+    author_ids = {instance.author_id}
+    category_ids = {instance.category_id}
+    if previous is not None:
+        author_ids.add(previous['author_id'])
+        category_ids.add(previous['category_id'])
+    stats.books_changed(author_ids, category_ids, using=using)
+
+
+@receiver(post_delete, sender=Book)
+def update_group_stats_on_delete(sender, instance, using, **kwargs):
+    """刪除書籍後更新原本所屬作者與分類的統計"""
+    stats.books_changed({instance.author_id}, {instance.category_id}, using=using)
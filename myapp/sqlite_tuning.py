@@ -0,0 +1,48 @@
+# myapp/sqlite_tuning.py
+"""SQLite 連線層級的 PRAGMA 設定與大量匯入模式"""
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+
+def is_sqlite(using='default'):
+    return connections[using].vendor == 'sqlite'
+
+
+def read_pragmas(names, using='default'):
+    """讀取目前連線的 PRAGMA 值，回傳 {名稱: 值}"""
+    values = {}
+    with connections[using].cursor() as cursor:
+        for name in names:
+            cursor.execute(f'PRAGMA {name}')
+            values[name] = cursor.fetchone()[0]
+    return values
+
+
+def apply_pragmas(pragmas, using='default'):
+    """在目前連線上套用 {名稱: 值} 的 PRAGMA 設定"""
+    with connections[using].cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+
+
+@contextmanager
+def bulk_load_mode(using='default', pragmas=None):
+    """暫時切換為大量匯入設定（預設為 settings.SQLITE_BULK_LOAD_PRAGMAS），結束後還原
+
+    只影響匯入所用的這條連線；匯出與後台使用各自的連線，
+    在 WAL 模式下可於匯入期間繼續讀取。非 SQLite 資料庫時不做任何事。
+    """
+    if not is_sqlite(using):
+        yield
+        return
+
+    if pragmas is None:
+        pragmas = getattr(settings, 'SQLITE_BULK_LOAD_PRAGMAS', {})
+    previous = read_pragmas(pragmas, using)
+    apply_pragmas(pragmas, using)
+    try:
+        yield
+    finally:
+        apply_pragmas(previous, using)
@@ -0,0 +1,258 @@
+# myapp/staging.py
+"""暫存表合併匯入：首次匯入與全量更新的快速路徑
+
+清理後的資料以 executemany 寫入 TEMP 暫存表，外鍵對應與合併都交給資料庫，
+以少數幾個集合式 INSERT ... SELECT / UPDATE ... FROM 完成，不建立任何模型實例。
+語意與 BulkImporter 相同：同名資料保留第一筆，既有資料預設保留，
+update_existing=True 時才更新內容有變動的資料；書籍只對應本次來源資料中的作者與分類。
+整個匯入在同一個交易中完成。
+"""
+import time
+from contextlib import nullcontext
+from itertools import islice
+
+from django.db import NotSupportedError, connections, transaction
+from django.utils import timezone
+
+from .models import Author, Category, Book, ChangeSequence
+from .parsers import parse_price
+from .records import AuthorRecord, BookRecord, CategoryRecord
+from .stats import books_changed, invalidate as invalidate_stats
+
+# 區段 → (暫存表名稱, 模型, 自然鍵, 其他欄位)；欄位取自 record，第一個欄位為自然鍵
+STAGING_TABLES = {
+    section: (table, model, record._fields[0], record._fields[1:])
+    for section, table, model, record in (
+        ('authors', 'staging_author', Author, AuthorRecord),
+        ('categories', 'staging_category', Category, CategoryRecord),
+        ('books', 'staging_book', Book, BookRecord),
+    )
+}
+
+
+class StagingLoader:
+    """以暫存表與集合式 SQL 合併匯入作者、分類與書籍（目前僅支援 SQLite）
+
+    傳入 instrumentation 時，各區段寫入暫存表與合併的時間記在 import_<區段> 階段。
+    """
+
+    def __init__(self, batch_size=10000, update_existing=False, using='default', instrumentation=None):
+        if batch_size < 1:
+            raise ValueError("batch_size 必須大於 0")
+        self.batch_size = batch_size
+        self.update_existing = update_existing
+        self.using = using
+        self.instrumentation = instrumentation
+        self.connection = connections[using]
+        if self.connection.vendor != 'sqlite':
+            raise NotSupportedError("暫存表匯入目前僅支援 SQLite")
+
+        self.missing_books = []
+        self.stats = {
+            name: {'rows': 0, 'created': 0, 'existing': 0, 'updated': 0,
+                   'duplicates': 0, 'skipped': 0, 'seconds': 0.0}
+            for name in STAGING_TABLES
+        }
+
+    def run(self, chunks):
+        """在同一個交易中將 (區段名稱, record 列表) 區塊載入暫存表並合併，回傳統計資料"""
+        qn = self.connection.ops.quote_name
+        author_table = qn(Author._meta.db_table)
+        category_table = qn(Category._meta.db_table)
+        book_table = qn(Book._meta.db_table)
+
+        with transaction.atomic(using=self.using), self.connection.cursor() as cursor:
+            for section in STAGING_TABLES:
+                self._create_staging_table(cursor, section)
+            for section, records in chunks:
+                started = time.perf_counter()
+                with self._stage(section) as metrics:
+                    loaded = self._load_staging_table(cursor, section, records)
+                    if metrics is not None:
+                        metrics.add_rows(loaded)
+                self.stats[section]['seconds'] += time.perf_counter() - started
+
+            # 合併前才取得時間與變動序號：序號需在寫入正式資料表的同一個交易中取得（遞增時取得寫入鎖），
+            # 載入暫存表期間不阻擋其他寫入者
+            now = self.connection.ops.adapt_datetimefield_value(timezone.now())
+            change_seq = ChangeSequence.next_value(self.using)
+            for section in ('authors', 'categories'):
+                started = time.perf_counter()
+                with self._stage(section):
+                    self._merge_simple(cursor, section, now, change_seq)
+                self.stats[section]['seconds'] += time.perf_counter() - started
+
+            started = time.perf_counter()
+            with self._stage('books'):
+                stats = self.stats['books']
+                # 找不到作者或分類的書籍先移出暫存表，再去除重複（與 BulkImporter 的順序相同）
+                missing_condition = (
+                    'NOT EXISTS (SELECT 1 FROM staging_author a WHERE a.name = s.author_name) '
+                    'OR NOT EXISTS (SELECT 1 FROM staging_category c WHERE c.name = s.category_name)'
+                )
+                cursor.execute(
+                    f'SELECT title, author_name, category_name, publish_date, price FROM staging_book s '
+                    f'WHERE {missing_condition} ORDER BY seq'
+                )
+                self.missing_books = [
+                    BookRecord(title, author_name, category_name, publish_date, parse_price(str(price)))
+                    for title, author_name, category_name, publish_date, price in cursor.fetchall()
+                ]
+                cursor.execute(f'DELETE FROM staging_book AS s WHERE {missing_condition}')
+                stats['skipped'] += len(self.missing_books)
+                unique_rows = self._dedupe(cursor, 'books')
+
+                resolved = (
+                    f'SELECT s.seq, s.title, a.id AS author_id, c.id AS category_id, s.publish_date, s.price '
+                    f'FROM staging_book s '
+                    f'JOIN {author_table} a ON a.name = s.author_name '
+                    f'JOIN {category_table} c ON c.name = s.category_name'
+                )
+                cursor.execute(
+                    f'INSERT INTO {book_table} '
+                    f'(title, author_id, category_id, publish_date, price, is_available, updated_at, change_seq) '
+                    f'SELECT r.title, r.author_id, r.category_id, r.publish_date, r.price, %s, %s, %s '
+                    f'FROM ({resolved}) r '
+                    f'WHERE NOT EXISTS (SELECT 1 FROM {book_table} b WHERE b.title = r.title) '
+                    f'ORDER BY r.seq',
+                    [True, now, change_seq],
+                )
+                stats['created'] += cursor.rowcount
+                stats['existing'] += unique_rows - cursor.rowcount
+
+                # 受影響的作者與分類：本次資料對應到的群組，加上修改前書籍原本所屬的群組
+                changed_groups = set()
+                if self.update_existing:
+                    changed_condition = (
+                        f'{book_table}.title = r.title AND ('
+                        f'{book_table}.author_id IS NOT r.author_id '
+                        f'OR {book_table}.category_id IS NOT r.category_id '
+                        f'OR {book_table}.publish_date IS NOT r.publish_date '
+                        f'OR {book_table}.price IS NOT r.price)'
+                    )
+                    cursor.execute(
+                        f'SELECT DISTINCT {book_table}.author_id, {book_table}.category_id '
+                        f'FROM {book_table}, ({resolved}) r WHERE {changed_condition}'
+                    )
+                    changed_groups.update(cursor.fetchall())
+                    cursor.execute(
+                        f'UPDATE {book_table} SET author_id = r.author_id, category_id = r.category_id, '
+                        f'publish_date = r.publish_date, price = r.price, updated_at = %s, change_seq = %s '
+                        f'FROM ({resolved}) r WHERE {changed_condition}',
+                        [now, change_seq],
+                    )
+                    stats['updated'] += cursor.rowcount
+                if changed_groups or stats['created']:
+                    cursor.execute(f'SELECT DISTINCT author_id, category_id FROM ({resolved})')
+                    changed_groups.update(cursor.fetchall())
+                    books_changed(
+                        {author_id for author_id, _ in changed_groups},
+                        {category_id for _, category_id in changed_groups},
+                        using=self.using,
+                    )
+            stats['seconds'] += time.perf_counter() - started
+
+            # 暫存表在交易失敗時會隨回滾一併移除
+            for table, *_ in STAGING_TABLES.values():
+                cursor.execute(f'DROP TABLE IF EXISTS temp.{table}')
+
+            # 集合式 SQL 不會送出 post_save，依各模型的變動讓統計快取失效（交易提交後執行）
+            for section, (_, model, _, _) in STAGING_TABLES.items():
+                stats = self.stats[section]
+                if stats['created'] or stats['updated']:
+                    invalidate_stats(model, count_changed=bool(stats['created']), using=self.using)
+        return self.stats
+
+    def _stage(self, section):
+        if self.instrumentation is None:
+            return nullcontext()
+        return self.instrumentation.stage(f'import_{section}')
+
+    def _create_staging_table(self, cursor, section):
+        """建立暫存表，欄位型別沿用模型欄位，比較時的型別轉換與正式資料表一致"""
+        table, model, key, fields = STAGING_TABLES[section]
+        columns = [f'{name} {self._column_type(model, name)}' for name in (key, *fields)]
+        cursor.execute(f'DROP TABLE IF EXISTS temp.{table}')
+        cursor.execute(f'CREATE TEMP TABLE {table} (seq INTEGER PRIMARY KEY, {", ".join(columns)})')
+
+    def _column_type(self, model, name):
+        if name in ('author_name', 'category_name'):
+            # 書籍暫存表中以名稱記錄外鍵
+            related = Author if name == 'author_name' else Category
+            return related._meta.get_field('name').db_type(self.connection)
+        return model._meta.get_field(name).db_type(self.connection)
+
+    def _load_staging_table(self, cursor, section, records):
+        """以 executemany 分批寫入暫存表，seq 保留來源順序，回傳寫入筆數
+
+        暫存表欄位即 record 的欄位，可直接依位置轉換。
+        """
+        table, model, key, fields = STAGING_TABLES[section]
+        names = (key, *fields)
+        adapters = [self._adapter(model, name) for name in names]
+        sql = f'INSERT INTO {table} ({", ".join(names)}) VALUES ({", ".join(["%s"] * len(names))})'
+        records = iter(records)
+        loaded = 0
+        while True:
+            batch = list(islice(records, self.batch_size))
+            if not batch:
+                break
+            cursor.executemany(sql, [
+                [adapt(value) for adapt, value in zip(adapters, record)]
+                for record in batch
+            ])
+            self.stats[section]['rows'] += len(batch)
+            loaded += len(batch)
+        return loaded
+
+    def _adapter(self, model, name):
+        ops = self.connection.ops
+        if name in ('author_name', 'category_name'):
+            return lambda value: value
+        field = model._meta.get_field(name)
+        internal_type = field.get_internal_type()
+        if internal_type == 'DateField':
+            return ops.adapt_datefield_value
+        if internal_type == 'DecimalField':
+            return lambda value: ops.adapt_decimalfield_value(value, field.max_digits, field.decimal_places)
+        return lambda value: value
+
+    def _dedupe(self, cursor, section):
+        """刪除同一自然鍵的後續資料，只保留第一筆；回傳保留的筆數"""
+        table, _, key, _ = STAGING_TABLES[section]
+        cursor.execute(
+            f'DELETE FROM {table} WHERE seq NOT IN (SELECT MIN(seq) FROM {table} GROUP BY {key})'
+        )
+        self.stats[section]['duplicates'] += cursor.rowcount
+        cursor.execute(f'CREATE UNIQUE INDEX temp.{table}_{key} ON {table} ({key})')
+        cursor.execute(f'SELECT COUNT(*) FROM {table}')
+        return cursor.fetchone()[0]
+
+    def _merge_simple(self, cursor, section, now, change_seq):
+        """合併作者或分類：新增不存在的名稱，update_existing 時更新有變動的既有資料"""
+        table, model, key, fields = STAGING_TABLES[section]
+        target = self.connection.ops.quote_name(model._meta.db_table)
+        stats = self.stats[section]
+        unique_rows = self._dedupe(cursor, section)
+
+        columns = ', '.join((key, *fields))
+        cursor.execute(
+            f'INSERT INTO {target} ({columns}, updated_at, change_seq) '
+            f'SELECT {columns}, %s, %s FROM {table} s '
+            f'WHERE NOT EXISTS (SELECT 1 FROM {target} t WHERE t.{key} = s.{key}) '
+            f'ORDER BY s.seq',
+            [now, change_seq],
+        )
+        stats['created'] += cursor.rowcount
+        stats['existing'] += unique_rows - cursor.rowcount
+
+        if self.update_existing:
+            assignments = ', '.join(f'{field} = s.{field}' for field in fields)
+            changed = ' OR '.join(f'{target}.{field} IS NOT s.{field}' for field in fields)
+            cursor.execute(
+                f'UPDATE {target} SET {assignments}, updated_at = %s, change_seq = %s '
+                f'FROM {table} s WHERE {target}.{key} = s.{key} AND ({changed})',
+                [now, change_seq],
+            )
+            stats['updated'] += cursor.rowcount
+
@@ -0,0 +1,348 @@
+# myapp/stats.py
+"""以 Django 快取保存統計資料
+
+報告統計（collect_report_stats）與各資料表筆數計算一次後存入快取，
+之後的報告與資料檢查只需讀取快取；作者、分類或書籍變動時才讓對應的快取失效：
+
+- 任何新增、修改或刪除都會讓報告統計失效（報告含名稱、價格與各作者/分類的書籍數量）
+- 只有新增與刪除會讓該模型的筆數失效，修改不影響筆數
+
+失效在交易提交後才執行，避免其他連線在提交前以舊資料重新填入快取。
+
+每位作者與每個分類的書籍數量與價格統計另存於 AuthorStats / CategoryStats，
+書籍變動時只重新計算受影響的群組（新增的書籍直接合併進既有統計），報告讀取時不需對書籍資料表 GROUP BY。
+群組統計與書籍在同一個交易中寫入，匯入中斷時已提交的書籍與統計仍一致。
+
+批次匯入在 invalidation_batch() 中執行時，期間的快取失效只累積，結束時統一執行一次；
+群組重算與刪除紀錄只有在交易中進入 invalidation_batch() 時才累積到結束時（仍在同一個交易中）執行，
+模型與 QuerySet 的 delete() 即是如此，連鎖刪除大量書籍時只重算一次、刪除紀錄以一次 bulk_create 寫入。
+"""
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, transaction
+from django.db.models import Count, DecimalField, Max, Min, Q, Sum
+from django.utils import timezone
+
+from .exporting import collect_report_stats
+from .models import Author, Category, Book, AuthorStats, CategoryStats, ChangeSequence, DeletedRecord
+
+# 筆數統計的名稱 → 模型
+COUNTED_MODELS = {
+    'authors': Author,
+    'categories': Category,
+    'books': Book,
+}
+
+REPORT_KEYS = {True: 'stats:report:with-titles', False: 'stats:report'}
+
+# 群組統計模型 → 書籍的外鍵欄位
+GROUP_STATS = (
+    (AuthorStats, 'author_id'),
+    (CategoryStats, 'category_id'),
+)
+GROUP_STATS_FIELDS = ('book_count', 'available_count', 'min_price', 'max_price', 'price_sum')
+GROUP_BATCH_SIZE = 500
+
+_PRICE_QUANTUM = Decimal('0.01')
+
+_batch = threading.local()
+
+
+def _cache():
+    return caches[settings.STATS_CACHE_ALIAS]
+
+
+def _count_key(model):
+    return f'stats:count:{model._meta.model_name}'
+
+
+def report_stats(with_titles=True):
+    """回傳報告統計資料（格式與 collect_report_stats 相同），快取中沒有時才查詢"""
+    cache = _cache()
+    key = REPORT_KEYS[bool(with_titles)]
+    stats = cache.get(key)
+    if stats is None:
+        stats = collect_report_stats(with_titles)
+        cache.set(key, stats)
+    return stats
+
+
+def model_counts():
+    """回傳 {'authors': 筆數, 'categories': 筆數, 'books': 筆數}，只查詢快取中沒有的部分
+
+    書籍數量由分類統計加總，不需掃描書籍資料表。
+    """
+    cache = _cache()
+    keys = {name: _count_key(model) for name, model in COUNTED_MODELS.items()}
+    cached = cache.get_many(keys.values())
+    counts = {}
+    missing = {}
+    for name, model in COUNTED_MODELS.items():
+        if keys[name] in cached:
+            counts[name] = cached[keys[name]]
+        elif model is Book:
+            total = CategoryStats.objects.aggregate(total=Sum('book_count'))['total']
+            counts[name] = missing[keys[name]] = total or 0
+        else:
+            counts[name] = missing[keys[name]] = model.objects.count()
+    if missing:
+        cache.set_many(missing)
+    return counts
+
+
+def _quantize(value):
+    # SQLite 的聚合結果為浮點數換算的 Decimal，需量化為兩位小數
+    return None if value is None else value.quantize(_PRICE_QUANTUM)
+
+
+def _compute_group_stats(stats_model, group_field, books):
+    """以一次 GROUP BY 計算 books 中各群組的統計，回傳 {群組主鍵: 統計模型實例}"""
+    rows = (
+        books.order_by().values(group_field).annotate(
+            book_count=Count('pk'),
+            available_count=Count('pk', filter=Q(is_available=True)),
+            min_price=Min('price'),
+            max_price=Max('price'),
+            price_sum=Sum('price', output_field=DecimalField(max_digits=14, decimal_places=2)),
+        )
+    )
+    return {
+        row[group_field]: stats_model(
+            pk=row[group_field],
+            book_count=row['book_count'],
+            available_count=row['available_count'],
+            min_price=_quantize(row['min_price']),
+            max_price=_quantize(row['max_price']),
+            price_sum=_quantize(row['price_sum']),
+        )
+        for row in rows
+    }
+
+
+def refresh_group_stats(author_ids=(), category_ids=(), using='default'):
+    """重新計算指定作者與分類的書籍統計；已沒有書籍的群組刪除其統計"""
+    for (stats_model, group_field), ids in zip(GROUP_STATS, (author_ids, category_ids)):
+        ids = sorted({pk for pk in ids if pk is not None})
+        for start in range(0, len(ids), GROUP_BATCH_SIZE):
+            chunk = ids[start:start + GROUP_BATCH_SIZE]
+            books = Book.objects.using(using).filter(**{f'{group_field}__in': chunk})
+            computed = _compute_group_stats(stats_model, group_field, books)
+            stats_model.objects.using(using).bulk_create(
+                computed.values(),
+                update_conflicts=True,
+                unique_fields=[stats_model._meta.pk.name],
+                update_fields=[*GROUP_STATS_FIELDS, 'updated_at'],
+            )
+            stats_model.objects.using(using).filter(pk__in=chunk).exclude(pk__in=computed).delete()
+
+
+def _merge_group_stats(stats_model, added, using):
+    """將新增書籍的統計（{群組主鍵: 統計模型實例}）合併進既有的群組統計"""
+    added = list(added.values())
+    for start in range(0, len(added), GROUP_BATCH_SIZE):
+        chunk = {row.pk: row for row in added[start:start + GROUP_BATCH_SIZE]}
+        for current in stats_model.objects.using(using).filter(pk__in=chunk):
+            row = chunk[current.pk]
+            row.book_count += current.book_count
+            row.available_count += current.available_count
+            row.price_sum += current.price_sum
+            if current.min_price is not None:
+                row.min_price = current.min_price if row.min_price is None else min(row.min_price, current.min_price)
+            if current.max_price is not None:
+                row.max_price = current.max_price if row.max_price is None else max(row.max_price, current.max_price)
+        stats_model.objects.using(using).bulk_create(
+            chunk.values(),
+            update_conflicts=True,
+            unique_fields=[stats_model._meta.pk.name],
+            update_fields=[*GROUP_STATS_FIELDS, 'updated_at'],
+        )
+
+
+def rebuild_group_stats(using='default'):
+    """從書籍資料表完整重建所有作者與分類的書籍統計，回傳 {統計模型名稱: 群組數}"""
+    counts = {}
+    with transaction.atomic(using=using):
+        for stats_model, group_field in GROUP_STATS:
+            computed = _compute_group_stats(stats_model, group_field, Book.objects.using(using))
+            stats_model.objects.using(using).all().delete()
+            stats_model.objects.using(using).bulk_create(computed.values(), batch_size=GROUP_BATCH_SIZE)
+            counts[stats_model._meta.model_name] = len(computed)
+    invalidate_all(using)
+    return counts
+
+
+def books_changed(author_ids, category_ids, using='default'):
+    """書籍新增、修改或刪除後更新受影響群組的統計（需與書籍的變動在同一個交易中呼叫）
+
+    修改書籍的作者或分類時，新舊群組都需要傳入。
+    在交易中進入的 invalidation_batch() 內呼叫時只累積，離開時才統一重算。
+    """
+    if _accumulate_groups(author_ids, category_ids, using):
+        return
+    refresh_group_stats(author_ids, category_ids, using)
+
+
+def books_added(books, author_ids, category_ids, using='default'):
+    """新增書籍後將它們合併進所屬群組的統計（需與新增在同一個交易中呼叫）
+
+    books 為只包含這些新書籍的 QuerySet；只彙總新書籍，不需重新掃描群組中原有的書籍。
+    author_ids 與 category_ids 為它們所屬的群組，在交易中進入的 invalidation_batch() 內呼叫時只累積這些群組。
+    """
+    if _accumulate_groups(author_ids, category_ids, using):
+        return
+    for stats_model, group_field in GROUP_STATS:
+        _merge_group_stats(stats_model, _compute_group_stats(stats_model, group_field, books), using)
+
+
+def book_added(book, using='default'):
+    """新增單一書籍後以增量更新所屬作者與分類的統計（每個群組一個 UPDATE，與群組大小無關）
+
+    逐筆新增時每本書都會呼叫，直接執行 SQL 以省去 ORM 組合查詢的成本。
+    需與新增在同一個交易中呼叫；在交易中進入的 invalidation_batch() 內呼叫時只累積群組。
+    """
+    if _accumulate_groups({book.author_id}, {book.category_id}, using):
+        return
+    price = _quantize(Book._meta.get_field('price').to_python(book.price))
+    available = int(bool(book.is_available))
+    now = timezone.now()
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for stats_model, group_field in GROUP_STATS:
+            group_id = getattr(book, group_field)
+            cursor.execute(
+                f'UPDATE {qn(stats_model._meta.db_table)} SET book_count = book_count + 1, '
+                f'available_count = available_count + %s, price_sum = price_sum + %s, '
+                f'min_price = CASE WHEN min_price IS NULL OR min_price > %s THEN %s ELSE min_price END, '
+                f'max_price = CASE WHEN max_price IS NULL OR max_price < %s THEN %s ELSE max_price END, '
+                f'updated_at = %s WHERE {qn(stats_model._meta.pk.column)} = %s',
+                [available, price, price, price, price, price, now, group_id],
+            )
+            if not cursor.rowcount:
+                stats_model.objects.using(using).create(
+                    pk=group_id, book_count=1, available_count=available,
+                    min_price=price, max_price=price, price_sum=price,
+                )
+
+
+def _accumulate_groups(author_ids, category_ids, using):
+    groups = _transactional_pending(using)
+    if groups is None:
+        return False
+    groups['authors'].update(author_ids)
+    groups['categories'].update(category_ids)
+    return True
+
+
+def record_deletion(model, object_id, using='default'):
+    """刪除作者、分類或書籍後留下刪除紀錄（DeletedRecord），供增量匯出使用
+
+    需與刪除在同一個交易中呼叫；在交易中進入的 invalidation_batch() 內只累積，
+    離開時以同一個變動序號一次寫入。
+    """
+    groups = _transactional_pending(using)
+    if groups is not None:
+        groups['deleted'].append((model._meta.model_name, object_id))
+        return
+    _write_deletions([(model._meta.model_name, object_id)], using)
+
+
+def _write_deletions(deleted, using):
+    change_seq = ChangeSequence.next_value(using)
+    DeletedRecord.objects.using(using).bulk_create(
+        [DeletedRecord(model_name=model_name, object_id=object_id, change_seq=change_seq)
+         for model_name, object_id in deleted],
+        batch_size=GROUP_BATCH_SIZE,
+    )
+
+
+def _transactional_pending(using):
+    # 批次在交易外開始時，結束時的寫入與已提交的變動不在同一個交易中，不累積
+    pending = getattr(_batch, 'pending', None)
+    if pending is None or using not in _batch.atomic_aliases:
+        return None
+    return _pending_for(pending, using)
+
+
+def invalidation_keys(model, count_changed=True):
+    """模型資料變動時需要失效的快取鍵"""
+    keys = set(REPORT_KEYS.values())
+    if count_changed:
+        keys.add(_count_key(model))
+    return keys
+
+
+def invalidate(model, count_changed=True, using='default'):
+    """作者、分類或書籍變動後讓相關快取失效
+
+    count_changed=False 表示只修改既有資料（筆數不變）。
+    在 invalidation_batch() 中呼叫時只累積，離開時才統一執行。
+    """
+    pending = getattr(_batch, 'pending', None)
+    if pending is not None:
+        _pending_for(pending, using)['keys'].update(invalidation_keys(model, count_changed))
+        return
+    _delete_on_commit(invalidation_keys(model, count_changed), using)
+
+
+def invalidate_all(using='default'):
+    """讓所有統計快取失效（例如以原始 SQL 修改資料之後）"""
+    keys = set(REPORT_KEYS.values())
+    keys.update(_count_key(model) for model in COUNTED_MODELS.values())
+    _delete_on_commit(keys, using)
+
+
+def _delete_on_commit(keys, using):
+    # 不在交易中時 on_commit 會立即執行；交易回滾時資料未變動，也不需要失效
+    transaction.on_commit(lambda: _cache().delete_many(list(keys)), using=using)
+
+
+def _pending_for(pending, using):
+    return pending.setdefault(using, {'keys': set(), 'authors': set(), 'categories': set(), 'deleted': []})
+
+
+def _atomic_aliases():
+    return {connection.alias for connection in connections.all(initialized_only=True) if connection.in_atomic_block}
+
+
+@contextmanager
+def invalidation_batch():
+    """批次操作期間累積快取失效與群組重算，結束時統一執行一次
+
+    群組重算與刪除紀錄只在進入時已位於交易中的資料庫連線累積，結束時仍在同一個交易中執行；
+    其他連線上的變動立即處理。可巢狀使用，只有最外層結束時才執行；
+    外層在交易外開始、內層在交易中開始時，內層自成一個批次。
+
+    發生例外時不重算也不寫入刪除紀錄（交易通常隨之回滾，且交易可能已處於錯誤狀態），
+    只讓累積的快取失效：交易外已提交的變動仍需失效，回滾時 on_commit 的失效也會一併捨棄。
+    """
+    atomic_aliases = _atomic_aliases()
+    outer = getattr(_batch, 'pending', None)
+    if outer is not None and atomic_aliases <= _batch.atomic_aliases:
+        yield
+        return
+
+    outer_aliases = getattr(_batch, 'atomic_aliases', set())
+    _batch.pending, _batch.atomic_aliases = {}, atomic_aliases
+    try:
+        yield
+    except BaseException:
+        pending = _batch.pending
+        _batch.pending, _batch.atomic_aliases = outer, outer_aliases
+        for using, groups in pending.items():
+            _delete_on_commit(groups['keys'], using)
+        raise
+    else:
+        pending = _batch.pending
+        _batch.pending, _batch.atomic_aliases = outer, outer_aliases
+        for using, groups in pending.items():
+            # 交易已確定回滾時資料的變動也不會保留，不需重算與寫入刪除紀錄
+            if not connections[using].needs_rollback:
+                refresh_group_stats(groups['authors'], groups['categories'], using)
+                if groups['deleted']:
+                    _write_deletions(groups['deleted'], using)
+            _delete_on_commit(groups['keys'], using)
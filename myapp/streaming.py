@@ -0,0 +1,171 @@
+# myapp/streaming.py
+"""增量式 JSON 讀取：逐筆解析 authors/categories/books 陣列，記憶體用量與檔案大小無關"""
+import json
+import os
+
+from .records import SECTIONS, RawAuthor, RawBook, RawCategory
+
+_WHITESPACE = ' \t\n\r'
+_NUMBER_CHARS = '0123456789.eE+-'
+
+
+def to_raw_record(section, item):
+    """將JSON中的單筆資料轉換為匯入程式使用的原始資料 record"""
+    if section == 'authors':
+        return RawAuthor(item['name'], item['email'], item['birth_date'])
+    if section == 'categories':
+        return RawCategory(item['name'], item.get('description', ''))
+    if section == 'books':
+        return RawBook(
+            item['title'],
+            item['author_name'],
+            item['category_name'],
+            item['publish_date'],
+            str(item['price']),  # 確保是字串格式
+        )
+    raise ValueError(f"未知的資料區段: {section}")
+
+
+class JSONSectionReader:
+    """從頂層物件中逐一讀出指定陣列的元素
+
+    只在緩衝區中保留尚未解析的文字與目前這一筆資料，
+    其他頂層欄位（例如匯出檔的 metadata）會被解析後丟棄。
+    """
+
+    def __init__(self, fp, sections=SECTIONS, read_size=1 << 16,
+                 max_value_size=1 << 24):
+        self.fp = fp
+        self.sections = set(sections)
+        self.read_size = read_size
+        self.max_value_size = max_value_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def __iter__(self):
+        """產生 (區段名稱, 資料) 組合"""
+        self._expect('{')
+        if self._peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self._decode()
+            if not isinstance(key, str):
+                self._error("物件的鍵必須是字串")
+            self._expect(':')
+            if key in self.sections and self._peek() == '[':
+                self.pos += 1
+                yield from self._iter_array(key)
+            else:
+                self._decode()
+            if self._expect(',}') == '}':
+                return
+
+    def _iter_array(self, key):
+        if self._peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield key, self._decode()
+            self._compact()
+            if self._expect(',]') == ']':
+                return
+
+    def _fill(self):
+        """讀入更多資料；已到檔案結尾時回傳 False"""
+        if self.eof:
+            return False
+        data = self.fp.read(self.read_size)
+        if not data:
+            self.eof = True
+            return False
+        self.buf += data
+        return True
+
+    def _compact(self):
+        if self.pos >= self.read_size:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+
+    def _peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            self._compact()
+            if not self._fill():
+                self._error("檔案提前結束")
+
+    def _expect(self, chars):
+        char = self._peek()
+        if char not in chars:
+            self._error(f"預期為 {' 或 '.join(chars)}，實際為 {char!r}")
+        self.pos += 1
+        return char
+
+    def _decode(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if len(self.buf) - self.pos > self.max_value_size or not self._fill():
+                    raise
+                continue
+            # 數字可能剛好被切在緩衝區結尾（例如 "2." 或 "1e"），需讀入更多後重新解析
+            if end == len(self.buf) or (
+                    isinstance(value, (int, float)) and self.buf[end] in _NUMBER_CHARS):
+                if self._fill():
+                    continue
+            self.pos = end
+            return value
+
+    def _error(self, message):
+        raise json.JSONDecodeError(message, self.buf, self.pos)
+
+
+def iter_json_chunks(json_file_path, chunk_size=1000, sections=SECTIONS, on_progress=None):
+    """逐塊讀取JSON檔案，每塊只包含同一區段、最多 chunk_size 筆資料
+
+    on_progress(已讀取位元組數, 檔案大小) 在每塊產生前呼叫，可用於顯示進度。
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size 必須大於 0")
+
+    with open(json_file_path, 'r', encoding='utf-8') as file:
+        size = os.fstat(file.fileno()).st_size
+        current_section = None
+        chunk = []
+        for section, item in JSONSectionReader(file, sections):
+            if section != current_section or len(chunk) >= chunk_size:
+                if chunk:
+                    if on_progress is not None:
+                        on_progress(file.buffer.tell(), size)
+                    yield current_section, chunk
+                current_section = section
+                chunk = []
+            chunk.append(item)
+        if chunk:
+            if on_progress is not None:
+                on_progress(size, size)
+            yield current_section, chunk
+
+
+def iter_raw_chunks(json_file_path, chunk_size=1000, on_error=None, on_progress=None):
+    """逐塊讀取JSON檔案並轉換為原始資料 record，產生 (區段名稱, record 列表)
+
+    無法轉換的資料（例如缺少欄位）會被略過，並交給 on_error(原始資料, 例外) 處理；
+    on_progress 與 iter_json_chunks 相同。
+    """
+    for section, items in iter_json_chunks(json_file_path, chunk_size, on_progress=on_progress):
+        records = []
+        for item in items:
+            try:
+                records.append(to_raw_record(section, item))
+            except Exception as e:
+                if on_error is not None:
+                    on_error(item, e)
+        yield section, records
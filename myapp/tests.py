@@ -1,3 +1,1606 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import csv
+import io
+import json
+import os
+import tempfile
+from datetime import datetime
+import time
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import Permission, User
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import Avg
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .admin import EstimatedCountPaginator
+from .async_pipeline import AsyncImportPipeline
+from .bulk_import import BulkImporter
+from .cleaning import clean_records, iter_clean_chunks
+from .concurrent_export import atomic_output, build_export_tasks, run_concurrent_export
+from .delta_export import get_watermark, prune_deleted_records, write_delta_export
+from .export_pipeline import CSVSink, ExportPipeline, build_export_sinks
+from .exporting import (
+    AUTHOR_CSV, AUTHOR_CSV_WITH_CREATED, BOOK_CSV, CATEGORY_CSV, JSON_TABLES, collect_report_stats, iter_csv_text,
+    render_report, write_csv_exports, write_csv_table, write_json_export,
+)
+from .incremental_import import IncrementalImporter
+from .instrumentation import CappedLog, Instrumentation, ProgressReporter, format_seconds
+from .management.commands.import_books import IMPORT_MODES
+from .models import (
+    Author, AuthorStats, Book, Category, CategoryStats, ChangeSequence, DeletedRecord, ImportCheckpoint,
+    ImportFingerprint,
+)
+from .parsers import clear_parse_caches, parse_iso_date, parse_price
+from .records import SECTIONS, RawAuthor, RawBook, RawCategory
+from .sharded_import import ShardedImporter, iter_spooled_chunks, parse_shard
+from .staging import StagingLoader
+from .stats import (
+    GROUP_STATS, GROUP_STATS_FIELDS, _compute_group_stats, books_changed, invalidation_batch, model_counts,
+    report_stats,
+)
+from .streaming import JSONSectionReader, iter_raw_chunks
+
+# 統計快取固定使用記憶體快取，不受 HOMEWORK_STATS_CACHE_DIR 影響
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default'},
+    'stats': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'stats'},
+}
+
+
+def author(name, email=None, birth_date='1980-01-01'):
+    return {'name': name, 'email': email or f'{name}@example.com', 'birth_date': birth_date}
+
+
+def category(name, description=''):
+    return {'name': name, 'description': description}
+
+
+def book(title, author_name, category_name, price='100.00', publish_date='2020-01-01'):
+    return {'title': title, 'author_name': author_name, 'category_name': category_name,
+            'publish_date': publish_date, 'price': price}
+
+
+def cleaned_chunks(authors=(), categories=(), books=()):
+    """將 dict 資料轉為清理後的 (區段名稱, record 列表) 區塊"""
+    raw = {
+        'authors': [RawAuthor(**item) for item in authors],
+        'categories': [RawCategory(**item) for item in categories],
+        'books': [RawBook(**item) for item in books],
+    }
+    return [(section, clean_records(section, raw[section])[0]) for section in SECTIONS]
+
+
+def table_snapshot():
+    """以自然鍵表示的資料表內容（與主鍵無關，可比較不同匯入方式的結果）"""
+    return {
+        'authors': sorted(Author.objects.values_list('name', 'email', 'birth_date')),
+        'categories': sorted(Category.objects.values_list('name', 'description')),
+        'books': sorted(Book.objects.values_list(
+            'title', 'author__name', 'category__name', 'publish_date', 'price', 'is_available')),
+        'author_stats': sorted(AuthorStats.objects.values_list('author__name', *GROUP_STATS_FIELDS)),
+        'category_stats': sorted(CategoryStats.objects.values_list('category__name', *GROUP_STATS_FIELDS)),
+    }
+
+
+class GroupStatsAssertions:
+    def assertGroupStatsConsistent(self):
+        """儲存的作者/分類統計需與從書籍資料表重新計算的結果相同"""
+        for stats_model, group_field in GROUP_STATS:
+            computed = _compute_group_stats(stats_model, group_field, Book.objects.all())
+            expected = {pk: tuple(getattr(row, field) for field in GROUP_STATS_FIELDS)
+                        for pk, row in computed.items()}
+            stored = {row.pk: tuple(getattr(row, field) for field in GROUP_STATS_FIELDS)
+                      for row in stats_model.objects.all()}
+            self.assertEqual(stored, expected, stats_model.__name__)
+
+
+
+class JSONSectionReaderTests(SimpleTestCase):
+    DOCUMENT = {
+        'metadata': {'export_time': '2024-01-01T00:00:00', 'nested': [1, {'a': [2.5, None, True]}]},
+        'authors': [
+            author('張三 "引號" \\ 反斜線'),
+            author('Lié \U0001F4DA', birth_date=None),
+        ],
+        'categories': [],
+        'books': [
+            {'title': '書' * 40, 'price': 1234.5, 'tags': ['a', {'b': []}]},
+            {'title': 'x', 'price': 12},
+            {'title': 'y', 'price': -3e-2},
+        ],
+        'trailer': 98765,
+    }
+
+    def read(self, text, read_size):
+        return list(JSONSectionReader(io.StringIO(text), read_size=read_size))
+
+    def expected(self):
+        return [(section, item) for section in SECTIONS for item in self.DOCUMENT[section]]
+
+    def test_every_buffer_boundary(self):
+        for indent in (None, 2):
+            text = json.dumps(self.DOCUMENT, ensure_ascii=False, indent=indent)
+            for read_size in [*range(1, 48), len(text), 1 << 16]:
+                with self.subTest(indent=indent, read_size=read_size):
+                    self.assertEqual(self.read(text, read_size), self.expected())
+
+    def test_numbers_split_across_reads(self):
+        text = '{"books": [12345, 1.5e3, -0.25, 7]}'
+        for read_size in range(1, len(text) + 1):
+            with self.subTest(read_size=read_size):
+                values = [item for _, item in self.read(text, read_size)]
+                self.assertEqual(values, [12345, 1500.0, -0.25, 7])
+                self.assertIsInstance(values[0], int)
+
+    def test_empty_document_and_arrays(self):
+        self.assertEqual(self.read('{}', 1), [])
+        self.assertEqual(self.read('{"authors": [], "books": [ ]}', 3), [])
+
+    def test_other_sections_are_skipped(self):
+        text = '{"reviews": [{"title": "a"}], "books": [{"title": "b"}]}'
+        self.assertEqual(self.read(text, 4), [('books', {'title': 'b'})])
+
+    def test_truncated_or_malformed_input(self):
+        for text in ('{"books": [{"title": "a"}', '{"books": [{"title": "a"} {"title": "b"}]}', '[1, 2]'):
+            for read_size in (1, 5, 1 << 16):
+                with self.subTest(text=text, read_size=read_size):
+                    with self.assertRaises(json.JSONDecodeError):
+                        self.read(text, read_size)
+
+
+
+FIRST_FEED = {
+    'authors': [author('甲'), author('乙'), author('甲', email='dup@example.com'), author(' 丙 ')],
+    'categories': [category('小說'), category('科普', '知識'), category('小說', '重複')],
+    'books': [
+        book('B1', '甲', '小說', '120.50'),
+        book('B2', '乙', '科普', '80'),
+        book('B1', '乙', '科普', '999'),   # 同名書籍，保留第一筆
+        book('B3', '丙', '小說', '35.25'),
+        book('B4', '不存在', '小說'),       # 找不到作者
+    ],
+}
+
+SECOND_FEED = {
+    'authors': [author('甲', email='new@example.com'), author('丁')],
+    'categories': [category('科普', '新說明')],
+    'books': [
+        book('B2', '甲', '科普', '90'),     # 換作者並改價格
+        book('B3', '丙', '小說', '35.25'),  # 未變動
+        book('B5', '丁', '科普', '10'),
+    ],
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class StagingMergeTests(GroupStatsAssertions, TestCase):
+    """暫存表合併與批次匯入引擎的結果需相同"""
+
+    def import_feeds(self, make_engine):
+        snapshots = []
+        missing = []
+        for feed, update_existing in ((FIRST_FEED, False), (SECOND_FEED, True)):
+            engine = make_engine(update_existing)
+            engine.run(cleaned_chunks(**feed))
+            missing.append(sorted(record.title for record in engine.missing_books))
+            snapshots.append(table_snapshot())
+            self.assertGroupStatsConsistent()
+        return snapshots, missing
+
+    def test_staging_matches_bulk_importer(self):
+        bulk = self.import_feeds(lambda update_existing: BulkImporter(
+            batch_size=2, transaction_batch_size=2, update_existing=update_existing))
+
+        Book.objects.all().delete()
+        Author.objects.all().delete()
+        Category.objects.all().delete()
+        staging = self.import_feeds(lambda update_existing: StagingLoader(
+            batch_size=2, update_existing=update_existing))
+
+        self.assertEqual(staging, bulk)
+        first, second = bulk[0]
+        self.assertIn(('B1', '甲', '小說'), [row[:3] for row in first['books']])
+        self.assertIn(('B2', '甲', '科普'), [row[:3] for row in second['books']])
+        # 第二份來源沒有作者「丙」，B3 視為找不到作者
+        self.assertEqual(bulk[1], [['B4'], ['B3']])
+
+
+
+
+@override_settings(CACHES=TEST_CACHES)
+class BulkImporterTests(GroupStatsAssertions, TestCase):
+    def chunks(self, *books, authors=(author('甲'), author('乙')), categories=(category('小說'), category('科普'))):
+        """每筆資料各自成為一個區塊，測試跨區塊的行為"""
+        chunked = cleaned_chunks(authors, categories, books)
+        return [(section, [record]) for section, records in chunked for record in records]
+
+    def counts(self, engine, section):
+        return {name: value for name, value in engine.stats[section].items() if name != 'seconds'}
+
+    def test_upsert_marks_only_changed_rows(self):
+        BulkImporter().run(self.chunks(book('B1', '甲', '小說', '10'), book('B2', '甲', '小說', '20')))
+        before = {row.title: row for row in Book.objects.all()}
+
+        engine = BulkImporter(update_existing=True)
+        engine.run(self.chunks(book('B1', '甲', '小說', '11'), book('B2', '甲', '小說', '20')))
+        after = {row.title: row for row in Book.objects.all()}
+        self.assertEqual(engine.stats['books']['updated'], 1)
+        self.assertEqual(engine.stats['books']['existing'], 2)
+        self.assertEqual(after['B1'].price, Decimal('11.00'))
+        self.assertGreater(after['B1'].change_seq, before['B1'].change_seq)
+        self.assertGreater(after['B1'].updated_at, before['B1'].updated_at)
+        self.assertEqual(after['B2'].change_seq, before['B2'].change_seq)
+        self.assertEqual(after['B2'].updated_at, before['B2'].updated_at)
+        self.assertEqual(engine.stats['authors']['updated'], 0)
+
+    def test_reassigned_books_update_old_and_new_groups(self):
+        BulkImporter().run(self.chunks(book('B1', '甲', '小說', '10'), book('B2', '甲', '小說', '30')))
+        BulkImporter(update_existing=True).run(self.chunks(book('B2', '乙', '科普', '30')))
+        self.assertGroupStatsConsistent()
+        self.assertEqual(AuthorStats.objects.get(author__name='甲').max_price, Decimal('10.00'))
+        self.assertEqual(AuthorStats.objects.get(author__name='乙').book_count, 1)
+        self.assertEqual(CategoryStats.objects.get(category__name='科普').price_sum, Decimal('30.00'))
+
+        BulkImporter(update_existing=True).run(self.chunks(book('B1', '乙', '科普', '10')))
+        self.assertGroupStatsConsistent()
+        self.assertFalse(AuthorStats.objects.filter(author__name='甲').exists())
+        self.assertFalse(CategoryStats.objects.filter(category__name='小說').exists())
+
+    def test_repeats_across_chunks_keep_the_first(self):
+        engine = BulkImporter(batch_size=1, transaction_batch_size=1, update_existing=True)
+        engine.run(self.chunks(
+            book('B1', '甲', '小說', '10'), book('B1', '乙', '科普', '99'), book('B1', '乙', '科普', '98'),
+            authors=(author('甲'), author('乙'), author('甲', email='later@example.com')),
+        ))
+        self.assertEqual(Book.objects.get(title='B1').price, Decimal('10.00'))
+        self.assertEqual(Author.objects.get(name='甲').email, '甲@example.com')
+        self.assertEqual(self.counts(engine, 'books'),
+                         {'rows': 3, 'created': 1, 'existing': 0, 'updated': 0, 'duplicates': 2, 'skipped': 0})
+        self.assertEqual(engine.stats['authors']['duplicates'], 1)
+
+    def test_repeats_are_duplicates_whether_or_not_the_row_existed(self):
+        BulkImporter().run(self.chunks(book('B1', '甲', '小說', '10')))
+        feed = self.chunks(book('B1', '甲', '小說', '15'), book('B1', '乙', '科普', '99'), book('B2', '乙', '科普'),
+                           book('B2', '甲', '科普'))
+        for update_existing, price in ((False, '10.00'), (True, '15.00')):
+            with self.subTest(update_existing=update_existing):
+                engine = BulkImporter(update_existing=update_existing)
+                engine.run(feed)
+                self.assertEqual(Book.objects.get(title='B1').price, Decimal(price))
+                self.assertEqual(Book.objects.get(title='B2').author.name, '乙')
+                self.assertEqual(engine.stats['books']['duplicates'], 2)
+                self.assertEqual(engine.stats['authors']['existing'], 2)
+
+    def test_counts_match_the_staging_loader(self):
+        BulkImporter().run(self.chunks(book('B1', '甲', '小說', '10')))
+        feed = self.chunks(book('B1', '甲', '小說', '15'), book('B1', '乙', '科普', '99'), book('B2', '乙', '科普'),
+                           book('B2', '甲', '科普'), book('B3', '不存在', '科普'),
+                           authors=(author('甲'), author('乙'), author('丙'), author('丙')))
+        for update_existing in (False, True):
+            engines = []
+            for engine in (BulkImporter(update_existing=update_existing),
+                           StagingLoader(update_existing=update_existing)):
+                with transaction.atomic():
+                    engine.run(feed)
+                    transaction.set_rollback(True)
+                engines.append(engine)
+            for section in SECTIONS:
+                with self.subTest(update_existing=update_existing, section=section):
+                    self.assertEqual(*(self.counts(engine, section) for engine in engines))
+
+class DuplicateMergeMigrationTests(TransactionTestCase):
+    """0004 在加上唯一限制前合併重複的作者、分類與書籍"""
+
+    before = [('myapp', '0003_import_bookkeeping')]
+    after = [('myapp', '0004_natural_key_constraints')]
+
+    def setUp(self):
+        self.executor = MigrationExecutor(connection)
+        self.executor.migrate(self.before)
+        self.executor.loader.build_graph()
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_merges_duplicates_keeping_the_earliest(self):
+        apps = self.executor.loader.project_state(self.before).apps
+        Author = apps.get_model('myapp', 'Author')
+        Category = apps.get_model('myapp', 'Category')
+        Book = apps.get_model('myapp', 'Book')
+
+        first_author = Author.objects.create(name='甲', email='a@example.com')
+        second_author = Author.objects.create(name='甲', email='b@example.com')
+        other_author = Author.objects.create(name='乙', email='c@example.com')
+        first_category = Category.objects.create(name='小說')
+        second_category = Category.objects.create(name='小說')
+        kept_book = Book.objects.create(title='B1', author=second_author, category=second_category,
+                                        publish_date='2020-01-01', price='10.00')
+        Book.objects.create(title='B1', author=other_author, category=first_category,
+                            publish_date='2021-01-01', price='20.00')
+        Book.objects.create(title='B2', author=other_author, category=second_category,
+                            publish_date='2021-01-01', price='30.00')
+
+        self.executor.migrate(self.after)
+        apps = self.executor.loader.project_state(self.after).apps
+        Author = apps.get_model('myapp', 'Author')
+        Category = apps.get_model('myapp', 'Category')
+        Book = apps.get_model('myapp', 'Book')
+        DeletedRecord = apps.get_model('myapp', 'DeletedRecord')
+
+        self.assertEqual(list(Author.objects.filter(name='甲').values_list('pk', flat=True)), [first_author.pk])
+        self.assertEqual(list(Category.objects.values_list('pk', flat=True)), [first_category.pk])
+        books = {row.title: row for row in Book.objects.all()}
+        self.assertEqual(sorted(books), ['B1', 'B2'])
+        self.assertEqual(books['B1'].pk, kept_book.pk)
+        self.assertEqual(books['B1'].author_id, first_author.pk)
+        self.assertEqual(books['B1'].category_id, first_category.pk)
+        self.assertEqual(books['B2'].category_id, first_category.pk)
+        self.assertEqual(
+            sorted(DeletedRecord.objects.values_list('model_name', 'object_id')),
+            sorted([('author', second_author.pk), ('book', kept_book.pk + 1), ('category', second_category.pk)]),
+        )
+
+
+
+@override_settings(CACHES=TEST_CACHES)
+class DeltaExportTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        BulkImporter().run(cleaned_chunks(**FIRST_FEED))
+
+    def export(self, name='delta.json'):
+        filename = os.path.join(self.directory.name, name)
+        since, until, rows = write_delta_export(filename, 'test')
+        with open(filename, encoding='utf-8') as f:
+            document = json.load(f)
+        return since, until, rows, document
+
+    def test_exports_changes_and_tombstones_since_the_watermark(self):
+        since, until, rows, document = self.export()
+        self.assertIsNone(since)
+        self.assertEqual(get_watermark('test'), until)
+        self.assertEqual(len(document['books']), 3)
+        self.assertEqual(rows, 3 + 3 + 2)
+
+        _, _, rows, document = self.export()
+        self.assertEqual(rows, 0)
+        self.assertEqual(document['metadata']['total_records'], {'authors': 0, 'categories': 0, 'books': 0,
+                                                                 'deleted': 0})
+
+        Author.objects.filter(name='乙').update(email='changed@example.com')
+        deleted = Book.objects.get(title='B3')
+        deleted_pk = deleted.pk
+        deleted.delete()
+        since, until, rows, document = self.export()
+        self.assertGreater(until, since)
+        self.assertEqual([row['name'] for row in document['authors']], ['乙'])
+        self.assertEqual(document['books'], [])
+        self.assertEqual(
+            [(row['model_name'], row['object_id']) for row in document['deleted']], [('book', deleted_pk)])
+        self.assertEqual(rows, 2)
+
+    def test_prune_keeps_tombstones_not_yet_exported(self):
+        self.export()
+        Book.objects.get(title='B1').delete()
+        self.assertEqual(prune_deleted_records(), 0)
+        _, _, _, document = self.export()
+        self.assertEqual(len(document['deleted']), 1)
+        self.assertEqual(prune_deleted_records(), 1)
+
+    def test_failed_export_leaves_no_file_and_keeps_the_watermark(self):
+        self.export()
+        watermark = get_watermark('test')
+        Author.objects.filter(name='甲').update(email='x@example.com')
+        filename = os.path.join(self.directory.name, 'failed.json')
+        with mock.patch('myapp.delta_export.iter_json_document', side_effect=RuntimeError('disk full')):
+            with self.assertRaises(RuntimeError):
+                write_delta_export(filename, 'test')
+        self.assertEqual(os.listdir(self.directory.name), ['delta.json'])
+        self.assertEqual(get_watermark('test'), watermark)
+
+
+
+@override_settings(CACHES=TEST_CACHES)
+class IncrementalImportTests(GroupStatsAssertions, TransactionTestCase):
+    # 與實際使用相同，在交易外執行：每個區塊自己提交，中斷前已提交的區塊統計仍一致
+    FEED = {
+        'authors': [author('甲'), author('乙'), author('丙')],
+        'categories': [category('小說'), category('科普')],
+        'books': [
+            book('B1', '甲', '小說', '10'),
+            book('B2', '乙', '科普', '20'),
+            book('B3', '丙', '小說', '30'),
+            book('B4', '甲', '科普', '40'),
+            book('B5', '乙', '小說', '50'),
+            book('B2', '丙', '小說', '99'),    # 其他區塊中的同名書籍，保留第一筆
+            book('B6', '丙', '科普', '60'),
+        ],
+    }
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'feed.json')
+        self.write_feed(self.FEED)
+
+    def write_feed(self, feed):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(feed, f, ensure_ascii=False)
+
+    def importer(self, update_existing=False):
+        return IncrementalImporter(self.path, chunk_size=2, batch_size=1, update_existing=update_existing)
+
+    def assertImported(self):
+        books = dict(Book.objects.values_list('title', 'price'))
+        self.assertEqual(sorted(books), ['B1', 'B2', 'B3', 'B4', 'B5', 'B6'])
+        self.assertEqual(books['B2'], Decimal('20.00'))
+        self.assertEqual(Book.objects.get(title='B2').author.name, '乙')
+        self.assertGroupStatsConsistent()
+
+    def test_resumes_after_the_last_committed_chunk(self):
+        # 區塊：作者 2+1、分類 2、書籍 2+2+2+1；在第 5 個區塊（B3、B4）中斷
+        original = IncrementalImporter._import_chunk
+        calls = []
+
+        def failing_chunk(importer, section, records):
+            calls.append(section)
+            if len(calls) == 5:
+                raise RuntimeError('中斷')
+            return original(importer, section, records)
+
+        with mock.patch.object(IncrementalImporter, '_import_chunk', failing_chunk):
+            with self.assertRaises(RuntimeError):
+                self.importer().run()
+        self.assertEqual(sorted(Book.objects.values_list('title', flat=True)), ['B1', 'B2'])
+        self.assertGroupStatsConsistent()
+
+        stats = self.importer().run()
+        self.assertEqual(stats['resumed_chunks'], 4)
+        self.assertEqual(stats['chunks'], 3)
+        self.assertEqual(stats['duplicates'], 1)
+        self.assertImported()
+        self.assertIsNone(self.importer().run())
+
+    def test_unchanged_records_are_skipped_and_deleted_rows_reimported(self):
+        self.importer().run()
+        self.assertImported()
+
+        stats = self.importer().run(force=True)
+        self.assertEqual(stats['imported'], 0)
+        self.assertEqual(stats['unchanged'], 3 + 2 + 6)
+        self.assertEqual(stats['duplicates'], 1)
+
+        Book.objects.get(title='B4').delete()
+        stats = self.importer().run(force=True)
+        self.assertEqual(stats['imported'], 1)
+        self.assertImported()
+
+    def test_kept_rows_are_updated_by_a_later_update_existing_run(self):
+        self.importer().run()
+        feed = json.loads(json.dumps(self.FEED))
+        feed['books'][0]['price'] = '15.5'
+        feed['authors'][1]['email'] = 'changed@example.com'
+        self.write_feed(feed)
+
+        # 未指定 update_existing：既有資料保留原樣，指紋也不更新
+        stats = self.importer().run()
+        self.assertEqual(stats['imported'], 2)
+        self.assertEqual(Book.objects.get(title='B1').price, Decimal('10.00'))
+        self.assertEqual(Author.objects.get(name='乙').email, '乙@example.com')
+        stats = self.importer().run(force=True)
+        self.assertEqual(stats['imported'], 2)
+        self.assertEqual(stats['duplicates'], 1)
+
+        stats = self.importer(update_existing=True).run(force=True)
+        self.assertEqual(stats['imported'], 2)
+        self.assertEqual(Book.objects.get(title='B1').price, Decimal('15.50'))
+        self.assertEqual(Author.objects.get(name='乙').email, 'changed@example.com')
+        self.assertGroupStatsConsistent()
+
+        stats = self.importer(update_existing=True).run(force=True)
+        self.assertEqual(stats['imported'], 0)
+        self.assertEqual(stats['unchanged'], 3 + 2 + 6)
+
+
+
+@override_settings(CACHES=TEST_CACHES, API_TOKENS=['test-token'])
+class BookAPITests(TestCase):
+    auth = {'HTTP_AUTHORIZATION': 'Bearer test-token'}
+
+    def setUp(self):
+        BulkImporter().run(cleaned_chunks(
+            authors=[author(f'作者{i}') for i in range(5)],
+            categories=[category('小說')],
+            books=[book(f'B{i}', f'作者{i % 5}', '小說', f'{i}0') for i in range(7)],
+        ))
+
+    def collect(self, url):
+        """依 next 連結翻完所有頁面，回傳 (所有 id, 請求次數)"""
+        ids = []
+        requests = 0
+        while url:
+            response = self.client.get(url, **self.auth)
+            self.assertEqual(response.status_code, 200)
+            payload = response.json()
+            ids.extend(row['id'] for row in payload['results'])
+            url = payload['next']
+            requests += 1
+        return ids, requests
+
+    def test_keyset_pagination_visits_every_row_once(self):
+        ids, requests = self.collect(reverse('myapp:book-list') + '?limit=3')
+        self.assertEqual(ids, list(Book.objects.order_by('pk').values_list('pk', flat=True)))
+        self.assertEqual(requests, 3)
+
+        ids, _ = self.collect(reverse('myapp:author-list') + '?limit=2')
+        self.assertEqual(len(ids), 5)
+
+        cheap = list(Book.objects.filter(price__lte=30).order_by('pk').values_list('pk', flat=True))
+        ids, _ = self.collect(reverse('myapp:book-list') + '?limit=1&max_price=30')
+        self.assertEqual(ids, cheap)
+
+    def test_invalid_parameters(self):
+        for query in ('limit=0', 'after=-1', 'limit=abc', 'min_price=nan'):
+            with self.subTest(query=query):
+                response = self.client.get(reverse('myapp:book-list') + '?' + query, **self.auth)
+                self.assertEqual(response.status_code, 400)
+
+    def test_conditional_requests(self):
+        url = reverse('myapp:book-list')
+        etag = self.client.get(url, **self.auth)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag, **self.auth).status_code, 304)
+
+        Book.objects.filter(title='B1').update(price='1.00')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, **self.auth)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        # 刪除後清除刪除紀錄，資料版本也不會倒退回先前的 ETag
+        Book.objects.get(title='B6').delete()
+        deleted_etag = self.client.get(url, **self.auth)['ETag']
+        self.assertNotEqual(deleted_etag, etag)
+        DeletedRecord.objects.all().delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, **self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], deleted_etag)
+
+
+@override_settings(CACHES=TEST_CACHES, API_TOKENS=['test-token', 'other-token'])
+class APIAuthenticationTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+
+    def grant(self, *models):
+        self.staff.user_permissions.add(*Permission.objects.filter(
+            content_type__app_label='myapp', codename__in=[f'view_{model}' for model in models]))
+
+    def test_requires_token_or_login(self):
+        url = reverse('myapp:book-list')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('Bearer', response['WWW-Authenticate'])
+        self.assertIn('Authorization', response['Vary'])
+        for header in ('Bearer wrong', 'Bearer ', 'Basic test-token'):
+            with self.subTest(header=header):
+                self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION=header).status_code, 401)
+        for token in ('test-token', 'other-token'):
+            response = self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {token}')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('private', response['Cache-Control'])
+
+    def test_staff_needs_view_permissions(self):
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(reverse('myapp:author-list')).status_code, 403)
+        self.grant('author')
+        self.assertEqual(self.client.get(reverse('myapp:author-list')).status_code, 200)
+        # 書籍列表與匯出包含作者與分類名稱，需要三個資料表的檢視權限
+        self.assertEqual(self.client.get(reverse('myapp:book-list')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('myapp:export-json')).status_code, 403)
+        self.grant('book', 'category')
+        self.assertEqual(self.client.get(reverse('myapp:book-list')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('myapp:export-json')).status_code, 200)
+
+    def test_non_staff_user_is_rejected(self):
+        self.staff.is_staff = False
+        self.staff.save()
+        self.grant('author')
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(reverse('myapp:author-list')).status_code, 403)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class BulkLoadProfileTests(TestCase):
+    """大量匯入設定（synchronous=OFF）只在明確要求或來源檔案夠大時啟用"""
+
+    sample = os.path.join(settings.BASE_DIR, 'sample_data.json')
+
+    def run_import(self, *args, **options):
+        with mock.patch('import_data.bulk_load_mode') as bulk_load_mode, \
+                contextlib.redirect_stdout(io.StringIO()):
+            call_command('import_books', self.sample, *args, stdout=io.StringIO(), **options)
+        return bulk_load_mode.called
+
+    def test_importer_methods_default_to_normal_durability(self):
+        from import_data import DataImporter
+
+        importer = DataImporter()
+        with mock.patch('import_data.bulk_load_mode') as bulk_load_mode, \
+                contextlib.redirect_stdout(io.StringIO()):
+            importer.load_raw_data(self.sample)
+            importer.clean_data()
+            importer.import_to_django()
+            importer.stream_import(self.sample)
+            importer.incremental_import(self.sample)
+        bulk_load_mode.assert_not_called()
+
+    def test_command_switches_by_flag_or_source_size(self):
+        self.assertFalse(self.run_import())
+        self.assertTrue(self.run_import('--bulk-load'))
+        with override_settings(SQLITE_BULK_LOAD_MIN_BYTES=os.path.getsize(self.sample)):
+            self.assertTrue(self.run_import())
+            self.assertTrue(self.run_import('--mode', 'stream'))
+            self.assertFalse(self.run_import('--no-bulk-load'))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class StatsCacheInvalidationTests(GroupStatsAssertions, TestCase):
+    """各種寫入方式在交易提交後都需讓報告統計與筆數快取失效"""
+
+    def setUp(self):
+        caches[settings.STATS_CACHE_ALIAS].clear()
+        BulkImporter().run(cleaned_chunks(**FIRST_FEED))
+        self.warm()
+
+    def warm(self):
+        """讀取一次，讓快取保存目前的統計"""
+        return report_stats(), model_counts()
+
+    def assertFresh(self):
+        """快取內容需與重新查詢的結果相同"""
+        cached = self.warm()
+        caches[settings.STATS_CACHE_ALIAS].clear()
+        self.assertEqual(cached, self.warm())
+        self.assertGroupStatsConsistent()
+
+    def test_save_and_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Author.objects.create(name='丁', email='d@example.com')
+        self.assertEqual(model_counts()['authors'], 4)
+        self.assertFresh()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.get(title='B1').delete()
+        self.assertEqual(report_stats()['book_count'], 2)
+        self.assertEqual(model_counts()['books'], 2)
+        self.assertFresh()
+
+    def test_bulk_import(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            BulkImporter(update_existing=True).run(cleaned_chunks(**SECOND_FEED))
+        self.assertEqual(model_counts(), {'authors': 4, 'categories': 2, 'books': 4})
+        self.assertEqual(report_stats()['max_price'], Decimal('120.50'))
+        self.assertFresh()
+
+    def test_queryset_update(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.filter(title='B1').update(price='500.00')
+        self.assertEqual(report_stats()['max_price'], Decimal('500.00'))
+        self.assertEqual(report_stats()['max_price_title'], 'B1')
+        self.assertFresh()
+
+        # 換作者與分類時原本與新的群組都需重算
+        second_author = Author.objects.get(name='乙')
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.filter(title__in=['B1', 'B3']).update(author=second_author, is_available=False)
+        authors = {name: count for name, _, count in report_stats()['authors']}
+        self.assertEqual(authors, {'甲': 0, '乙': 3, '丙': 0})
+        self.assertFresh()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Author.objects.filter(name='乙').update(email='new@example.com')
+        self.assertIn(('乙', 'new@example.com', 3), report_stats()['authors'])
+        self.assertFresh()
+
+
+@override_settings(CACHES=TEST_CACHES)
+class GroupStatsSignalTests(GroupStatsAssertions, TestCase):
+    """逐筆 save() / delete() 經由 signal 維護作者與分類統計"""
+
+    def setUp(self):
+        caches[settings.STATS_CACHE_ALIAS].clear()
+        self.first_author = Author.objects.create(name='甲', email='a@example.com')
+        self.second_author = Author.objects.create(name='乙', email='b@example.com')
+        self.novel = Category.objects.create(name='小說')
+        self.science = Category.objects.create(name='科普')
+
+    def add_book(self, title, price, author=None, category=None, **fields):
+        return Book.objects.create(
+            title=title, author=author or self.first_author, category=category or self.novel,
+            publish_date='2020-01-01', price=Decimal(price), **fields)
+
+    def group_stats(self, stats_model, pk):
+        row = stats_model.objects.filter(pk=pk).first()
+        return row and tuple(getattr(row, field) for field in GROUP_STATS_FIELDS)
+
+    def test_create_and_modify(self):
+        self.add_book('B1', '10.00')
+        book = self.add_book('B2', '30.00', is_available=False)
+        self.assertEqual(self.group_stats(AuthorStats, self.first_author.pk),
+                         (2, 1, Decimal('10.00'), Decimal('30.00'), Decimal('40.00')))
+        self.assertGroupStatsConsistent()
+
+        book.price = Decimal('5.00')
+        book.is_available = True
+        book.save()
+        self.assertEqual(self.group_stats(CategoryStats, self.novel.pk),
+                         (2, 2, Decimal('5.00'), Decimal('10.00'), Decimal('15.00')))
+        self.assertGroupStatsConsistent()
+
+        # 未載入影響統計的欄位時從資料庫取得原本的值
+        partial = Book.objects.only('title').get(title='B2')
+        partial.price = Decimal('50.00')
+        partial.save()
+        self.assertEqual(self.group_stats(AuthorStats, self.first_author.pk)[3], Decimal('50.00'))
+        self.assertGroupStatsConsistent()
+
+    def test_reassignment_updates_old_and_new_groups(self):
+        self.add_book('B1', '10.00')
+        book = self.add_book('B2', '20.00')
+        book.author = self.second_author
+        book.category = self.science
+        book.save()
+        self.assertEqual(self.group_stats(AuthorStats, self.first_author.pk)[0], 1)
+        self.assertEqual(self.group_stats(AuthorStats, self.second_author.pk)[0], 1)
+        self.assertEqual(self.group_stats(CategoryStats, self.science.pk)[2], Decimal('20.00'))
+        self.assertGroupStatsConsistent()
+
+        # 群組的最後一本書移走時移除該群組的統計
+        book.author = self.first_author
+        book.save()
+        self.assertIsNone(self.group_stats(AuthorStats, self.second_author.pk))
+        self.assertGroupStatsConsistent()
+
+    def test_delete(self):
+        self.add_book('B1', '10.00')
+        self.add_book('B2', '20.00', category=self.science)
+        Book.objects.get(title='B1').delete()
+        self.assertEqual(self.group_stats(AuthorStats, self.first_author.pk),
+                         (1, 1, Decimal('20.00'), Decimal('20.00'), Decimal('20.00')))
+        self.assertIsNone(self.group_stats(CategoryStats, self.novel.pk))
+        self.assertGroupStatsConsistent()
+
+        # 連鎖刪除作者的所有書籍
+        self.first_author.delete()
+        self.assertFalse(AuthorStats.objects.exists())
+        self.assertFalse(CategoryStats.objects.exists())
+        self.assertEqual(DeletedRecord.objects.count(), 3)
+
+    def test_batch_exit_by_exception_only_invalidates_the_cache(self):
+        self.add_book('B1', '10.00')
+        self.assertEqual(model_counts()['authors'], 2)
+        with mock.patch('myapp.stats.refresh_group_stats') as refresh, \
+                self.captureOnCommitCallbacks(execute=True), self.assertRaises(RuntimeError):
+            with invalidation_batch():
+                Author.objects.create(name='丙', email='c@example.com')
+                books_changed({self.first_author.pk}, {self.novel.pk})
+                raise RuntimeError('中斷')
+        refresh.assert_not_called()
+        # 批次外的交易仍會提交新增的作者，筆數快取需失效
+        self.assertEqual(model_counts()['authors'], 3)
+
+        with mock.patch('myapp.stats.refresh_group_stats') as refresh:
+            with invalidation_batch():
+                books_changed({self.first_author.pk}, {self.novel.pk})
+                books_changed({self.second_author.pk}, {self.novel.pk})
+        refresh.assert_called_once_with({self.first_author.pk, self.second_author.pk}, {self.novel.pk}, 'default')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ShardedImportTests(GroupStatsAssertions, TestCase):
+    SHARDS = {
+        'part_1.json': {
+            'authors': [author('甲')],
+            'categories': [category('小說')],
+            'books': [
+                book('X', '乙', '小說', '10'),     # 作者在 part_3，延後
+                book('Y', '甲', '小說', '20'),
+            ],
+        },
+        'part_2.json': {
+            'books': [
+                book('X', '甲', '小說', '99'),     # 與延後的書籍同名，保留 part_1 的一筆
+                book('W', '丁', '小說', '30'),     # 找不到作者
+                book('W', '甲', '小說', '40'),     # 同名的第一筆找不到作者，保留這一筆
+            ],
+        },
+        'part_3.json': {
+            'authors': [author('乙')],
+            'books': [book('Z', '乙', '小說', '50')],
+        },
+    }
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        for name, feed in self.SHARDS.items():
+            with open(os.path.join(self.directory, name), 'w', encoding='utf-8') as f:
+                json.dump(feed, f, ensure_ascii=False)
+        with open(os.path.join(self.directory, 'part_0_broken.json'), 'w', encoding='utf-8') as f:
+            f.write('{"authors": [' + json.dumps(author('戊'), ensure_ascii=False) + ', {')
+
+    def run_import(self, workers):
+        paths = sorted(os.path.join(self.directory, name) for name in os.listdir(self.directory))
+        importer = ShardedImporter(paths, chunk_size=1, batch_size=1, workers=workers)
+        stats = importer.run()
+        return importer, stats
+
+    def test_keeps_the_first_resolvable_book_in_path_order(self):
+        snapshots = []
+        for workers in (1, 2):
+            with self.subTest(workers=workers), transaction.atomic():
+                importer, stats = self.run_import(workers)
+                books = {title: (author_name, str(price)) for title, author_name, price in
+                         Book.objects.values_list('title', 'author__name', 'price')}
+                self.assertEqual(books, {'X': ('乙', '10.00'), 'Y': ('甲', '20.00'), 'Z': ('乙', '50.00'),
+                                         'W': ('甲', '40.00')})
+                self.assertEqual([book.title for book in importer.engine.missing_books], ['W'])
+                self.assertEqual(stats['books']['rows'], 6)
+                self.assertEqual(stats['books']['duplicates'], 1)
+                self.assertEqual(stats['books']['skipped'], 1)
+                self.assertFalse(Author.objects.filter(name='戊').exists())
+                self.assertEqual([(os.path.basename(report.path), report.deferred, bool(report.error))
+                                  for report in importer.reports],
+                                 [('part_0_broken.json', 0, True), ('part_1.json', 1, False),
+                                  ('part_2.json', 3, False), ('part_3.json', 0, False)])
+                self.assertGroupStatsConsistent()
+                snapshots.append(table_snapshot())
+                transaction.set_rollback(True)
+        self.assertEqual(snapshots[0], snapshots[1])
+
+    def test_parse_shard_spools_chunks(self):
+        with tempfile.TemporaryDirectory() as spool_dir:
+            parsed = parse_shard(os.path.join(self.directory, 'part_2.json'), spool_dir, chunk_size=2)
+            chunks = list(iter_spooled_chunks(parsed.spool))
+            self.assertEqual([(section, [record.title for record in records]) for section, records in chunks],
+                             [('books', ['X', 'W']), ('books', ['W'])])
+            self.assertEqual(parsed.rows, {'authors': 0, 'categories': 0, 'books': 3})
+
+            broken = parse_shard(os.path.join(self.directory, 'part_0_broken.json'), spool_dir, chunk_size=1)
+            self.assertIsNone(broken.spool)
+            self.assertIsNotNone(broken.error)
+            self.assertEqual(os.listdir(spool_dir), [os.path.basename(parsed.spool)])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AsyncImportPipelineTests(GroupStatsAssertions, TransactionTestCase):
+    # 與實際使用相同，寫入階段在交易外執行，每個交易批次自己提交
+    FEED = {
+        'authors': [author('甲'), author('乙'), author('甲', email='dup@example.com')],
+        'categories': [category('小說'), category('科普')],
+        'books': [book(f'B{index}', '甲乙'[index % 2], ('小說', '科普')[index % 3 == 0], f'{index + 1}.50')
+                  for index in range(40)] + [book('B3', '乙', '小說', '999'), book('B99', '不存在', '小說')],
+    }
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'feed.json')
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.FEED, f, ensure_ascii=False)
+
+    def pipeline(self, **options):
+        return AsyncImportPipeline(self.path, chunk_size=2, batch_size=2, transaction_batch_size=2,
+                                   queue_size=1, **options)
+
+    def assertNoOpenTransaction(self):
+        self.assertFalse(connection.in_atomic_block)
+        # 資料庫沒有被鎖住，其他寫入可以提交
+        Category.objects.create(name='之後新增')
+        Category.objects.filter(name='之後新增').delete()
+
+    def test_matches_bulk_importer(self):
+        expected_stats = BulkImporter().run(cleaned_chunks(**self.FEED))
+        expected = table_snapshot()
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                Book.objects.all().delete()
+                Author.objects.all().delete()
+                Category.objects.all().delete()
+                missing = []
+                pipeline = self.pipeline(workers=workers, on_missing_book=missing.append)
+                stats = async_to_sync(pipeline.run)()
+                self.assertEqual(table_snapshot(), expected)
+                for name, counts in stats.items():
+                    self.assertEqual({key: value for key, value in counts.items() if key != 'seconds'},
+                                     {key: value for key, value in expected_stats[name].items() if key != 'seconds'})
+                self.assertEqual([record.title for record in missing], ['B99'])
+                self.assertEqual(pipeline.loaded, {'authors': 3, 'categories': 2, 'books': 42})
+                self.assertGroupStatsConsistent()
+                self.assertNoOpenTransaction()
+
+    def test_reader_error_stops_the_pipeline(self):
+        original = iter_raw_chunks
+
+        def failing_chunks(*args, **kwargs):
+            for index, chunk in enumerate(original(*args, **kwargs)):
+                if index == 4:
+                    # 在讀取執行緒中等寫入階段提交前幾塊後才失敗
+                    deadline = time.monotonic() + 5
+                    while pipeline.chunks_written < 2 and time.monotonic() < deadline:
+                        time.sleep(0.001)
+                    raise OSError('讀取失敗')
+                yield chunk
+
+        pipeline = self.pipeline()
+        with mock.patch('myapp.async_pipeline.iter_raw_chunks', failing_chunks):
+            with self.assertRaisesMessage(OSError, '讀取失敗'):
+                async_to_sync(pipeline.run)()
+        # 區塊：作者 2+1、分類 2、書籍 2+…；第 5 塊讀取失敗，之前讀取的區塊可能已寫入，書籍都不會寫入
+        self.assertIn(pipeline.chunks_written, (2, 3, 4))
+        self.assertEqual(Author.objects.count(), 2)
+        self.assertEqual(Category.objects.count(), 2 if pipeline.chunks_written >= 3 else 0)
+        self.assertFalse(Book.objects.exists())
+        self.assertGroupStatsConsistent()
+        self.assertNoOpenTransaction()
+
+    def test_cancellation_keeps_committed_chunks(self):
+        pipeline = self.pipeline(bulk_load=True)
+
+        async def cancel_mid_stream():
+            task = asyncio.ensure_future(pipeline.run())
+            while pipeline.chunks_written < 5:
+                await asyncio.sleep(0.001)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        async_to_sync(cancel_mid_stream)()
+        self.assertGreaterEqual(pipeline.chunks_written, 5)
+        self.assertLess(pipeline.chunks_written, 24)
+        self.assertLess(Book.objects.count(), 40)
+        self.assertGroupStatsConsistent()
+        self.assertNoOpenTransaction()
+        # 大量匯入設定已還原
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertNotEqual(cursor.fetchone()[0], 0)
+
+
+EXPORT_FEED = {
+    'authors': [author('甲'), author('乙 "引號"', birth_date=None), author('Zoë')],
+    'categories': [category('小說', '逗號, "引號"\n換行'), category('科普')],
+    'books': [
+        book('B1', '甲', '小說', '120.50'),
+        book('B2', '乙 "引號"', '科普', '0.10'),
+        book('B3', 'Zoë', '小說', '35'),
+        book('B4, 逗號', '甲', '科普', '9999.99'),
+    ],
+}
+
+
+class ExportFixtureMixin:
+    """匯出測試的共用資料與暫存目錄"""
+
+    export_time = datetime(2024, 6, 1, 12, 30, 45)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        caches[settings.STATS_CACHE_ALIAS].clear()
+        BulkImporter().run(cleaned_chunks(**EXPORT_FEED))
+        Book.objects.filter(title='B3').update(is_available=False)
+        self.assertEqual(model_counts(), {'authors': 3, 'categories': 2, 'books': 4})
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def read_bytes(self, name):
+        with open(self.path(name), 'rb') as f:
+            return f.read()
+
+
+def baseline_json(export_time):
+    """原本以 json.dump 一次寫出的匯出內容"""
+    export_data = {
+        'metadata': {
+            'export_time': export_time.isoformat(),
+            'total_records': {name: model.objects.count() for name, model, _ in JSON_TABLES},
+        },
+        **{name: list(model.objects.order_by('pk').values(*fields)) for name, model, fields in JSON_TABLES},
+    }
+    buffer = io.StringIO()
+    json.dump(export_data, buffer, ensure_ascii=False, indent=2, default=str)
+    return buffer.getvalue().encode('utf-8')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class JSONExportTests(ExportFixtureMixin, TestCase):
+    def test_matches_json_dump(self):
+        for label, prepare in (('全部資料', lambda: None), ('沒有書籍', lambda: Book.objects.all().delete())):
+            with self.subTest(label):
+                prepare()
+                expected = baseline_json(self.export_time)
+                for chunk_size in (1, 3, 2000):
+                    write_json_export(self.path('export.json'), self.export_time, chunk_size)
+                    self.assertEqual(self.read_bytes('export.json'), expected)
+
+                # 單次掃描匯出的 JSON 輸出端與獨立匯出相同
+                base = self.path('pipeline')
+                with contextlib.redirect_stdout(io.StringIO()):
+                    ExportPipeline(build_export_sinks(['json'], base, self.export_time), chunk_size=2).run()
+                self.assertEqual(self.read_bytes('pipeline.json'), expected)
+
+    def test_compact_output_has_the_same_content(self):
+        write_json_export(self.path('compact.json'), self.export_time, compact=True)
+        compact = self.read_bytes('compact.json')
+        self.assertNotIn(b'\n', compact)
+        self.assertEqual(json.loads(compact), json.loads(baseline_json(self.export_time)))
+
+
+def baseline_csv(path, table):
+    """原本以模型實例逐筆寫出的CSV（import_data 與 export_manager 的作者欄位不同）"""
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(table.headers)
+        if table.model is Author:
+            for item in Author.objects.order_by('pk'):
+                row = [item.id, item.name, item.email]
+                if table is AUTHOR_CSV_WITH_CREATED:
+                    row += [item.birth_date, item.pk]
+                else:
+                    row.append(item.birth_date.strftime('%Y-%m-%d') if item.birth_date else '')
+                writer.writerow(row)
+        elif table.model is Category:
+            for item in Category.objects.order_by('pk'):
+                writer.writerow([item.id, item.name, item.description])
+        else:
+            for item in Book.objects.select_related('author', 'category').order_by('pk'):
+                writer.writerow([
+                    item.id, item.title, item.author.id, item.author.name, item.category.id, item.category.name,
+                    item.publish_date.strftime('%Y-%m-%d'), float(item.price), '是' if item.is_available else '否',
+                ])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CSVExportTests(ExportFixtureMixin, TestCase):
+    def test_matches_model_based_writer(self):
+        for tables in ((AUTHOR_CSV, CATEGORY_CSV, BOOK_CSV), (AUTHOR_CSV_WITH_CREATED, CATEGORY_CSV, BOOK_CSV)):
+            with self.subTest(authors=tables[0].headers):
+                for table in tables:
+                    baseline_csv(self.path(f'baseline_{table.suffix}.csv'), table)
+                self.assertEqual(write_csv_exports(self.path('export'), tables, chunk_size=1), 3 + 2 + 4)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    ExportPipeline(build_export_sinks(['csv'], self.path('pipeline'), self.export_time,
+                                                      csv_tables=tables), chunk_size=3).run()
+                for table in tables:
+                    expected = self.read_bytes(f'baseline_{table.suffix}.csv')
+                    self.assertEqual(self.read_bytes(f'export_{table.suffix}.csv'), expected, table.suffix)
+                    self.assertEqual(self.read_bytes(f'pipeline_{table.suffix}.csv'), expected, table.suffix)
+                    self.assertEqual(''.join(iter_csv_text(table, chunk_size=2)).encode('utf-8'), expected)
+
+
+def baseline_report(base_filename, export_time):
+    """原本逐一查詢每位作者與分類的報告內容"""
+    authors = Author.objects.order_by('pk')
+    categories = Category.objects.order_by('pk')
+    books = Book.objects.all()
+    report = f"""
+資料匯出詳細報告
+================
+
+基本資訊:
+---------
+匯出時間: {export_time.strftime('%Y-%m-%d %H:%M:%S')}
+匯出檔案基礎名稱: {base_filename}
+
+資料統計:
+---------
+作者數量: {authors.count()}
+分類數量: {categories.count()}  
+書籍數量: {books.count()}
+總記錄數: {authors.count() + categories.count() + books.count()}
+
+作者列表:
+---------
+"""
+    for item in authors:
+        report += f"- {item.name} ({item.email}) - 著作: {Book.objects.filter(author=item).count()}本\n"
+    report += """
+分類列表:
+---------
+"""
+    for item in categories:
+        report += f"- {item.name} - 書籍: {Book.objects.filter(category=item).count()}本\n"
+        if item.description:
+            report += f"  描述: {item.description}\n"
+    report += """
+書籍價格統計:
+------------
+"""
+    if books.exists():
+        highest = books.order_by('-price').first()
+        lowest = books.order_by('price').first()
+        report += f"""最高價格: {highest.price} ({highest.title})
+最低價格: {lowest.price} ({lowest.title})
+平均價格: {books.aggregate(avg_price=Avg('price'))['avg_price']:.2f}
+"""
+    else:
+        report += "無書籍資料\n"
+    return report
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ExportReportTests(ExportFixtureMixin, TestCase):
+    def render(self, stats):
+        return render_report(stats, 'export', self.export_time)
+
+    def test_matches_per_row_queries(self):
+        for label, prepare in (('全部資料', lambda: None), ('沒有書籍', lambda: Book.objects.all().delete())):
+            with self.subTest(label):
+                prepare()
+                expected = baseline_report('export', self.export_time)
+                with self.assertNumQueries(5 if Book.objects.exists() else 3):
+                    stats = collect_report_stats()
+                report = self.render(stats)
+                # 匯出檔案清單與注意事項之前的內容需相同
+                self.assertEqual(report[:len(expected)], expected)
+                self.assertTrue(report[len(expected):].startswith('\n匯出檔案:'))
+
+                with contextlib.redirect_stdout(io.StringIO()):
+                    ExportPipeline(build_export_sinks(['report'], self.path('export'), self.export_time),
+                                   chunk_size=1).run()
+                with open(self.path('export_report.txt'), encoding='utf-8') as f:
+                    self.assertEqual(f.read(), render_report(stats, self.path('export'), self.export_time))
+
+    def test_query_count_does_not_grow_with_rows(self):
+        Author.objects.bulk_create([Author(name=f'作者{index}', email=f'{index}@example.com') for index in range(30)])
+        with self.assertNumQueries(5):
+            stats = collect_report_stats()
+        self.assertEqual(stats['author_count'], 33)
+        with self.assertNumQueries(3):
+            stats = collect_report_stats(with_titles=False)
+        self.assertIsNone(stats['max_price_title'])
+        self.assertIn('最高價格: 9999.99\n', self.render(stats))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ExportPipelineTests(ExportFixtureMixin, TestCase):
+    def test_failing_sink_does_not_stop_the_others(self):
+        original = CSVSink.write_rows
+
+        def failing_write_rows(sink, table, rows):
+            if table == 'books':
+                raise OSError('磁碟已滿')
+            return original(sink, table, rows)
+
+        base = self.path('export')
+        pipeline = ExportPipeline(build_export_sinks(['json', 'csv', 'report'], base, self.export_time), chunk_size=1)
+        output = io.StringIO()
+        with mock.patch.object(CSVSink, 'write_rows', failing_write_rows), contextlib.redirect_stdout(output):
+            results = pipeline.run()
+        self.assertEqual(results, {'json': True, 'csv': False, 'report': True})
+        self.assertIn('❌ CSV匯出失敗: 磁碟已滿', output.getvalue())
+        self.assertEqual(self.read_bytes('export.json'), baseline_json(self.export_time))
+        with open(self.path('export_report.txt'), encoding='utf-8') as f:
+            self.assertEqual(f.read(), render_report(collect_report_stats(), base, self.export_time))
+        # 所有資料表只掃描一次
+        self.assertEqual(pipeline.rows_scanned, 3 + 2 + 4)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ConcurrentExportTests(ExportFixtureMixin, TransactionTestCase):
+    # 各匯出工作使用自己的連線，需讀取已提交的資料
+    TABLES = (AUTHOR_CSV_WITH_CREATED, CATEGORY_CSV, BOOK_CSV)
+
+    def run_export(self, base, executor='thread'):
+        tasks = build_export_tasks(['json', 'csv', 'report'], self.path(base), self.TABLES)
+        return run_concurrent_export(tasks, self.export_time, executor=executor, chunk_size=2, with_titles=False)
+
+    def test_thread_and_process_executors_match_the_serial_export(self):
+        for table in self.TABLES:
+            baseline_csv(self.path(f'baseline_{table.suffix}.csv'), table)
+        expected_json = baseline_json(self.export_time)
+        expected_stats = collect_report_stats(with_titles=False)
+        for executor in ('thread', 'process'):
+            with self.subTest(executor=executor):
+                results = self.run_export(executor, executor)
+                self.assertEqual([(result.task.format, result.ok, result.error) for result in results],
+                                 [('json', True, None)] + [('csv', True, None)] * 3 + [('report', True, None)])
+                self.assertEqual([result.value for result in results[:4]], [9, 3, 2, 4])
+                self.assertEqual(results[4].value, expected_stats)
+                self.assertEqual(self.read_bytes(f'{executor}.json'), expected_json)
+                for table in self.TABLES:
+                    self.assertEqual(self.read_bytes(f'{executor}_{table.suffix}.csv'),
+                                     self.read_bytes(f'baseline_{table.suffix}.csv'))
+        self.assertFalse([name for name in os.listdir(self.directory) if name.endswith('.tmp')])
+
+    def test_failed_task_keeps_the_previous_file(self):
+        with open(self.path('export_books.csv'), 'w', encoding='utf-8') as f:
+            f.write('上一次的匯出')
+        original = write_csv_table
+
+        def failing_write(filename, table, chunk_size):
+            if table is BOOK_CSV:
+                with open(filename, 'w', encoding='utf-8') as f:
+                    f.write('寫到一半')
+                raise OSError('磁碟已滿')
+            return original(filename, table, chunk_size)
+
+        with mock.patch('myapp.concurrent_export.write_csv_table', failing_write):
+            results = self.run_export('export')
+        self.assertEqual([(result.task.target, result.ok) for result in results if not result.ok],
+                         [(self.path('export_books.csv'), False)])
+        self.assertEqual(results[3].error, '磁碟已滿')
+        with open(self.path('export_books.csv'), encoding='utf-8') as f:
+            self.assertEqual(f.read(), '上一次的匯出')
+        self.assertEqual(self.read_bytes('export.json'), baseline_json(self.export_time))
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ['export.json', 'export_authors.csv', 'export_books.csv', 'export_categories.csv'])
+
+    def test_atomic_output(self):
+        target = self.path('report.txt')
+        with self.assertRaises(RuntimeError), atomic_output(target) as temp_path:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write('不完整')
+            raise RuntimeError('中斷')
+        self.assertEqual(os.listdir(self.directory), [])
+
+        with atomic_output(target) as temp_path:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write('完成')
+            self.assertFalse(os.path.exists(target))
+        with open(target, encoding='utf-8') as f:
+            self.assertEqual(f.read(), '完成')
+        self.assertEqual(os.listdir(self.directory), ['report.txt'])
+
+
+class ParallelCleaningTests(SimpleTestCase):
+    def raw_chunks(self):
+        """每塊 3 筆、含錯誤資料的原始區塊（錯誤資料的位置分散在不同區塊）"""
+        authors = [RawAuthor(f' 作者{index} ', f'A{index}@Example.com', '1980-01-01') for index in range(7)]
+        authors[4] = RawAuthor('錯誤', None, None)
+        books = [RawBook(f'書{index}', '作者1', '小說', f'2020-01-{index % 28 + 1:02d}', f'{index}.5')
+                 for index in range(20)]
+        books[2] = books[2]._replace(publish_date='2020-02-30')
+        books[11] = books[11]._replace(price='一百')
+        books[19] = books[19]._replace(price='123456')
+        chunks = [('categories', [RawCategory(' 小說 ', ' 說明 ')])]
+        for section, items in (('authors', authors), ('books', books)):
+            chunks.extend((section, items[start:start + 3]) for start in range(0, len(items), 3))
+        return chunks
+
+    def test_workers_keep_input_order_and_reject_positions(self):
+        expected = list(iter_clean_chunks(self.raw_chunks(), workers=1))
+        self.assertEqual([index for _, _, rejects in expected for index, _, _ in rejects], [5, 10, 19, 27])
+        self.assertEqual(expected[1][1][0].name, '作者0')
+        self.assertEqual(expected[1][1][0].email, 'a0@example.com')
+        for workers, max_pending in ((2, 1), (2, None), (3, 20)):
+            with self.subTest(workers=workers, max_pending=max_pending):
+                self.assertEqual(
+                    list(iter_clean_chunks(self.raw_chunks(), workers=workers, max_pending=max_pending)), expected)
+
+    def test_stopping_early_cancels_pending_chunks(self):
+        chunks = iter_clean_chunks(iter(self.raw_chunks()), workers=2, max_pending=2)
+        first = next(chunks)
+        chunks.close()
+        self.assertEqual(first[0], 'categories')
+
+
+class ParserTests(SimpleTestCase):
+    def setUp(self):
+        clear_parse_caches()
+        self.addCleanup(clear_parse_caches)
+
+    def test_dates_match_strptime(self):
+        for value in ('2023-01-05', '2024-02-29', '2023-1-5', '0999-12-31', '２０２３-０１-０５',
+                      '2023-02-29', '2023-13-01', '2023-00-10', '2023/01/05', '20230105', '2023-01-05 ', ''):
+            with self.subTest(value=value):
+                try:
+                    expected = datetime.strptime(value, '%Y-%m-%d').date()
+                except ValueError:
+                    with self.assertRaises(ValueError):
+                        parse_iso_date(value)
+                else:
+                    self.assertEqual(parse_iso_date(value), expected)
+
+    def test_prices_are_quantized_decimals(self):
+        for value, expected in (('120.5', '120.50'), (' 7 ', '7.00'), ('12.345', '12.35'), ('12.344', '12.34'),
+                                ('0.005', '0.01'), ('-0.005', '-0.01'), ('9999.994', '9999.99'), ('1e2', '100.00'),
+                                (0.1, '0.10'), (35, '35.00'), (Decimal('2.675'), '2.68')):
+            with self.subTest(value=value):
+                price = parse_price(value)
+                self.assertEqual(price, Decimal(expected))
+                self.assertEqual(price.as_tuple().exponent, -2)
+
+    def test_rejects_invalid_and_out_of_range_prices(self):
+        for value in ('abc', '', '1,000', 'NaN', 'Infinity', '10000', '9999.995', '-10000', float('inf')):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                parse_price(value)
+
+    def test_results_are_memoised(self):
+        parse_price('12.50')
+        parse_price('12.50')
+        parse_iso_date('2023-01-05')
+        self.assertEqual(parse_price.cache_info().hits, 1)
+        self.assertEqual(parse_iso_date.cache_info().misses, 1)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AdminTests(TestCase):
+    def setUp(self):
+        BulkImporter().run(cleaned_chunks(**FIRST_FEED))
+        Book.objects.filter(title='B2').update(is_available=False)
+        self.book_admin = admin.site._registry[Book]
+        self.superuser = User.objects.create_superuser('admin', 'admin@example.com', None)
+
+    def estimate(self, **params):
+        return self.book_admin.estimate_count(RequestFactory().get('/', params))
+
+    def test_paginator_uses_the_estimate_or_a_capped_count(self):
+        books = Book.objects.order_by('pk')
+        paginator = EstimatedCountPaginator(books, 2, count_estimate=7)
+        with self.assertNumQueries(0):
+            self.assertEqual(paginator.count, 7)
+            self.assertEqual(paginator.num_pages, 4)
+
+        paginator = EstimatedCountPaginator(books, 2)
+        self.assertEqual(paginator.count_limit, 10000)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(paginator.count, 3)
+        self.assertEqual(len(queries), 1)
+        self.assertIn('LIMIT 10000', queries[0]['sql'])
+
+        with mock.patch.object(EstimatedCountPaginator, 'count_limit', 2):
+            self.assertEqual(EstimatedCountPaginator(books, 2).count, 2)
+
+    def test_estimate_count_from_group_stats(self):
+        first_author = Author.objects.get(name='甲')
+        fresh_author = Author.objects.create(name='沒有書', email='none@example.com')
+        novel = Category.objects.get(name='小說')
+        cases = (
+            ({}, Book.objects.all()),
+            ({'is_available__exact': '0'}, Book.objects.filter(is_available=False)),
+            ({'author__id__exact': first_author.pk}, Book.objects.filter(author=first_author)),
+            ({'author__id__exact': fresh_author.pk}, Book.objects.none()),
+            ({'category__id__exact': novel.pk, 'is_available__exact': '1', 'o': '1', 'p': '0'},
+             Book.objects.filter(category=novel, is_available=True)),
+        )
+        for params, queryset in cases:
+            with self.subTest(params=params):
+                expected = queryset.count()
+                with self.assertNumQueries(1):
+                    self.assertEqual(self.estimate(**params), expected)
+        for params in ({'q': 'B'}, {'author__id__exact': 'x'}, {'price': '1'},
+                       {'author__id__exact': first_author.pk, 'category__id__exact': novel.pk}):
+            with self.subTest(params=params):
+                self.assertIsNone(self.estimate(**params))
+
+    def test_book_changelist_does_not_count_the_books_table(self):
+        self.client.force_login(self.superuser)
+        url = reverse('admin:myapp_book_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'category__id__exact': Category.objects.get(name='小說').pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 2)
+        self.assertFalse([query['sql'] for query in queries
+                          if 'COUNT(' in query['sql'] and '"myapp_book"' in query['sql']])
+
+    def test_prefix_search_with_cjk_terms(self):
+        for name in ('張三', '張三豐', '張三\U0002000b', '張四', '李張三'):
+            Author.objects.create(name=name, email=f'{len(name)}-{ord(name[-1])}@example.com')
+        author_admin = admin.site._registry[Author]
+        request = RequestFactory().get('/')
+        for term, expected in (('張三', ['張三', '張三豐', '張三\U0002000b']), (' 張 ', ['張三', '張三豐', '張三\U0002000b', '張四']),
+                               ('三', []), ('', None)):
+            with self.subTest(term=term):
+                queryset, may_have_duplicates = author_admin.get_search_results(
+                    request, Author.objects.order_by('name'), term)
+                self.assertFalse(may_have_duplicates)
+                if expected is None:
+                    self.assertEqual(queryset.count(), Author.objects.count())
+                    continue
+                self.assertEqual(sorted(queryset.values_list('name', flat=True)), sorted(expected))
+                sql = str(queryset.query)
+                self.assertIn('>=', sql)
+                self.assertNotIn('LIKE', sql)
+
+        self.client.force_login(self.superuser)
+        response = self.client.get(reverse('admin:myapp_author_changelist'), {'q': '張三'})
+        self.assertEqual(response.context['cl'].result_count, 3)
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        self.now = 0.0
+        patcher = mock.patch('myapp.instrumentation.time.perf_counter', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_nested_stage_time_is_excluded_from_the_parent(self):
+        instrumentation = Instrumentation('test')
+        with instrumentation.stage('outer', rows=5):
+            self.now += 1
+            with instrumentation.stage('inner') as metrics:
+                self.now += 2
+                metrics.add_rows(3)
+            self.now += 0.5
+            with instrumentation.stage('inner'):
+                self.now += 1
+        stages = instrumentation.summary()['stages']
+        self.assertEqual((stages['outer']['seconds'], stages['outer']['calls'], stages['outer']['rows']), (1.5, 1, 5))
+        self.assertEqual((stages['inner']['seconds'], stages['inner']['calls'], stages['inner']['rows']), (3.0, 2, 3))
+        self.assertEqual(stages['inner']['rows_per_sec'], 1.0)
+        self.assertEqual(instrumentation.summary()['totals']['seconds'], 4.5)
+
+    def test_queries_are_counted_in_the_innermost_stage(self):
+        instrumentation = Instrumentation('test')
+        Author.objects.count()
+        with instrumentation.stage('outer'):
+            Author.objects.count()
+            with instrumentation.stage('inner'):
+                Book.objects.count()
+                Category.objects.count()
+            Author.objects.exists()
+        Author.objects.count()
+        stages = instrumentation.summary()['stages']
+        self.assertEqual((stages['outer']['queries'], stages['inner']['queries']), (2, 2))
+        # 最外層結束後移除 execute_wrapper
+        self.assertEqual(connection.execute_wrappers, [])
+
+    def test_iter_stage_record_and_emit(self):
+        instrumentation = Instrumentation('test')
+        chunks = instrumentation.iter_stage('load', iter([[1, 2], [3]]), rows=len)
+        for _ in chunks:
+            self.now += 10  # 使用資料的時間不計入 load
+        instrumentation.record('clean', 0.25, rows=3)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'metrics.jsonl')
+            instrumentation.emit(path)
+            instrumentation.emit(path)
+            with open(path, encoding='utf-8') as f:
+                lines = [json.loads(line) for line in f]
+        self.assertEqual(len(lines), 2)
+        stages = lines[0]['stages']
+        self.assertEqual((stages['load']['calls'], stages['load']['rows'], stages['load']['seconds']), (3, 3, 0))
+        self.assertEqual((stages['clean']['calls'], stages['clean']['seconds']), (1, 0.25))
+
+    def test_progress_reporter(self):
+        progress = ProgressReporter('匯入', interval=5)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.now = 1
+            progress.update(100, position=10, total=100)
+            self.now = 10
+            progress.update(900, position=25, total=100)
+            progress.update(1)
+        self.assertEqual(output.getvalue(), '   ⏳ 匯入: 1,000 筆 (100 筆/秒，25%，預計剩餘 30秒)\n')
+        self.assertEqual((format_seconds(59.6), format_seconds(125), format_seconds(3723)), ('1分0秒', '2分5秒', '1時2分3秒'))
+
+
+class CappedLogTests(SimpleTestCase):
+    def test_prints_only_the_first_messages(self):
+        log = CappedLog(limit=2)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            for index in range(5):
+                log(f'警告 {index}')
+            log.flush('錯誤資料')
+            log('之後的訊息')
+            log.flush('錯誤資料')
+        self.assertEqual(output.getvalue().splitlines(), [
+            '警告 0', '警告 1', '⚠️ 另有 3 筆錯誤資料未顯示（共 5 筆）', '之後的訊息',
+        ])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ManagementCommandTests(GroupStatsAssertions, TransactionTestCase):
+    # pipeline 模式在其他執行緒中寫入，需在交易外執行
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.feed_dir = os.path.join(self.directory, 'feed')
+        os.mkdir(self.feed_dir)
+        self.feed = os.path.join(self.feed_dir, 'feed.json')
+        with open(self.feed, 'w', encoding='utf-8') as f:
+            json.dump(FIRST_FEED, f, ensure_ascii=False)
+        self.metrics = os.path.join(self.directory, 'metrics.jsonl')
+
+    def call(self, name, *args):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(io.StringIO()):
+            call_command(name, *args, '--metrics-file', self.metrics, stdout=stdout)
+        return stdout.getvalue()
+
+    def reset(self):
+        for model in (Author, Category, ImportCheckpoint, ImportFingerprint):
+            model.objects.all().delete()
+
+    def test_import_books_modes(self):
+        for mode in IMPORT_MODES:
+            with self.subTest(mode=mode):
+                path = self.feed_dir if mode == 'sharded' else self.feed
+                output = self.call('import_books', path, '--mode', mode, '--chunk-size', '2', '--batch-size', '2')
+                self.assertIn(f'匯入完成: {path} (mode={mode})', output)
+                self.assertEqual(sorted(Book.objects.values_list('title', flat=True)), ['B1', 'B2', 'B3'])
+                self.assertEqual(Book.objects.get(title='B1').price, Decimal('120.50'))
+                self.assertEqual(model_counts(), {'authors': 3, 'categories': 2, 'books': 3})
+                self.assertGroupStatsConsistent()
+                self.reset()
+        with open(self.metrics, encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), len(IMPORT_MODES))
+
+    def test_import_books_incremental_skips_a_completed_file(self):
+        self.call('import_books', self.feed, '--mode', 'incremental')
+        self.assertIn('已完整匯入過', self.call('import_books', self.feed, '--mode', 'incremental'))
+        self.assertIn('匯入完成', self.call('import_books', self.feed, '--mode', 'incremental', '--force'))
+        self.assertEqual(Book.objects.count(), 3)
+
+    def test_import_books_rejects_a_missing_file(self):
+        with self.assertRaisesMessage(CommandError, '找不到JSON檔案'):
+            self.call('import_books', os.path.join(self.directory, 'missing.json'))
+        with self.assertRaisesMessage(CommandError, '找不到任何JSON檔案'):
+            self.call('import_books', os.path.join(self.directory, 'missing', '*.json'), '--mode', 'sharded')
+
+    def test_export_books_writes_every_format(self):
+        self.call('import_books', self.feed)
+        output_dir = os.path.join(self.directory, 'exports')
+        for workers in ('1', '3'):
+            with self.subTest(workers=workers):
+                base_name = f'full_{workers}'
+                output = self.call('export_books', '--output-dir', output_dir, '--base-name', base_name,
+                                   '--workers', workers)
+                self.assertIn('匯出完成', output)
+                with open(os.path.join(output_dir, f'{base_name}.json'), encoding='utf-8') as f:
+                    self.assertEqual(len(json.load(f)['books']), 3)
+                for suffix in ('_authors.csv', '_categories.csv', '_books.csv', '_report.txt'):
+                    self.assertTrue(os.path.exists(os.path.join(output_dir, base_name + suffix)), suffix)
+        with self.assertRaisesMessage(CommandError, '不支援的匯出格式: xml'):
+            self.call('export_books', '--formats', 'json,xml')
+
+    def test_export_books_delta_advances_the_watermark(self):
+        self.call('import_books', self.feed)
+
+        def export_delta(base_name):
+            self.call('export_books', '--delta', '--watermark', 'nightly',
+                      '--output-dir', self.directory, '--base-name', base_name)
+            with open(os.path.join(self.directory, f'{base_name}_delta.json'), encoding='utf-8') as f:
+                return json.load(f)
+
+        document = export_delta('first')
+        self.assertEqual(len(document['books']), 3)
+        self.assertEqual(get_watermark('nightly'), ChangeSequence.current())
+
+        Author.objects.filter(name='乙').update(email='changed@example.com')
+        document = export_delta('second')
+        self.assertEqual([row['name'] for row in document['authors']], ['乙'])
+        self.assertEqual(document['books'], [])
+        self.assertEqual(get_watermark('nightly'), ChangeSequence.current())
+
+        document = export_delta('third')
+        self.assertEqual(document['authors'], [])
+        self.assertIsNone(get_watermark('test'))
+
+    def test_rebuild_book_stats(self):
+        self.call('import_books', self.feed)
+        AuthorStats.objects.all().delete()
+        CategoryStats.objects.update(book_count=0)
+        stdout = io.StringIO()
+        call_command('rebuild_book_stats', stdout=stdout)
+        self.assertIn('書籍統計重建完成: 3 位作者, 2 個分類', stdout.getvalue())
+        self.assertGroupStatsConsistent()
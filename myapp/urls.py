@@ -0,0 +1,14 @@
+# myapp/urls.py
+from django.urls import path
+
+from . import views
+
+app_name = 'myapp'
+
+urlpatterns = [
+    path('authors/', views.author_list, name='author-list'),
+    path('categories/', views.category_list, name='category-list'),
+    path('books/', views.book_list, name='book-list'),
+    path('export/data.json', views.export_json, name='export-json'),
+    path('export/<str:table>.csv', views.export_csv, name='export-csv'),
+]
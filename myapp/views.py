@@ -1,3 +1,260 @@
-from django.shortcuts import render
+# myapp/views.py
+"""唯讀 JSON API
 
-# Create your views here.
+列表以主鍵做 keyset 分頁（?after=<上一頁最後一筆的 id>&limit=<筆數>），
+不使用 OFFSET，翻到越後面的頁面也只需一次索引查詢。
+回應帶有依變動序號產生的 ETag，資料未變動時條件式請求（If-None-Match）直接回傳 304。
+另提供 CSV 與完整匯出JSON的串流下載（/api/export/...）。
+
+所有端點都需要認證：settings.API_TOKENS 中的權杖（Authorization: Bearer <權杖>），
+或具備相關模型檢視權限的已登入工作人員。
+"""
+import hashlib
+import hmac
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from functools import wraps
+
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404, JsonResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition, require_safe
+
+from .downloads import streaming_download
+from .exporting import CSV_TABLES, iter_csv_text, iter_json_export
+from .models import Author, Category, Book, ChangeSequence
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidQuery(ValueError):
+    """查詢參數格式錯誤"""
+
+
+def _bool_param(request, name):
+    return request.GET.get(name, '').lower() in ('1', 'true', 'yes')
+
+
+def _int_param(request, name, default=None, minimum=0):
+    value = request.GET.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise InvalidQuery(f"{name} 必須是整數")
+    if number < minimum:
+        raise InvalidQuery(f"{name} 不可小於 {minimum}")
+    return number
+
+
+def _decimal_param(request, name):
+    value = request.GET.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        raise InvalidQuery(f"{name} 必須是數字")
+    if not number.is_finite():
+        raise InvalidQuery(f"{name} 必須是數字")
+    return number
+
+
+def _bearer_token(request):
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer':
+        return None
+    return token.strip()
+
+
+def _valid_token(token):
+    # 與每個權杖都以固定時間比較，回應時間不透露比對結果
+    matched = False
+    for valid in settings.API_TOKENS:
+        matched |= hmac.compare_digest(token.encode('utf-8'), valid.encode('utf-8'))
+    return matched
+
+
+def api_access(*models):
+    """限定有效的 API 權杖，或具備 models 檢視權限的已登入工作人員
+
+    未認證或權杖錯誤時回傳 401（附 WWW-Authenticate），已登入但權限不足時回傳 403。
+    回應可能因使用者而異，標記為 private 並依 Authorization 與 Cookie 區分快取。
+    """
+    permissions = [f'{model._meta.app_label}.view_{model._meta.model_name}' for model in models]
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            token = _bearer_token(request)
+            user = request.user
+            if token is not None:
+                allowed = _valid_token(token)
+                response = None if allowed else _error("API 權杖無效", status=401)
+            elif not user.is_authenticated:
+                response = _error("需要登入或提供 API 權杖", status=401)
+            elif user.is_staff and user.has_perms(permissions):
+                response = None
+            else:
+                response = _error("沒有檢視這些資料的權限", status=403)
+
+            if response is None:
+                response = view(request, *args, **kwargs)
+            elif response.status_code == 401:
+                response['WWW-Authenticate'] = 'Bearer realm="api"'
+            patch_vary_headers(response, ('Authorization', 'Cookie'))
+            patch_cache_control(response, private=True)
+            return response
+        return wrapped
+    return decorator
+
+
+def data_version(request):
+    """資料版本：目前的變動序號（ChangeSequence）
+
+    作者、分類與書籍的新增、修改與刪除都會在同一個交易中遞增序號，且序號只增不減
+    （不像最後修改時間，刪除資料或清理刪除紀錄後不會倒退），任何變動都會讓所有列表的 ETag 改變。
+    同一個請求中只查詢一次。
+    """
+    if not hasattr(request, '_data_version'):
+        request._data_version = ChangeSequence.current()
+    return request._data_version
+
+
+def _conditional(resource):
+    """依資料版本產生 ETag 的 condition 裝飾器
+
+    不提供 Last-Modified：時間只精確到秒，也無法反映刪除，改以 If-None-Match 判斷。
+    """
+    def etag(request, *args, **kwargs):
+        return hashlib.sha1(f'{resource}|{data_version(request)}'.encode('utf-8')).hexdigest()
+
+    return condition(etag_func=etag)
+
+
+def _page(request, queryset, serialize):
+    """以 keyset 分頁回傳 {"results": [...], "next": 下一頁網址或 null}"""
+    try:
+        after = _int_param(request, 'after', default=0)
+        limit = min(_int_param(request, 'limit', default=DEFAULT_PAGE_SIZE, minimum=1), MAX_PAGE_SIZE)
+    except InvalidQuery as e:
+        return _error(e)
+
+    # 多取一筆判斷是否還有下一頁
+    rows = list(queryset.filter(pk__gt=after).order_by('pk')[:limit + 1])
+    next_url = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        query = request.GET.copy()
+        query['after'] = rows[-1]['id']
+        query['limit'] = limit
+        next_url = request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+    return JsonResponse(
+        {'results': [serialize(row) for row in rows], 'next': next_url},
+        json_dumps_params={'ensure_ascii': False},
+    )
+
+
+def _error(error, status=400):
+    return JsonResponse({'error': str(error)}, status=status, json_dumps_params={'ensure_ascii': False})
+
+
+@require_safe
+@api_access(Author)
+@_conditional('authors')
+def author_list(request):
+    """作者列表"""
+    queryset = Author.objects.values('id', 'name', 'email', 'birth_date')
+    return _page(request, queryset, dict)
+
+
+@require_safe
+@api_access(Category)
+@_conditional('categories')
+def category_list(request):
+    """分類列表"""
+    queryset = Category.objects.values('id', 'name', 'description')
+    return _page(request, queryset, dict)
+
+
+def _serialize_book(row):
+    return {
+        'id': row['id'],
+        'title': row['title'],
+        'author': {'id': row['author_id'], 'name': row['author__name']},
+        'category': {'id': row['category_id'], 'name': row['category__name']},
+        'publish_date': row['publish_date'],
+        'price': row['price'],
+        'is_available': row['is_available'],
+    }
+
+
+@require_safe
+@api_access(Book, Author, Category)
+@_conditional('books')
+def book_list(request):
+    """書籍列表
+
+    可用 author、category（id）與 min_price、max_price 篩選；
+    作者與分類名稱在同一個 JOIN 查詢中取得，不會逐筆查詢。
+    """
+    try:
+        author_id = _int_param(request, 'author')
+        category_id = _int_param(request, 'category')
+        min_price = _decimal_param(request, 'min_price')
+        max_price = _decimal_param(request, 'max_price')
+    except InvalidQuery as e:
+        return _error(e)
+
+    queryset = Book.objects.all()
+    if author_id is not None:
+        queryset = queryset.filter(author_id=author_id)
+    if category_id is not None:
+        queryset = queryset.filter(category_id=category_id)
+    if min_price is not None:
+        queryset = queryset.filter(price__gte=min_price)
+    if max_price is not None:
+        queryset = queryset.filter(price__lte=max_price)
+
+    queryset = queryset.values(
+        'id', 'title', 'author_id', 'author__name', 'category_id', 'category__name',
+        'publish_date', 'price', 'is_available',
+    )
+    return _page(request, queryset, _serialize_book)
+
+
+def _export_basename():
+    return f"data_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+
+@require_safe
+@api_access(Author, Category, Book)
+def export_csv(request, table):
+    """串流下載單一資料表的CSV（?gzip=1 時壓縮）"""
+    spec = {spec.suffix: spec for spec in CSV_TABLES}.get(table)
+    if spec is None:
+        raise Http404(f"沒有 {table} 資料表")
+    return streaming_download(
+        request, iter_csv_text(spec), f'{_export_basename()}_{spec.suffix}.csv',
+        'text/csv; charset=utf-8', compress=_bool_param(request, 'gzip'),
+    )
+
+
+def _json_export_parts(compact):
+    # 在同一個交易中讀取，各資料表與 metadata 的筆數一致
+    with transaction.atomic():
+        yield from iter_json_export(datetime.now(), compact=compact)
+
+
+@require_safe
+@api_access(Author, Category, Book)
+def export_json(request):
+    """串流下載完整匯出JSON（?compact=1 精簡格式，?gzip=1 壓縮）"""
+    return streaming_download(
+        request, _json_export_parts(_bool_param(request, 'compact')), f'{_export_basename()}.json',
+        'application/json; charset=utf-8', compress=_bool_param(request, 'gzip'),
+    )
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -73,14 +74,77 @@ WSGI_APPLICATION = 'myproject.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite 連線初始化：WAL 模式讓匯入寫入時匯出與後台仍可讀取
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,       # 負值單位為 KiB（約 64MB）
+    'mmap_size': 268435456,     # 256MB
+    'temp_store': 'MEMORY',
+}
+
+# 大量匯入時暫時切換的設定，匯入結束後還原為 SQLITE_PRAGMAS
+SQLITE_BULK_LOAD_PRAGMAS = {
+    'synchronous': 'OFF',
+    'cache_size': -256000,      # 約 256MB
+    'temp_store': 'MEMORY',
+}
+
+# manage.py import_books 未指定 --bulk-load / --no-bulk-load 時，來源檔案（sharded 為所有分片）
+# 達此大小才切換為大量匯入設定；synchronous=OFF 在系統當機時可能遺失最近提交的交易
+SQLITE_BULK_LOAD_MIN_BYTES = 64 * 1024 * 1024
+
+# 等待資料庫鎖定的秒數
+SQLITE_BUSY_TIMEOUT = 20
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'timeout': SQLITE_BUSY_TIMEOUT,
+            'init_command': ';'.join(
+                f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()
+            ),
+        },
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# 統計資料快取（myapp/stats.py）預設為各行程自己的記憶體快取：匯入腳本與網站伺服器是不同的行程，
+# 匯入時的失效不會傳到伺服器，伺服器最多 STATS_CACHE_TIMEOUT 秒後才看到新的統計；
+# 設定 HOMEWORK_STATS_CACHE_DIR 時改用該目錄的檔案快取，失效可跨行程立即生效。
+# 以原始 SQL 修改資料時不會觸發失效，需呼叫 myapp.stats.invalidate_all()。
+STATS_CACHE_TIMEOUT = int(os.environ.get('HOMEWORK_STATS_CACHE_TIMEOUT', 60))
+STATS_CACHE_DIR = os.environ.get('HOMEWORK_STATS_CACHE_DIR')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'stats': {
+        'BACKEND': (
+            'django.core.cache.backends.filebased.FileBasedCache' if STATS_CACHE_DIR
+            else 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': STATS_CACHE_DIR or 'stats',
+        'TIMEOUT': STATS_CACHE_TIMEOUT,
+    },
+}
+
+STATS_CACHE_ALIAS = 'stats'
+
+# 匯入/匯出各階段量測摘要的輸出檔（JSON Lines，每次執行附加一行）；未設定時不寫檔
+METRICS_FILE = os.environ.get('HOMEWORK_METRICS_FILE')
+
+# 唯讀 API 與匯出下載的存取權杖（以 Authorization: Bearer <權杖> 帶入），多個以逗號分隔；
+# 未設定時只有具備檢視權限的已登入工作人員可以使用
+API_TOKENS = [token.strip() for token in os.environ.get('HOMEWORK_API_TOKENS', '').split(',') if token.strip()]
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 